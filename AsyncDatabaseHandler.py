@@ -0,0 +1,350 @@
+# pip install asyncpg
+import asyncio
+
+import asyncpg
+
+from cache import LRUCache
+from config import load_config
+from DatabaseHandler import DatabaseHandler, _log_error
+from metrics import timed
+from records import PEREVAL_COLUMNS, ImageRecord, PerevalRecord
+from serializers import update_columns
+
+
+class AsyncDatabaseHandler:
+    """
+    Асинхронный вариант DatabaseHandler для ASGI-приложения (asgi_app.py).
+
+    Запросы выполняются через пул соединений asyncpg и не блокируют цикл событий,
+    поэтому один процесс обслуживает тысячи одновременных медленных клиентов.
+    Методы и их результаты повторяют одноимённые методы DatabaseHandler.
+    asyncpg сам готовит запросы на сервере и хранит их в кеше соединения,
+    поэтому отдельные PreparedStatement здесь не нужны.
+    """
+    # Столбцы pereval_added в порядке, в котором их возвращают методы получения перевалов
+    PEREVAL_COLUMNS = PEREVAL_COLUMNS
+
+    def __init__(self, minconn=None, maxconn=None, cache=None, settings=None):
+        """
+        Параметры подключения берутся из тех же настроек, что и в DatabaseHandler (см. config.load_config).
+        Пул создаётся в open(), так как для него нужен запущенный цикл событий.
+
+        :param minconn: Минимальный размер пула (по умолчанию FSTR_DB_POOL_MIN или 1).
+        :param maxconn: Максимальный размер пула (по умолчанию FSTR_DB_POOL_MAX или 10).
+        :param cache: Кеш перевалов; по умолчанию LRUCache размера FSTR_CACHE_SIZE. В asgi_app передаётся
+                      кеш приложения Flask, чтобы изменения через его маршруты (модерация) сбрасывали
+                      и этот кеш. Вызовы сетевого кеша (RedisCache) выполняются в потоке.
+        :param settings: Словарь настроек FSTR_* (по умолчанию load_config()).
+        """
+        settings = settings if settings is not None else load_config()
+        self.dsn = settings.get('FSTR_DB_DSN')
+        self.idempotency_ttl = int(settings.get('FSTR_IDEMPOTENCY_TTL', str(24 * 60 * 60)))
+        self.host = settings.get('FSTR_DB_HOST')
+        self.port = int(settings.get('FSTR_DB_PORT', '5432'))
+        self.user = settings.get('FSTR_DB_LOGIN')
+        self.password = settings.get('FSTR_DB_PASS')
+        self.database = settings.get('FSTR_DB_NAME', 'Pereval')  # Название базы данных
+        self.minconn = minconn if minconn is not None else int(settings.get('FSTR_DB_POOL_MIN', '1'))
+        self.maxconn = maxconn if maxconn is not None else int(settings.get('FSTR_DB_POOL_MAX', '10'))
+        self.timeout = float(settings.get('FSTR_DB_POOL_TIMEOUT', '30'))
+        self.cache = cache if cache is not None else LRUCache(
+            maxsize=int(settings.get('FSTR_CACHE_SIZE', '1024')),
+            ttl=float(settings.get('FSTR_CACHE_TTL', '60'))
+        )
+        self.pool = None
+
+    async def open(self):
+        """
+        Создаёт пул соединений: по строке подключения FSTR_DB_DSN, если она задана,
+        иначе по FSTR_DB_HOST, FSTR_DB_PORT, FSTR_DB_LOGIN и FSTR_DB_PASS.
+        """
+        connect_kwargs = {'dsn': self.dsn} if self.dsn else {
+            'host': self.host,
+            'port': self.port,
+            'user': self.user,
+            'password': self.password,
+            'database': self.database,
+        }
+        self.pool = await asyncpg.create_pool(
+            min_size=self.minconn,
+            max_size=self.maxconn,
+            **connect_kwargs
+        )
+
+    async def close(self):
+        """
+        Закрывает соединения пула.
+        """
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    def pool_stats(self):
+        """
+        Возвращает метрики пула соединений.
+        """
+        return {
+            'size': self.pool.get_size(),
+            'idle': self.pool.get_idle_size(),
+            'min': self.pool.get_min_size(),
+            'max': self.pool.get_max_size(),
+        }
+
+    def cache_stats(self):
+        """
+        Возвращает счётчики кеша перевалов (попадания, промахи).
+        """
+        return self.cache.stats()
+
+    @staticmethod
+    def _pereval_cache_key(pereval_id):
+        return f"pereval:{pereval_id}"
+
+    async def _cache_call(self, method, *args):
+        # Кеш в памяти отвечает сразу; обращение к Redis не должно блокировать цикл событий
+        if isinstance(self.cache, LRUCache):
+            return method(*args)
+        return await asyncio.to_thread(method, *args)
+
+    async def invalidate_pereval(self, pereval_id):
+        """
+        Удаляет перевал из кеша после его изменения.
+
+        :param pereval_id: ID перевала.
+        """
+        await self._cache_call(self.cache.delete, self._pereval_cache_key(pereval_id))
+
+    @timed
+    async def submit_pereval(self, payload, idempotency_key=None):
+        """
+        Добавляет пользователя, координаты, перевал и все изображения одним запросом
+        с проверкой ключа идемпотентности (см. DatabaseHandler.submit_pereval).
+
+        :param payload: Данные перевала в формате запроса POST /submitData.
+        :param idempotency_key: Значение заголовка Idempotency-Key.
+        :return: Словарь {'state': 1, 'id': ID перевала, 'queued': поставлена ли фоновая задача,
+                 'replayed': результат повторного запроса} или
+                 {'state': 0, 'status': HTTP-код, 'message': причина ошибки}.
+        """
+        user = payload.get('user', {})
+        coords = payload.get('coords', {})
+        level = payload.get('level', {})
+        images = payload.get('images', [])
+        request_hash = DatabaseHandler._request_hash(payload)
+        key = idempotency_key if idempotency_key is not None else f"sha256:{request_hash}"
+
+        query = """
+        WITH new_key AS (
+            INSERT INTO idempotency_keys (key, request_hash, pereval_id, queued)
+            VALUES ($20, $21, nextval('PEREVAL_ID_SEQ'), cardinality($18::text[]) > 0)
+            ON CONFLICT (key) DO UPDATE
+            SET request_hash = EXCLUDED.request_hash, pereval_id = EXCLUDED.pereval_id,
+                queued = EXCLUDED.queued, created_at = now()
+            WHERE idempotency_keys.created_at < now() - $22::float8 * interval '1 second'
+            RETURNING pereval_id
+        ), new_user AS (
+            INSERT INTO users (email, fam, name, otc, phone)
+            SELECT $1, $2, $3, $4, $5 FROM new_key
+            ON CONFLICT (email) DO UPDATE
+            SET fam = EXCLUDED.fam, name = EXCLUDED.name, otc = EXCLUDED.otc, phone = EXCLUDED.phone
+            RETURNING id
+        ), new_coord AS (
+            -- Числа в виде строк уже заменены числами при проверке (validation.py)
+            INSERT INTO coords (latitude, longitude, height)
+            SELECT $6::float8, $7::float8, $8::int4 FROM new_key
+            RETURNING id
+        ), new_pereval AS (
+            INSERT INTO pereval_added (id, beauty_title, title, other_titles, connect, add_time, user_id, coord_id,
+                                       level_winter, level_summer, level_autumn, level_spring, status)
+            SELECT new_key.pereval_id, $9, $10, $11, $12, $13::text::timestamp, new_user.id, new_coord.id,
+                   $14, $15, $16, $17, 'new'
+            FROM new_key, new_user, new_coord
+            RETURNING id
+        ), new_uploads AS (
+            INSERT INTO pereval_image_uploads (pereval_id, position, title, img)
+            SELECT new_pereval.id, image.position, image.title, decode_image_data(image.data)
+            FROM new_pereval, unnest($18::text[], $19::text[]) WITH ORDINALITY AS image(title, data, position)
+        ), new_jobs AS (
+            INSERT INTO jobs (kind, payload)
+            SELECT 'process_images', jsonb_build_object('pereval_id', new_pereval.id)
+            FROM new_pereval
+            WHERE cardinality($18::text[]) > 0
+        )
+        SELECT id FROM new_pereval;
+        """
+        try:
+            async with self.pool.acquire(timeout=self.timeout) as conn:
+                pereval_id = await conn.fetchval(
+                    query,
+                    user.get('email'), user.get('fam'), user.get('name'), user.get('otc'), user.get('phone'),
+                    coords.get('latitude'), coords.get('longitude'), coords.get('height'),
+                    payload.get('beauty_title'), payload.get('title'), payload.get('other_titles', ""),
+                    payload.get('connect', ""), payload.get('add_time'),
+                    level.get('winter'), level.get('summer'), level.get('autumn'), level.get('spring'),
+                    [image.get('title') for image in images], [image.get('data') for image in images],
+                    key, request_hash, float(self.idempotency_ttl)
+                )
+                if pereval_id is not None:
+                    return {'state': 1, 'id': pereval_id, 'queued': bool(images), 'replayed': False}
+                record = await conn.fetchrow(
+                    "SELECT request_hash, pereval_id, queued FROM idempotency_keys WHERE key = $1", key)
+                return DatabaseHandler._replayed_result(tuple(record) if record else None, request_hash)
+        except asyncpg.IntegrityConstraintViolationError as e:
+            return {'state': 0, 'status': 400, 'message': f"Неверные данные: {e}"}
+        except (asyncpg.DataError, asyncpg.DataConversionError) as e:
+            return {'state': 0, 'status': 400, 'message': f"Неверный формат данных: {e}"}
+        except (asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+            _log_error("Ошибка при добавлении перевала", e)
+            return {'state': 0, 'status': 500, 'message': f"Ошибка при добавлении перевала: {e}"}
+
+    @timed
+    async def get_pereval_by_id(self, pereval_id):
+        """
+        Получает информацию о перевале по его ID.
+        Результат кешируется; кеш сбрасывается при изменении перевала.
+
+        :param pereval_id: ID перевала.
+        :return: PerevalRecord или None, если перевал не найден или произошла ошибка.
+        """
+        cache_key = self._pereval_cache_key(pereval_id)
+        record = await self._cache_call(self.cache.get, cache_key)
+        if record is not None:
+            return record
+        try:
+            async with self.pool.acquire(timeout=self.timeout) as conn:
+                row = await conn.fetchrow(
+                    "SELECT id, beauty_title, title, other_titles, connect, add_time, user_id, coord_id, level_winter, level_summer, level_autumn, level_spring, status, version FROM pereval_added WHERE id = $1;",
+                    pereval_id)
+            if row is None:
+                return None
+            record = PerevalRecord._make(row)
+            await self._cache_call(self.cache.set, cache_key, record)
+            return record
+        except Exception as e:
+            _log_error("Ошибка при получении перевала", e)
+            return None
+
+    @timed
+    async def get_images_by_pereval_id(self, pereval_id):
+        """
+        Получает список изображений перевала без их содержимого.
+
+        :param pereval_id: ID перевала.
+        :return: Список ImageRecord (id, title, sha256, size), None, если перевал не найден
+                 или произошла ошибка.
+        """
+        try:
+            async with self.pool.acquire(timeout=self.timeout) as conn:
+                records = await conn.fetch("""
+                    SELECT i.id, i.title, i.image_sha256, b.size
+                    FROM pereval_added p
+                    LEFT JOIN pereval_images i ON i.pereval_id = p.id
+                    LEFT JOIN image_blobs b ON b.sha256 = i.image_sha256
+                    WHERE p.id = $1
+                    ORDER BY i.id;
+                    """, pereval_id)
+            if not records:
+                return None
+            # Перевал без изображений даёт одну строку со значениями NULL
+            return [ImageRecord._make(record) for record in records if record[0] is not None]
+        except Exception as e:
+            _log_error("Ошибка при получении изображений перевала", e)
+            return None
+
+    @timed
+    async def update_pereval(self, pereval_id, data, expected_versions=None):
+        """
+        Обновляет переданные поля перевала одним запросом (см. DatabaseHandler.update_pereval).
+
+        :param pereval_id: ID перевала.
+        :param data: Изменяемые поля в формате запроса PATCH /submitData/<id>.
+        :param expected_versions: Версии, при которых разрешено обновление; None - без проверки версии.
+        :return: Словарь с состоянием обновления (см. DatabaseHandler.update_pereval).
+        """
+        columns = update_columns(data)
+        if not columns:
+            return {'state': 0, 'status': 400, 'message': "Нет полей для обновления"}
+
+        params = [value for _, value in columns]
+        # add_time передаётся строкой, как и в DatabaseHandler
+        assignments = [f'"{column}" = ${number}' + ('::text::timestamp' if column == 'add_time' else '')
+                       for number, (column, _) in enumerate(columns, start=1)]
+        params.append(pereval_id)
+        conditions = [f"id = ${len(params)}", "status = 'new'"]
+        if expected_versions is not None:
+            params.append(list(expected_versions))
+            conditions.append(f"version = ANY(${len(params)}::int4[])")
+        # Имена столбцов берутся из update_columns, а не из запроса
+        query = (f"UPDATE pereval_added SET {', '.join(assignments)}, version = version + 1 "
+                 f"WHERE {' AND '.join(conditions)} RETURNING version;")
+        try:
+            async with self.pool.acquire(timeout=self.timeout) as conn:
+                version = await conn.fetchval(query, *params)
+                if version is None:
+                    # Перевал не обновлён: выясняем причину (только в этом случае нужен второй запрос)
+                    record = await conn.fetchrow("SELECT status, version FROM pereval_added WHERE id = $1;",
+                                                 pereval_id)
+                    return DatabaseHandler._update_rejected(tuple(record) if record is not None else None)
+            await self.invalidate_pereval(pereval_id)
+            return {'state': 1, 'message': 'Запись успешно обновлена', 'version': version}
+        except (asyncpg.DataError, asyncpg.DataConversionError) as e:
+            return {'state': 0, 'status': 400, 'message': f"Неверный формат данных: {e}"}
+        except Exception as e:
+            _log_error("Ошибка при обновлении перевала", e)
+            return {'state': 0, 'status': 500, 'message': f"Ошибка при обновлении: {e}"}
+
+    async def iter_submissions(self, email=None, status=None, level=None, date_from=None, date_to=None,
+                               after_id=None, limit=100, columns=None, page_size=500):
+        """
+        Возвращает перевалы по фильтрам, упорядоченные по ID, страницами по page_size строк;
+        соединение возвращается в пул между страницами (см. DatabaseHandler.iter_submissions).
+
+        :return: Асинхронный генератор кортежей значений столбцов columns.
+        """
+        columns = tuple(columns or self.PEREVAL_COLUMNS)
+        unknown = set(columns) - set(self.PEREVAL_COLUMNS)
+        if unknown:
+            raise ValueError(f"Неизвестные столбцы: {', '.join(sorted(unknown))}")
+        # ID нужен для запроса следующей страницы, даже если его нет в columns
+        selected = columns if 'id' in columns else ('id',) + columns
+        key_index = selected.index('id')
+
+        conditions = []
+        params = []
+
+        def param(value):
+            params.append(value)
+            return f"${len(params)}"
+
+        if email is not None:
+            conditions.append(f"user_id = (SELECT id FROM users WHERE email = {param(email)})")
+        if status is not None:
+            conditions.append(f"status = {param(status)}")
+        if level is not None:
+            conditions.append(f"{param(level)} IN (level_winter, level_summer, level_autumn, level_spring)")
+        if date_from is not None:
+            conditions.append(f"add_time >= {param(date_from)}")
+        if date_to is not None:
+            conditions.append(f"add_time < {param(date_to)}")
+        filter_params = list(params)
+
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            params[:] = filter_params
+            page_conditions = conditions + [f"id > {param(after_id)}"] if after_id is not None else conditions
+            # Имена столбцов проверены по PEREVAL_COLUMNS выше
+            query = "SELECT {columns} FROM pereval_added {where} ORDER BY id LIMIT {limit};".format(
+                columns=', '.join(f'"{column}"' for column in selected),
+                where="WHERE " + " AND ".join(page_conditions) if page_conditions else "",
+                limit=param(size),
+            )
+            async with self.pool.acquire(timeout=self.timeout) as conn:
+                records = await conn.fetch(query, *params)
+            for record in records:
+                yield tuple(record) if selected is columns else tuple(record)[1:]
+            if len(records) < size:
+                return
+            after_id = records[-1][key_index]
+            if remaining is not None:
+                remaining -= len(records)
@@ -1,40 +1,716 @@
 # pip install psycopg2-binary
-import os
+import contextvars
+import hashlib
+import io
+import json
+import logging
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 
 import psycopg2
+from psycopg2 import errors
+from psycopg2 import extensions
 from psycopg2 import sql
+from psycopg2.extras import Json, execute_values
+
+from cache import create_cache
+from config import load_config
+from image_utils import NormalizationError, decode_image, normalization_enabled, normalize_images, prepare_images
+from metrics import IMAGE_SIZE, count_error, timed
+from records import PEREVAL_COLUMNS, ImageInfo, ImageRecord, NearbyPass, PerevalRecord
+from serializers import update_columns
+from translit import translit_ru
+
+# Время последней записи в текущей сессии (time.time()); API переносит его между запросами в cookie
+_last_write = contextvars.ContextVar('fstr_db_last_write', default=0.0)
+
+logger = logging.getLogger(__name__)
+
+
+def last_write_time():
+    """
+    Возвращает время последней записи в текущей сессии (0, если записей не было).
+    """
+    return _last_write.get()
+
+
+def set_last_write_time(value):
+    """
+    Устанавливает время последней записи сессии, например из cookie запроса.
+
+    :param value: Время в секундах (time.time()).
+    :return: Токен для reset_last_write_time.
+    """
+    return _last_write.set(value)
+
+
+def reset_last_write_time(token):
+    """
+    Восстанавливает значение, которое было до set_last_write_time.
+    """
+    _last_write.reset(token)
+
+
+def reads_from_primary(window):
+    """
+    Возвращает True, если сессия недавно писала в базу и её чтения должны идти на основную базу.
+
+    :param window: Сколько секунд после записи чтения сессии идут на основную базу.
+    """
+    return time.time() - _last_write.get() < window
+
+
+def _log_error(message, e):
+    """
+    Записывает ошибку в журнал и учитывает её в метрике fstr_db_errors_total.
+
+    :param message: Описание действия, при котором произошла ошибка.
+    :param e: Исключение.
+    """
+    logger.error("%s: %s", message, e)
+    count_error(e)
+
+
+class PoolTimeout(Exception):
+    """
+    Исключение, возникающее, если свободное соединение не получено за отведённое время.
+    """
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул соединений с базой данных.
+
+    Держит от minconn до maxconn соединений, выдаёт их на время одного запроса,
+    проверяет простаивающие соединения перед выдачей и пересоздаёт разорванные.
+    """
+
+    def __init__(self, minconn=1, maxconn=10, timeout=30.0, health_check_interval=30.0, **connect_kwargs):
+        """
+        Инициализация пула и открытие minconn соединений.
+
+        :param minconn: Минимальное количество открытых соединений.
+        :param maxconn: Максимальное количество открытых соединений.
+        :param timeout: Сколько секунд ждать свободное соединение.
+        :param health_check_interval: Через сколько секунд простоя соединение проверяется перед выдачей.
+        :param connect_kwargs: Параметры для psycopg2.connect.
+        """
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Некорректные размеры пула: minconn=%s, maxconn=%s" % (minconn, maxconn))
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._connect_kwargs = connect_kwargs
+        self._cond = threading.Condition()
+        self._idle = deque()  # пары (соединение, время возврата в пул)
+        self._size = 0  # все открытые соединения, включая выданные
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+        # Счётчики для метрик пула
+        self._checkouts = 0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        """
+        Открывает новое соединение в режиме autocommit.
+        """
+        conn = psycopg2.connect(**self._connect_kwargs)
+        conn.autocommit = True
+        return conn
+
+    def _is_healthy(self, conn, returned_at):
+        """
+        Проверяет соединение. Недавно использованные соединения не проверяются запросом.
+        """
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _release_slot(self):
+        """
+        Освобождает место в пуле под новое соединение.
+        """
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def getconn(self):
+        """
+        Выдаёт соединение из пула, при необходимости ожидая освобождения.
+
+        :return: Соединение psycopg2.
+        :raises PoolTimeout: Если соединение не освободилось за timeout секунд.
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        conn = None
+        returned_at = None
+        with self._cond:
+            if self._closed:
+                raise psycopg2.InterfaceError("Пул соединений закрыт")
+            self._waiting += 1
+            try:
+                while True:
+                    if self._idle:
+                        # Берём последнее возвращённое соединение: оно с большей вероятностью живо
+                        conn, returned_at = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout("Нет свободных соединений за %.1f с" % self.timeout)
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+        # Подключение и проверка выполняются вне блокировки, чтобы не задерживать другие потоки
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif not self._is_healthy(conn, returned_at):
+                self._close_quietly(conn)
+                conn = self._connect()
+                with self._cond:
+                    self._reconnects += 1
+        except Exception:
+            self._release_slot()
+            raise
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def putconn(self, conn, broken=False):
+        """
+        Возвращает соединение в пул. Разорванные соединения закрываются.
+
+        :param conn: Соединение, полученное через getconn.
+        :param broken: True, если соединение нельзя использовать повторно.
+        """
+        if not broken and not conn.closed and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            # Незавершённая транзакция не должна достаться следующему запросу
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        with self._cond:
+            self._in_use -= 1
+            if self._closed or broken or conn.closed:
+                self._size -= 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Контекстный менеджер: выдаёт соединение и возвращает его в пул после использования.
+        """
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, broken=broken)
+
+    def stats(self):
+        """
+        Возвращает метрики пула.
+
+        :return: Словарь с размером пула, числом занятых и ожидающих соединений и временем ожидания.
+        """
+        with self._cond:
+            return {
+                'minconn': self.minconn,
+                'maxconn': self.maxconn,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'reconnects': self._reconnects,
+                'checkout_wait_avg_ms': (self._wait_total / self._checkouts * 1000) if self._checkouts else 0.0,
+                'checkout_wait_max_ms': self._wait_max * 1000,
+            }
+
+    def closeall(self):
+        """
+        Закрывает все свободные соединения. Выданные соединения закроются при возврате.
+        """
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._size -= 1
+                self._close_quietly(conn)
+            self._cond.notify_all()
+
+
+class ReplicaSet:
+    """
+    Пулы соединений с репликами для запросов только на чтение.
+
+    Соединения выдаются по кругу. Реплика, к которой не удалось подключиться или соединение с которой
+    разорвалось, на retry_interval секунд исключается из балансировки.
+    """
+
+    def __init__(self, pools, retry_interval=30.0):
+        """
+        :param pools: Список ConnectionPool, по одному на реплику.
+        :param retry_interval: На сколько секунд исключается недоступная реплика.
+        """
+        self.pools = pools
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._next = 0
+        self._down_until = [0.0] * len(pools)
+        # Счётчики для метрик
+        self._reads = 0
+        self._failovers = 0
+
+    def getconn(self):
+        """
+        Выдаёт соединение со следующей доступной репликой.
+
+        :return: Кортеж (пул, соединение) или (None, None), если ни одна реплика недоступна.
+        """
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.pools)
+        for shift in range(len(self.pools)):
+            index = (start + shift) % len(self.pools)
+            if self._down_until[index] > time.monotonic():
+                continue
+            pool = self.pools[index]
+            try:
+                conn = pool.getconn()
+            except PoolTimeout:
+                # Реплика занята, но доступна: пробуем следующую
+                continue
+            except psycopg2.Error as e:
+                self.mark_down(pool, e)
+                continue
+            with self._lock:
+                self._reads += 1
+            return pool, conn
+        with self._lock:
+            self._failovers += 1
+        return None, None
+
+    def mark_down(self, pool, e):
+        """
+        Исключает реплику из балансировки на retry_interval секунд.
+
+        :param pool: Пул соединений реплики.
+        :param e: Исключение, из-за которого реплика считается недоступной.
+        """
+        logger.warning("Реплика недоступна %.0f с: %s", self.retry_interval, e)
+        with self._lock:
+            self._down_until[self.pools.index(pool)] = time.monotonic() + self.retry_interval
+
+    def stats(self):
+        """
+        Возвращает метрики реплик: количество, доступные, чтения с реплик и чтения,
+        переданные основной базе из-за недоступности всех реплик.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'replicas': len(self.pools),
+                'available': sum(1 for down_until in self._down_until if down_until <= now),
+                'reads': self._reads,
+                'failovers': self._failovers,
+                'in_use': sum(pool.stats()['in_use'] for pool in self.pools),
+            }
+
+    def closeall(self):
+        for pool in self.pools:
+            pool.closeall()
+
+
+class PreparedConnection(extensions.connection):
+    """
+    Соединение, запоминающее имена запросов, подготовленных на сервере (PREPARE).
+    Подготовленные запросы живут до закрытия соединения, поэтому новое соединение
+    начинает с пустого набора.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.replica = False  # соединение с репликой (устанавливает DatabaseHandler._connection)
+
+
+class PreparedStatement:
+    """
+    Запрос, который готовится на сервере один раз на соединение и затем выполняется через EXECUTE.
+
+    Сервер разбирает и планирует запрос только при PREPARE, а EXECUTE передаёт одни параметры.
+    """
+
+    def __init__(self, name, query):
+        """
+        :param name: Имя подготовленного запроса.
+        :param query: Текст запроса с параметрами $1, $2, ...
+        """
+        self.name = name
+        self.prepare_sql = f"PREPARE {name} AS {query}"
+        count = max((int(number) for number in re.findall(r'\$(\d+)', query)), default=0)
+        self.execute_sql = f"EXECUTE {name} ({', '.join(['%s'] * count)});" if count else f"EXECUTE {name};"
+
+    def execute(self, cursor, params=()):
+        """
+        Выполняет запрос на курсоре, подготавливая его при первом использовании соединения.
+
+        :param cursor: Курсор соединения PreparedConnection.
+        :param params: Значения параметров $1, $2, ... по порядку.
+        """
+        prepared = cursor.connection.prepared
+        if self.name not in prepared:
+            cursor.execute(self.prepare_sql)
+            prepared.add(self.name)
+        try:
+            cursor.execute(self.execute_sql, params)
+        except errors.InvalidSqlStatementName:
+            # Запрос удалён на сервере (DISCARD ALL, переподключение через pgbouncer): готовим заново
+            prepared.discard(self.name)
+            if not cursor.connection.autocommit:
+                raise
+            cursor.execute(self.prepare_sql)
+            prepared.add(self.name)
+            cursor.execute(self.execute_sql, params)
+
+
+class _CopyByteaReader:
+    """
+    Файлоподобный объект для COPY ... FROM STDIN, формирующий одну строку таблицы.
+
+    Последний столбец строки имеет тип bytea: его байты читаются из потока частями
+    и сразу кодируются в hex, поэтому в памяти находится не больше одной части.
+    """
+
+    def __init__(self, values, stream):
+        """
+        :param values: Значения столбцов, предшествующих столбцу bytea.
+        :param stream: Файлоподобный объект с байтами для столбца bytea.
+        """
+        self._head = b"".join(self._escape(value) + b"\t" for value in values) + b"\\\\x"
+        self._stream = stream
+        self._done = False
+
+    @staticmethod
+    def _escape(value):
+        """
+        Экранирует значение для текстового формата COPY.
+        """
+        if value is None:
+            return b"\\N"
+        value = str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+        return value.encode('utf-8')
+
+    def read(self, size=65536):
+        if self._head:
+            head, self._head = self._head, b""
+            return head
+        if self._done:
+            return b""
+        chunk = self._stream.read(max(size // 2, 1))
+        if not chunk:
+            self._done = True
+            return b"\n"
+        return chunk.hex().encode('ascii')
 
 
 class DatabaseHandler:
     """
     Класс для работы с базой данных Pereval.
     """
-    # Устанавливаем значения переменных окружения
-    os.environ['FSTR_DB_HOST'] = 'localhost'
-    os.environ['FSTR_DB_PORT'] = '5432'
-    os.environ['FSTR_DB_LOGIN'] = 'postgres'
-    os.environ['FSTR_DB_PASS'] = '1234'
-
-    def __init__(self):
-        """
-        Инициализация соединения с базой данных.
-        Устанавливает соединение с использованием параметров из переменных окружения.
-        """
-        self.host = os.getenv('FSTR_DB_HOST')
-        self.port = os.getenv('FSTR_DB_PORT')
-        self.user = os.getenv('FSTR_DB_LOGIN')
-        self.password = os.getenv('FSTR_DB_PASS')
-        self.database = 'Pereval'  # Название базы данных
-        self.conn = psycopg2.connect(
-            host=self.host,
-            port=self.port,
-            user=self.user,
-            password=self.password,
-            database=self.database
+    # Минимальное сходство названия с запросом при поиске (0..1): меньше - больше опечаток допускается
+    SEARCH_SIMILARITY_THRESHOLD = 0.4
+
+    # Столбцы pereval_added в порядке, в котором их возвращают методы получения перевалов
+    PEREVAL_COLUMNS = PEREVAL_COLUMNS
+
+    # Частые запросы; каждый готовится на сервере один раз на соединение
+    GET_PEREVAL = PreparedStatement('fstr_get_pereval', """
+        SELECT id, beauty_title, title, other_titles, connect, add_time, user_id, coord_id,
+               level_winter, level_summer, level_autumn, level_spring, status, version
+        FROM pereval_added WHERE id = $1
+        """)
+    GET_IMAGES = PreparedStatement('fstr_get_images', """
+        SELECT i.id, i.title, i.image_sha256, b.size
+        FROM pereval_added p
+        LEFT JOIN pereval_images i ON i.pereval_id = p.id
+        LEFT JOIN image_blobs b ON b.sha256 = i.image_sha256
+        WHERE p.id = $1
+        ORDER BY i.id
+        """)
+    GET_IMAGE_INFO = PreparedStatement('fstr_get_image_info', """
+        SELECT b.sha256, b.size, substring(b.img FROM 1 FOR 16)
+        FROM pereval_images i
+        JOIN image_blobs b ON b.sha256 = i.image_sha256
+        WHERE i.id = $1
+        """)
+    READ_IMAGE_CHUNK = PreparedStatement('fstr_read_image_chunk', """
+        SELECT substring(img FROM $1 FOR $2) FROM image_blobs WHERE sha256 = $3
+        """)
+    FIND_NEARBY = PreparedStatement('fstr_find_nearby', """
+        SELECT p.id, p.beauty_title, p.title, p.status, c.latitude, c.longitude, c.height,
+               earth_distance(ll_to_earth($1, $2), ll_to_earth(c.latitude, c.longitude)) AS distance
+        FROM coords c
+        JOIN pereval_added p ON p.coord_id = c.id
+        WHERE earth_box(ll_to_earth($1, $2), $3) @> ll_to_earth(c.latitude, c.longitude)
+          AND earth_distance(ll_to_earth($1, $2), ll_to_earth(c.latitude, c.longitude)) <= $3
+          AND ($4::int4 IS NULL OR c.height >= $4::int4)
+        ORDER BY ll_to_earth(c.latitude, c.longitude) <-> ll_to_earth($1, $2)
+        LIMIT $5
+        """)
+    SUBMIT_PEREVAL = PreparedStatement('fstr_submit_pereval', """
+        WITH new_key AS (
+            -- Ключ идемпотентности занимается первым; остальные вставки выполняются, только если
+            -- ключ новый или его срок хранения ($22 секунд) истёк. ID перевала выделяется здесь же,
+            -- чтобы сохранить его вместе с ключом одной вставкой
+            INSERT INTO idempotency_keys (key, request_hash, pereval_id, queued)
+            VALUES ($20, $21, nextval('PEREVAL_ID_SEQ'), cardinality($18::text[]) > 0)
+            ON CONFLICT (key) DO UPDATE
+            SET request_hash = EXCLUDED.request_hash, pereval_id = EXCLUDED.pereval_id,
+                queued = EXCLUDED.queued, created_at = now()
+            WHERE idempotency_keys.created_at < now() - $22::float8 * interval '1 second'
+            RETURNING pereval_id
+        ), new_user AS (
+            -- Существующий пользователь не мешает отправке: его данные обновляются
+            INSERT INTO users (email, fam, name, otc, phone)
+            SELECT $1, $2, $3, $4, $5 FROM new_key
+            ON CONFLICT (email) DO UPDATE
+            SET fam = EXCLUDED.fam, name = EXCLUDED.name, otc = EXCLUDED.otc, phone = EXCLUDED.phone
+            RETURNING id
+        ), new_coord AS (
+            INSERT INTO coords (latitude, longitude, height)
+            SELECT $6, $7, $8 FROM new_key
+            RETURNING id
+        ), new_pereval AS (
+            INSERT INTO pereval_added (id, beauty_title, title, other_titles, connect, add_time, user_id, coord_id,
+                                       level_winter, level_summer, level_autumn, level_spring, status)
+            SELECT new_key.pereval_id, $9, $10, $11, $12, $13::timestamp, new_user.id, new_coord.id,
+                   $14, $15, $16, $17, 'new'
+            FROM new_key, new_user, new_coord
+            RETURNING id
+        ), new_uploads AS (
+            -- Изображения сохраняются как получены; нормализация и запись в image_blobs
+            -- выполняются задачей process_images
+            INSERT INTO pereval_image_uploads (pereval_id, position, title, img)
+            SELECT new_pereval.id, image.position, image.title, decode_image_data(image.data)
+            FROM new_pereval, unnest($18::text[], $19::text[]) WITH ORDINALITY AS image(title, data, position)
+        ), new_jobs AS (
+            -- Обработка изображений ставится в очередь в той же транзакции, что и перевал
+            INSERT INTO jobs (kind, payload)
+            SELECT 'process_images', jsonb_build_object('pereval_id', new_pereval.id)
+            FROM new_pereval
+            WHERE cardinality($18::text[]) > 0
+        )
+        SELECT id FROM new_pereval
+        """)
+    GET_IDEMPOTENCY_KEY = PreparedStatement('fstr_get_idempotency_key', """
+        SELECT request_hash, pereval_id, queued FROM idempotency_keys WHERE key = $1
+        """)
+
+    def __init__(self, minconn=None, maxconn=None, cache=None, dsn=None, replica_dsns=None, settings=None):
+        """
+        Инициализация пула соединений с базой данных.
+        Параметры подключения берутся из настроек (см. config.load_config).
+
+        :param minconn: Минимальный размер пула (по умолчанию FSTR_DB_POOL_MIN или 1).
+        :param maxconn: Максимальный размер пула (по умолчанию FSTR_DB_POOL_MAX или 10).
+        :param cache: Кеш перевалов (LRUCache, RedisCache); по умолчанию создаётся
+                      по настройкам FSTR_CACHE_URL, FSTR_CACHE_SIZE и FSTR_CACHE_TTL.
+        :param dsn: Строка подключения к основной базе (по умолчанию FSTR_DB_DSN); если не задана,
+                    используются FSTR_DB_HOST, FSTR_DB_PORT, FSTR_DB_LOGIN и FSTR_DB_PASS.
+        :param replica_dsns: Строки подключения к репликам для чтения (по умолчанию FSTR_DB_REPLICAS
+                             через запятую); без реплик все запросы идут на основную базу.
+        :param settings: Словарь настроек FSTR_* (по умолчанию load_config()).
+        """
+        settings = settings if settings is not None else load_config()
+        # Сколько секунд хранится ключ идемпотентности: повтор запроса с тем же ключом в течение
+        # этого времени возвращает результат первого запроса
+        self.idempotency_ttl = int(settings.get('FSTR_IDEMPOTENCY_TTL', str(24 * 60 * 60)))
+        # Сколько секунд после записи чтения той же сессии выполняются на основной базе, а не на репликах
+        # (read-your-writes): за это время реплики успевают получить изменения
+        self.read_your_writes_window = float(settings.get('FSTR_DB_READ_YOUR_WRITES', '5'))
+        self.host = settings.get('FSTR_DB_HOST')
+        self.port = settings.get('FSTR_DB_PORT')
+        self.user = settings.get('FSTR_DB_LOGIN')
+        self.password = settings.get('FSTR_DB_PASS')
+        self.database = settings.get('FSTR_DB_NAME', 'Pereval')  # Название базы данных
+        dsn = dsn if dsn is not None else settings.get('FSTR_DB_DSN')
+        if replica_dsns is None:
+            replica_dsns = [item.strip() for item in settings.get('FSTR_DB_REPLICAS', '').split(',') if item.strip()]
+        pool_settings = {
+            'maxconn': maxconn if maxconn is not None else int(settings.get('FSTR_DB_POOL_MAX', '10')),
+            'timeout': float(settings.get('FSTR_DB_POOL_TIMEOUT', '30')),
+            'health_check_interval': float(settings.get('FSTR_DB_POOL_CHECK_INTERVAL', '30')),
+            'connection_factory': PreparedConnection,
+        }
+        connect_kwargs = {'dsn': dsn} if dsn else {
+            'host': self.host,
+            'port': self.port,
+            'user': self.user,
+            'password': self.password,
+            'database': self.database,
+        }
+        self.pool = ConnectionPool(
+            minconn=minconn if minconn is not None else int(settings.get('FSTR_DB_POOL_MIN', '1')),
+            **pool_settings,
+            **connect_kwargs
         )
-        self.conn.autocommit = True
+        # Соединения с репликами открываются при первом чтении, чтобы недоступная реплика
+        # не мешала запуску
+        self.replicas = ReplicaSet([
+            ConnectionPool(minconn=0, dsn=replica_dsn, **pool_settings) for replica_dsn in replica_dsns
+        ], retry_interval=float(settings.get('FSTR_DB_REPLICA_RETRY', '30'))) if replica_dsns else None
+        self.cache = cache if cache is not None else create_cache(
+            url=settings.get('FSTR_CACHE_URL'),
+            maxsize=int(settings.get('FSTR_CACHE_SIZE', '1024')),
+            ttl=float(settings.get('FSTR_CACHE_TTL', '60'))
+        )
+
+    @contextmanager
+    def _connection(self, read_only=False):
+        """
+        Выдаёт соединение на время одного вызова.
+
+        Запросы только на чтение идут на реплики, если они настроены и сессия не писала в базу
+        последние read_your_writes_window секунд; если все реплики недоступны - на основную базу.
+        После успешного вызова на запись время записи запоминается для read-your-writes.
+
+        :param read_only: True, если вызов только читает данные.
+        """
+        pool, conn = None, None
+        if read_only and self.replicas is not None and not reads_from_primary(self.read_your_writes_window):
+            pool, conn = self.replicas.getconn()
+        if conn is None:
+            pool, conn = self.pool, self.pool.getconn()
+        conn.replica = pool is not self.pool
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            broken = True
+            if pool is not self.pool:
+                self.replicas.mark_down(pool, e)
+            raise
+        finally:
+            pool.putconn(conn, broken=broken)
+        if not read_only:
+            _last_write.set(time.time())
+
+    @contextmanager
+    def _cursor(self, read_only=False):
+        """
+        Выдаёт курсор на соединении из пула на время одного вызова.
+
+        :param read_only: True, если вызов только читает данные (может выполняться на реплике).
+        """
+        with self._connection(read_only) as conn:
+            with conn.cursor() as cursor:
+                yield cursor
 
+    @contextmanager
+    def _transaction(self, cursor_name=None, read_only=False):
+        """
+        Выдаёт курсор, все запросы которого выполняются в одной транзакции.
+        При исключении транзакция откатывается.
+
+        :param cursor_name: Имя серверного курсора; если указано, строки результата
+                            загружаются с сервера частями по мере чтения.
+        :param read_only: True, если транзакция только читает данные (может выполняться на реплике).
+        """
+        with self._connection(read_only) as conn:
+            conn.autocommit = False
+            try:
+                with conn.cursor(name=cursor_name) as cursor:
+                    yield cursor
+                conn.commit()
+            except BaseException:
+                # BaseException: генератор, закрытый до конца чтения, тоже должен откатить транзакцию
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                if not conn.closed:
+                    conn.autocommit = True
 
+    def pool_stats(self):
+        """
+        Возвращает метрики пула соединений.
+
+        :return: Словарь метрик (см. ConnectionPool.stats).
+        """
+        return self.pool.stats()
+
+    def replica_stats(self):
+        """
+        Возвращает метрики реплик (см. ReplicaSet.stats) или пустой словарь, если реплики не настроены.
+        """
+        return self.replicas.stats() if self.replicas is not None else {}
+
+    def cache_stats(self):
+        """
+        Возвращает счётчики кеша перевалов (попадания, промахи).
+        """
+        return self.cache.stats()
+
+    @staticmethod
+    def _pereval_cache_key(pereval_id):
+        return f"pereval:{pereval_id}"
+
+    def invalidate_pereval(self, pereval_id):
+        """
+        Удаляет перевал из кеша после его изменения.
+
+        :param pereval_id: ID перевала.
+        """
+        self.cache.delete(self._pereval_cache_key(pereval_id))
+
+    @timed
     def add_coord(self, latitude, longitude, height):
         """
         Добавляет координаты в базу данных.
@@ -45,7 +721,7 @@ class DatabaseHandler:
         :return: ID добавленных координат или None в случае ошибки.
         """
         try:
-            with self.conn.cursor() as cursor:
+            with self._cursor() as cursor:
                 query = sql.SQL("""
                 INSERT INTO coords (latitude, longitude, height)
                 VALUES (%s, %s, %s)
@@ -55,36 +731,41 @@ class DatabaseHandler:
                 coord_id = cursor.fetchone()[0]
                 return coord_id
         except Exception as e:
-            print(f"Ошибка при добавлении координат: {e}")
+            _log_error("Ошибка при добавлении координат", e)
             return None
 
 
+    @timed
     def add_user(self, email, fam, name, otc, phone):
         """
-        Добавляет пользователя в базу данных.
+        Добавляет пользователя в базу данных. Если пользователь с такой почтой уже есть,
+        его данные обновляются.
 
         :param email: Электронная почта пользователя.
         :param fam: Фамилия пользователя.
         :param name: Имя пользователя.
         :param otc: Отчество пользователя.
         :param phone: Телефон пользователя.
-        :return: ID добавленного пользователя или None в случае ошибки.
+        :return: ID пользователя или None в случае ошибки.
         """
         try:
-            with self.conn.cursor() as cursor:
+            with self._cursor() as cursor:
                 query = sql.SQL("""
                 INSERT INTO users (email, fam, name, otc, phone)
                 VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (email) DO UPDATE
+                SET fam = EXCLUDED.fam, name = EXCLUDED.name, otc = EXCLUDED.otc, phone = EXCLUDED.phone
                 RETURNING id;
                 """)
                 cursor.execute(query, (email, fam, name, otc, phone))
                 user_id = cursor.fetchone()[0]
                 return user_id
         except Exception as e:
-            print(f"Ошибка при добавлении пользователя: {e}")
+            _log_error("Ошибка при добавлении пользователя", e)
             return None
 
 
+    @timed
     def add_pereval(self, beauty_title, title, other_titles, connect, add_time, user_id, coord_id, level_winter,
                     level_summer, level_autumn, level_spring, status):
         """
@@ -105,7 +786,7 @@ class DatabaseHandler:
         :return: ID добавленного перевала или None в случае ошибки.
         """
         try:
-            with self.conn.cursor() as cursor:
+            with self._cursor() as cursor:
                 query = sql.SQL("""
                 INSERT INTO pereval_added (beauty_title, title, other_titles, connect, add_time, user_id, coord_id, level_winter, level_summer, level_autumn, level_spring, status)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
@@ -117,33 +798,330 @@ class DatabaseHandler:
                 pereval_id = cursor.fetchone()[0]
                 return pereval_id
         except psycopg2.Error as e:
-            print(f"Ошибка при добавлении перевала: {e}")
+            _log_error("Ошибка при добавлении перевала", e)
             return None
 
 
-    def add_image(self, image_data, image_title, pereval_id):
+    @timed
+    def add_image(self, image_data, image_title, pereval_id, max_size=None):
         """
         Добавляет изображение к перевалу.
 
-        :param image_data: Данные изображения.
+        Изображение нормализуется (image_utils.normalize_images), а байты хранятся в image_blobs
+        один раз по хешу SHA-256: если такое изображение уже есть, добавляется только ссылка на него.
+
+        :param image_data: Данные изображения (строка base64 или байты).
         :param image_title: Название изображения.
         :param pereval_id: ID перевала.
+        :param max_size: Максимальный размер изображения в байтах; большее изображение не декодируется.
         :return: ID добавленного изображения или None в случае ошибки.
         """
         try:
-            with self.conn.cursor() as cursor:
+            image_bytes = normalize_images([decode_image(image_data, max_size=max_size)])[0]
+            with self._cursor() as cursor:
                 query = sql.SQL("""
-                INSERT INTO images (data, title, pereval_id)
-                VALUES (%s, %s, %s)
+                WITH new_blob AS (
+                    INSERT INTO image_blobs (sha256, size, img)
+                    VALUES (%(sha256)s, %(size)s, %(img)s)
+                    ON CONFLICT (sha256) DO NOTHING
+                )
+                INSERT INTO pereval_images (pereval_id, title, image_sha256)
+                VALUES (%(pereval_id)s, %(title)s, %(sha256)s)
                 RETURNING id;
                 """)
-                cursor.execute(query, (image_data, image_title, pereval_id))
+                cursor.execute(query, {
+                    'sha256': hashlib.sha256(image_bytes).hexdigest(),
+                    'size': len(image_bytes),
+                    'img': psycopg2.Binary(image_bytes),
+                    'pereval_id': pereval_id,
+                    'title': image_title,
+                })
                 image_id = cursor.fetchone()[0]
                 return image_id
-        except psycopg2.Error as e:
-            print(f"Ошибка при добавлении изображения: {e}")
+        except (psycopg2.Error, ValueError, NormalizationError) as e:
+            _log_error("Ошибка при добавлении изображения", e)
             return None
 
+    @timed
+    def submit_pereval(self, payload, idempotency_key=None):
+        """
+        Добавляет пользователя, координаты, перевал и все изображения одним запросом.
+
+        Все вставки объединены в одну цепочку CTE, поэтому выполняются за одно обращение
+        к серверу и атомарно: при любой ошибке ни одна строка не сохраняется. Изображения
+        сохраняются в pereval_image_uploads как получены (base64 декодирует PostgreSQL),
+        а в той же цепочке ставится задача process_images (см. job_queue.py), которая
+        нормализует их и переносит в image_blobs (store_uploaded_images).
+
+        Повторная отправка (клиент не получил ответ и повторил запрос) не создаёт второй перевал:
+        первой вставкой цепочки сохраняется ключ идемпотентности, и если он уже есть, остальные
+        вставки не выполняются, а возвращается результат первого запроса. Без заголовка
+        Idempotency-Key ключом служит хеш данных, поэтому повтор тех же данных тоже распознаётся.
+        Существующий пользователь (та же почта) обновляется, а не блокирует отправку.
+
+        :param payload: Данные перевала в формате запроса POST /submitData.
+        :param idempotency_key: Значение заголовка Idempotency-Key.
+        :return: Словарь {'state': 1, 'id': ID перевала, 'queued': поставлена ли фоновая задача,
+                 'replayed': результат повторного запроса} или
+                 {'state': 0, 'status': HTTP-код, 'message': причина ошибки}.
+        """
+        user = payload.get('user', {})
+        coords = payload.get('coords', {})
+        level = payload.get('level', {})
+        images = payload.get('images', [])
+        request_hash = self._request_hash(payload)
+        key = idempotency_key if idempotency_key is not None else f"sha256:{request_hash}"
+
+        params = (
+            user.get('email'), user.get('fam'), user.get('name'), user.get('otc'), user.get('phone'),
+            coords.get('latitude'), coords.get('longitude'), coords.get('height'),
+            payload.get('beauty_title'), payload.get('title'), payload.get('other_titles', ""),
+            payload.get('connect', ""), payload.get('add_time'),
+            level.get('winter'), level.get('summer'), level.get('autumn'), level.get('spring'),
+            [image.get('title') for image in images], [image.get('data') for image in images],
+            key, request_hash, self.idempotency_ttl,
+        )
+        try:
+            with self._cursor() as cursor:
+                self.SUBMIT_PEREVAL.execute(cursor, params)
+                record = cursor.fetchone()
+                if record is not None:
+                    return {'state': 1, 'id': record[0], 'queued': bool(images), 'replayed': False}
+                # Ключ уже использован: читаем результат первого запроса. Отдельным запросом,
+                # так как строку, добавленную параллельным запросом, цепочка CTE не видит
+                self.GET_IDEMPOTENCY_KEY.execute(cursor, (key,))
+                return self._replayed_result(cursor.fetchone(), request_hash)
+        except psycopg2.IntegrityError as e:
+            return {'state': 0, 'status': 400, 'message': f"Неверные данные: {e}"}
+        except psycopg2.DataError as e:
+            return {'state': 0, 'status': 400, 'message': f"Неверный формат данных: {e}"}
+        except psycopg2.Error as e:
+            _log_error("Ошибка при добавлении перевала", e)
+            return {'state': 0, 'status': 500, 'message': f"Ошибка при добавлении перевала: {e}"}
+
+    @staticmethod
+    def _request_hash(payload):
+        """
+        Вычисляет хеш данных перевала для сравнения повторных запросов.
+        Изображения входят в хеш строками base64 из запроса: они не декодируются.
+
+        :param payload: Данные перевала в формате запроса POST /submitData.
+        :return: Шестнадцатеричный SHA-256.
+        """
+        canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _replayed_result(record, request_hash):
+        """
+        Формирует результат повторного запроса по сохранённой строке idempotency_keys.
+
+        :param record: Кортеж (request_hash, pereval_id, queued) или None.
+        :param request_hash: Хеш данных повторного запроса.
+        """
+        if record is None:
+            # Ключ удалён между запросами (истёк срок хранения); клиент может повторить запрос
+            return {'state': 0, 'status': 409, 'message': "Ключ идемпотентности занят, повторите запрос"}
+        stored_hash, pereval_id, queued = record
+        if stored_hash != request_hash:
+            return {'state': 0, 'status': 422,
+                    'message': "Ключ идемпотентности уже использован для запроса с другими данными"}
+        return {'state': 1, 'id': pereval_id, 'queued': queued, 'replayed': True}
+
+    @timed
+    def purge_idempotency_keys(self, ttl=None):
+        """
+        Удаляет ключи идемпотентности старше ttl секунд.
+
+        :param ttl: Срок хранения ключа в секундах (по умолчанию FSTR_IDEMPOTENCY_TTL).
+        :return: Количество удалённых ключей.
+        """
+        ttl = ttl if ttl is not None else self.idempotency_ttl
+        with self._cursor() as cursor:
+            cursor.execute("DELETE FROM idempotency_keys WHERE created_at < now() - %s * interval '1 second';",
+                           (ttl,))
+            return cursor.rowcount
+
+    @staticmethod
+    def _error_result(e):
+        """
+        Формирует результат для записи, которую не удалось добавить.
+        """
+        status = 400 if isinstance(e, (psycopg2.DataError, psycopg2.IntegrityError)) else 500
+        return {'state': 0, 'status': status, 'message': f"Ошибка при добавлении перевала: {e}"}
+
+    def _insert_batch(self, rows):
+        """
+        Добавляет группу перевалов в одной транзакции через execute_values.
+
+        :param rows: Список проверенных данных перевалов.
+        :return: Список ID перевалов в порядке rows.
+        """
+        with self._transaction() as cursor:
+            # Пользователи: каждая почта добавляется один раз, существующие пользователи обновляются
+            users = {}
+            for payload in rows:
+                users.setdefault(payload['user'].get('email'), payload['user'])
+            user_ids = dict(execute_values(cursor, sql.SQL("""
+                INSERT INTO users (email, fam, name, otc, phone) VALUES %s
+                ON CONFLICT (email) DO UPDATE
+                SET fam = EXCLUDED.fam, name = EXCLUDED.name, otc = EXCLUDED.otc, phone = EXCLUDED.phone
+                RETURNING email, id
+                """), [(email, user.get('fam'), user.get('name'), user.get('otc'), user.get('phone'))
+                       for email, user in users.items()], page_size=len(users), fetch=True))
+
+            # ID координат и перевалов выделяются заранее, чтобы связать строки без повторных запросов
+            cursor.execute(sql.SQL("""
+                SELECT nextval('COORDS_ID_SEQ'), nextval('PEREVAL_ID_SEQ') FROM generate_series(1, %s);
+                """), (len(rows),))
+            ids = cursor.fetchall()
+
+            execute_values(cursor, sql.SQL("INSERT INTO coords (id, latitude, longitude, height) VALUES %s"), [
+                (coord_id, payload['coords'].get('latitude'), payload['coords'].get('longitude'),
+                 payload['coords'].get('height'))
+                for payload, (coord_id, _) in zip(rows, ids)
+            ], page_size=len(rows))
+            execute_values(cursor, sql.SQL("""
+                INSERT INTO pereval_added (id, beauty_title, title, other_titles, connect, add_time, user_id, coord_id,
+                                           level_winter, level_summer, level_autumn, level_spring, status)
+                VALUES %s
+                """), [
+                (pereval_id, payload.get('beauty_title'), payload.get('title'), payload.get('other_titles', ""),
+                 payload.get('connect', ""), payload.get('add_time'), user_ids[payload['user'].get('email')], coord_id,
+                 payload['level'].get('winter'), payload['level'].get('summer'), payload['level'].get('autumn'),
+                 payload['level'].get('spring'), 'new')
+                for payload, (coord_id, pereval_id) in zip(rows, ids)
+            ], page_size=len(rows))
+
+            # Изображения сохраняются как получены, их обрабатывает задача process_images (см. submit_pereval)
+            upload_rows = [(pereval_id, position, image.get('title'), image.get('data'))
+                           for payload, (_, pereval_id) in zip(rows, ids)
+                           for position, image in enumerate(payload.get('images', []), 1)]
+            if upload_rows:
+                execute_values(cursor, sql.SQL(
+                    "INSERT INTO pereval_image_uploads (pereval_id, position, title, img) VALUES %s"
+                ), upload_rows, template="(%s, %s, %s, decode_image_data(%s))", page_size=len(upload_rows))
+                job_rows = [('process_images', Json({'pereval_id': pereval_id}))
+                            for pereval_id in dict.fromkeys(pereval_id for pereval_id, _, _, _ in upload_rows)]
+                execute_values(cursor, sql.SQL("INSERT INTO jobs (kind, payload) VALUES %s"), job_rows,
+                               page_size=len(job_rows))
+            return [pereval_id for _, pereval_id in ids]
+
+    @timed
+    def submit_pereval_batch(self, payloads):
+        """
+        Добавляет группу перевалов пакетной вставкой.
+
+        Вся группа добавляется одной транзакцией. Если транзакция не удалась, записи
+        добавляются по одной, чтобы ошибка одной записи не отменяла остальные.
+        Как и в submit_pereval, существующие пользователи обновляются, а не блокируют отправку,
+        а изображения обрабатываются задачей process_images.
+
+        :param payloads: Список проверенных данных перевалов в формате POST /submitData.
+        :return: Список результатов в порядке payloads: {'state': 1, 'id': ...} или
+                 {'state': 0, 'status': HTTP-код, 'message': причина ошибки}.
+        """
+        if not payloads:
+            return []
+        try:
+            return [{'state': 1, 'id': pereval_id} for pereval_id in self._insert_batch(payloads)]
+        except psycopg2.Error as e:
+            if len(payloads) == 1:
+                return [self._error_result(e)]
+            _log_error("Ошибка при пакетном добавлении, записи добавляются по одной", e)
+        results = []
+        for payload in payloads:
+            try:
+                results.append({'state': 1, 'id': self._insert_batch([payload])[0]})
+            except psycopg2.Error as row_error:
+                results.append(self._error_result(row_error))
+        return results
+
+    @timed
+    def add_image_stream(self, pereval_id, title, stream, max_size=None, chunk_size=65536):
+        """
+        Добавляет изображение к перевалу, читая байты из потока частями.
+
+        Поток копируется во временный файл с одновременным вычислением SHA-256, поэтому
+        изображение целиком не загружается в память. Если включена нормализация
+        (image_utils.normalize_images), процесс пула читает изображение из этого файла и перекодирует его
+        до обращения к базе данных, и сохраняются перекодированные байты. Изображение больше max_size
+        отклоняется во время чтения, до нормализации. Если изображение с таким хешем уже хранится,
+        байты повторно не записываются, добавляется только ссылка на него.
+
+        :param pereval_id: ID перевала.
+        :param title: Название изображения.
+        :param stream: Файлоподобный объект с байтами изображения.
+        :param max_size: Максимальный размер изображения в байтах.
+        :param chunk_size: Размер части, читаемой из потока и передаваемой серверу за один раз.
+        :return: Словарь {'state': 1, 'id': ID изображения, 'size': размер, 'sha256': хеш,
+                 'deduplicated': True, если байты уже хранились} или
+                 {'state': 0, 'status': HTTP-код, 'message': причина ошибки}.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        normalize = normalization_enabled()
+        # Для нормализации изображение передаётся процессу пула именем файла, поэтому сразу пишется
+        # на диск; без неё небольшие изображения остаются в памяти, большие записываются на диск
+        spool = tempfile.NamedTemporaryFile() if normalize else tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        with spool:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    return {'state': 0, 'status': 413, 'message': f"Размер изображения превышает {max_size} байт"}
+                digest.update(chunk)
+                spool.write(chunk)
+            if size == 0:
+                return {'state': 0, 'status': 400, 'message': "Пустое изображение"}
+            sha256 = digest.hexdigest()
+            spool.flush()
+            spool.seek(0)
+            IMAGE_SIZE.observe(size)
+            source = spool
+            if normalize:
+                try:
+                    image_bytes = normalize_images([spool.name])[0]
+                except NormalizationError as e:
+                    return {'state': 0, 'status': 422, 'message': f"Не удалось обработать изображение: {e}"}
+                # Если изображение сохраняется без изменений, возвращается имя файла, и байты читаются из него
+                if isinstance(image_bytes, bytes):
+                    source = io.BytesIO(image_bytes)
+                    size = len(image_bytes)
+                    sha256 = hashlib.sha256(image_bytes).hexdigest()
+
+            try:
+                with self._cursor() as cursor:
+                    cursor.execute("""
+                        SELECT EXISTS (SELECT 1 FROM pereval_added WHERE id = %s),
+                               EXISTS (SELECT 1 FROM image_blobs WHERE sha256 = %s);
+                        """, (pereval_id, sha256))
+                    pereval_exists, deduplicated = cursor.fetchone()
+                    if not pereval_exists:
+                        return {'state': 0, 'status': 404, 'message': "Перевал не найден"}
+                    if not deduplicated:
+                        try:
+                            cursor.copy_expert("COPY image_blobs (sha256, size, img) FROM STDIN;",
+                                               _CopyByteaReader((sha256, size), source), size=chunk_size)
+                        except errors.UniqueViolation:
+                            # То же изображение одновременно загрузил другой запрос
+                            deduplicated = True
+                    cursor.execute("""
+                        INSERT INTO pereval_images (pereval_id, title, image_sha256)
+                        VALUES (%s, %s, %s)
+                        RETURNING id;
+                        """, (pereval_id, title, sha256))
+                    image_id = cursor.fetchone()[0]
+                    return {'state': 1, 'id': image_id, 'size': size, 'sha256': sha256, 'deduplicated': deduplicated}
+            except errors.ForeignKeyViolation:
+                return {'state': 0, 'status': 404, 'message': "Перевал не найден"}
+            except Exception as e:
+                _log_error("Ошибка при загрузке изображения", e)
+                return {'state': 0, 'status': 500, 'message': f"Ошибка при загрузке изображения: {e}"}
+
+    @timed
     def check_user_exists(self, email):
         """
         Проверяет существование пользователя в базе данных по электронной почте.
@@ -152,7 +1130,7 @@ class DatabaseHandler:
         :return: True, если пользователь существует, иначе False.
         """
         try:
-            with self.conn.cursor() as cursor:
+            with self._cursor(read_only=True) as cursor:
                 query = sql.SQL("""
                 SELECT * FROM users
                 WHERE email = %s;
@@ -161,93 +1139,614 @@ class DatabaseHandler:
                 user = cursor.fetchone()
                 return user is not None
         except psycopg2.Error as e:
-            print(f"Ошибка при проверке существования пользователя: {e}")
+            _log_error("Ошибка при проверке существования пользователя", e)
             return False
 
+    @timed
     def get_pereval_by_id(self, pereval_id):
         """
         Получает информацию о перевале по его ID.
+        Результат кешируется; кеш сбрасывается при изменении перевала.
+
+        Кеш общий для всех сессий, поэтому в него попадают только строки, прочитанные с основной базы:
+        строка с отстающей реплики вернула бы в кеш версию, которую только что сбросило изменение.
+        Сессия в окне read-your-writes кеш не использует и читает основную базу.
 
         :param pereval_id: ID перевала.
-        :return: Данные перевала или None в случае ошибки.
+        :return: PerevalRecord или None, если перевал не найден или произошла ошибка.
+        """
+        cache_key = self._pereval_cache_key(pereval_id)
+        use_cache = not reads_from_primary(self.read_your_writes_window)
+        if use_cache:
+            record = self.cache.get(cache_key)
+            if record is not None:
+                return record
+        try:
+            with self._cursor(read_only=True) as cursor:
+                self.GET_PEREVAL.execute(cursor, (pereval_id,))
+                row = cursor.fetchone()
+                from_replica = cursor.connection.replica
+            if row is None:
+                return None
+            record = PerevalRecord._make(row)
+            if use_cache and not from_replica:
+                self.cache.set(cache_key, record)
+            return record
+        except Exception as e:
+            _log_error("Ошибка при получении перевала", e)
+            return None
+
+    @timed
+    def get_images_by_pereval_id(self, pereval_id):
+        """
+        Получает список изображений перевала без их содержимого.
+
+        :param pereval_id: ID перевала.
+        :return: Список ImageRecord (id, title, sha256, size), None, если перевал не найден
+                 или произошла ошибка.
+        """
+        try:
+            with self._cursor(read_only=True) as cursor:
+                self.GET_IMAGES.execute(cursor, (pereval_id,))
+                records = cursor.fetchall()
+                if not records:
+                    return None
+                # Перевал без изображений даёт одну строку со значениями NULL
+                return [ImageRecord._make(record) for record in records if record[0] is not None]
+        except Exception as e:
+            _log_error("Ошибка при получении изображений перевала", e)
+            return None
+
+    @timed
+    def get_image_info(self, image_id):
+        """
+        Получает хеш, размер и первые байты изображения (для определения его типа).
+
+        :param image_id: ID изображения.
+        :return: ImageInfo (sha256, size, head) или None, если изображение не найдено.
         """
         try:
-            with self.conn.cursor() as cursor:
-                query = sql.SQL(
-                    "SELECT id, beauty_title, title, other_titles, connect, add_time, user_id, coord_id, level_winter, level_summer, level_autumn, level_spring, status FROM pereval_added WHERE id = %s;")
-                cursor.execute(query, (pereval_id,))
+            with self._cursor(read_only=True) as cursor:
+                self.GET_IMAGE_INFO.execute(cursor, (image_id,))
                 record = cursor.fetchone()
-                return record
+                if record is None:
+                    return None
+                return ImageInfo(record[0], record[1], bytes(record[2]))
+        except Exception as e:
+            _log_error("Ошибка при получении изображения", e)
+            return None
+
+    def iter_image_bytes(self, sha256, start=0, length=None, chunk_size=1024 * 1024):
+        """
+        Читает байты изображения частями, не загружая его целиком в память.
+
+        :param sha256: Хеш изображения.
+        :param start: Смещение первого байта.
+        :param length: Количество байт (по умолчанию до конца изображения).
+        :param chunk_size: Размер части, читаемой одним запросом.
+        :return: Генератор частей изображения.
+        """
+        offset = start
+        end = None if length is None else start + length
+        while end is None or offset < end:
+            size = chunk_size if end is None else min(chunk_size, end - offset)
+            with self._cursor(read_only=True) as cursor:
+                # substring в PostgreSQL нумерует байты с 1
+                self.READ_IMAGE_CHUNK.execute(cursor, (offset + 1, size, sha256))
+                record = cursor.fetchone()
+            chunk = bytes(record[0]) if record else b''
+            if not chunk:
+                return
+            yield chunk
+            offset += len(chunk)
+
+    @timed
+    def get_image_bytes(self, sha256):
+        """
+        Получает все байты изображения.
+
+        :param sha256: Хеш изображения.
+        :return: Байты изображения или None, если изображение не найдено.
+        """
+        try:
+            with self._cursor(read_only=True) as cursor:
+                cursor.execute("SELECT img FROM image_blobs WHERE sha256 = %s;", (sha256,))
+                record = cursor.fetchone()
+                return bytes(record[0]) if record else None
+        except Exception as e:
+            _log_error("Ошибка при получении изображения", e)
+            return None
+
+    @timed
+    def get_thumbnail(self, sha256, size):
+        """
+        Получает сохранённую миниатюру изображения.
+
+        :param sha256: Хеш исходного изображения.
+        :param size: Размер миниатюры.
+        :return: Кортеж (байты, MIME-тип) или None, если миниатюры ещё нет.
+        """
+        try:
+            with self._cursor(read_only=True) as cursor:
+                cursor.execute("SELECT img, mime FROM image_thumbnails WHERE sha256 = %s AND size = %s;",
+                               (sha256, size))
+                record = cursor.fetchone()
+                return (bytes(record[0]), record[1]) if record else None
+        except Exception as e:
+            _log_error("Ошибка при получении миниатюры", e)
+            return None
+
+    @timed
+    def add_thumbnail(self, sha256, size, image_bytes, mime):
+        """
+        Сохраняет миниатюру изображения. Миниатюра, созданная параллельным запросом, не перезаписывается.
+
+        :param sha256: Хеш исходного изображения.
+        :param size: Размер миниатюры.
+        :param image_bytes: Байты миниатюры.
+        :param mime: MIME-тип миниатюры.
+        :return: True, если миниатюра сохранена, иначе False.
+        """
+        try:
+            with self._cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO image_thumbnails (sha256, size, mime, img)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (sha256, size) DO NOTHING;
+                    """, (sha256, size, mime, psycopg2.Binary(image_bytes)))
+                return True
+        except Exception as e:
+            _log_error("Ошибка при сохранении миниатюры", e)
+            return False
+
+    @timed
+    def store_uploaded_images(self, pereval_id):
+        """
+        Переносит изображения перевала из pereval_image_uploads в image_blobs и pereval_images:
+        нормализует их и вычисляет хеши (image_utils.prepare_images). Вызывается задачей
+        process_images (job_queue.py), поэтому эта работа не задерживает ответ на POST /submitData.
+
+        Нормализация выполняется без открытой транзакции. Исходные строки удаляются в той же
+        транзакции, что и добавляются изображения; если их уже перенёс другой обработчик
+        (задача забрана повторно после FSTR_JOB_LOCK_TIMEOUT), транзакция отменяется.
+
+        :param pereval_id: ID перевала.
+        :return: Количество перенесённых изображений.
+        :raises NormalizationError: Если изображение не удалось нормализовать; исходные байты
+                                    остаются в pereval_image_uploads и не выдаются API.
+        :raises psycopg2.Error: При ошибке базы данных.
+        """
+        with self._cursor() as cursor:
+            cursor.execute("""
+                SELECT id, title, img FROM pereval_image_uploads WHERE pereval_id = %s ORDER BY position;
+                """, (pereval_id,))
+            uploads = cursor.fetchall()
+        if not uploads:
+            return 0
+        refs, blobs = prepare_images([{'title': title, 'data': img} for _, title, img in uploads])
+        with self._transaction() as cursor:
+            cursor.execute("DELETE FROM pereval_image_uploads WHERE id = ANY(%s);",
+                           ([upload_id for upload_id, _, _ in uploads],))
+            if cursor.rowcount != len(uploads):
+                raise RuntimeError(f"Изображения перевала {pereval_id} уже обработаны другим обработчиком")
+            execute_values(cursor, sql.SQL("""
+                INSERT INTO image_blobs (sha256, size, img) VALUES %s
+                ON CONFLICT (sha256) DO NOTHING
+                """), [(sha256, len(image_bytes), psycopg2.Binary(image_bytes))
+                       for sha256, image_bytes in blobs.items()], page_size=len(blobs))
+            execute_values(cursor, sql.SQL(
+                "INSERT INTO pereval_images (pereval_id, title, image_sha256) VALUES %s"
+            ), [(pereval_id, title, sha256) for title, sha256 in refs], page_size=len(refs))
+        self.invalidate_pereval(pereval_id)
+        return len(refs)
+
+    @timed
+    def find_nearby(self, latitude, longitude, radius_m, min_height=None, limit=50):
+        """
+        Находит перевалы в радиусе от точки, ближайшие первыми.
+
+        Использует GiST-индекс по ll_to_earth(latitude, longitude) (расширения cube и earthdistance):
+        earth_box отбирает кандидатов по индексу, а оператор <-> упорядочивает их по расстоянию.
+
+        :param latitude: Широта точки.
+        :param longitude: Долгота точки.
+        :param radius_m: Радиус поиска в метрах.
+        :param min_height: Минимальная высота перевала.
+        :param limit: Максимальное количество перевалов.
+        :return: Список NearbyPass (id, beauty_title, title, status, latitude, longitude, height,
+                 расстояние в метрах) или None в случае ошибки.
+        """
+        try:
+            with self._cursor(read_only=True) as cursor:
+                self.FIND_NEARBY.execute(cursor, (latitude, longitude, radius_m, min_height, limit))
+                return [NearbyPass._make(record) for record in cursor.fetchall()]
         except Exception as e:
-            print(f"Ошибка при получении перевала: {e}")
+            _log_error("Ошибка при поиске перевалов рядом", e)
             return None
 
-    def update_pereval(self, pereval_id, data):
+    @timed
+    def search_passes(self, query, limit=20):
         """
-        Обновляет информацию о перевале.
+        Ищет перевалы по названиям с учётом опечаток и транслитерации.
+
+        Запрос сравнивается по триграммам с названиями перевала в исходном виде и латиницей,
+        поэтому «Pkhiya» находит «Пхия». Используется GIN-индекс pereval_added_search_idx.
+
+        :param query: Строка поиска.
+        :param limit: Максимальное количество перевалов.
+        :return: Список кортежей (id, beauty_title, title, other_titles, сходство), лучшие первыми,
+                 или None в случае ошибки.
+        """
+        try:
+            # Порог сходства задаётся только для этой транзакции: SET на соединении из пула
+            # сохранился бы для всех следующих запросов, которые его получат
+            with self._transaction(read_only=True) as cursor:
+                # Условие повторяет выражение индекса, иначе индекс не используется
+                query_sql = sql.SQL("""
+                    SELECT set_config('pg_trgm.word_similarity_threshold', %(threshold)s::text, true);
+                    SELECT id, beauty_title, title, other_titles,
+                           GREATEST(word_similarity(%(query)s, pereval_search_text(beauty_title, title, other_titles)),
+                                    word_similarity(%(translit)s, pereval_search_text(beauty_title, title, other_titles))
+                           ) AS score
+                    FROM pereval_added
+                    WHERE %(query)s <%% pereval_search_text(beauty_title, title, other_titles)
+                       OR %(translit)s <%% pereval_search_text(beauty_title, title, other_titles)
+                    ORDER BY score DESC, id
+                    LIMIT %(limit)s;
+                    """)
+                cursor.execute(query_sql, {
+                    'threshold': self.SEARCH_SIMILARITY_THRESHOLD,
+                    'query': query.lower(),
+                    'translit': translit_ru(query),
+                    'limit': limit,
+                })
+                return cursor.fetchall()
+        except Exception as e:
+            _log_error("Ошибка при поиске перевалов", e)
+            return None
+
+    @timed
+    def update_pereval(self, pereval_id, data, expected_versions=None):
+        """
+        Обновляет переданные поля перевала одним запросом.
+
+        Изменяются только столбцы полей, которые есть в data; остальные сохраняют значения.
+        Статус и версия проверяются в том же UPDATE, поэтому параллельный запрос не может
+        изменить перевал между проверкой и обновлением. Каждое обновление увеличивает версию.
 
         :param pereval_id: ID перевала.
-        :param data: Данные для обновления.
-        :return: Словарь с состоянием обновления и сообщением.
+        :param data: Изменяемые поля в формате запроса PATCH /submitData/<id>.
+        :param expected_versions: Версии, при которых разрешено обновление (из If-Match);
+                                  None - без проверки версии.
+        :return: Словарь {'state': 1, 'message', 'version': новая версия} или
+                 {'state': 0, 'status': HTTP-код, 'message': причина ошибки[, 'version': текущая версия]}.
         """
+        columns = update_columns(data)
+        if not columns:
+            return {'state': 0, 'status': 400, 'message': "Нет полей для обновления"}
+
+        conditions = [sql.SQL("id = %s"), sql.SQL("status = 'new'")]
+        params = [value for _, value in columns] + [pereval_id]
+        if expected_versions is not None:
+            conditions.append(sql.SQL("version = ANY(%s)"))
+            params.append(list(expected_versions))
+        query = sql.SQL(
+            "UPDATE pereval_added SET {columns}, version = version + 1 WHERE {where} RETURNING version;"
+        ).format(
+            columns=sql.SQL(', ').join(sql.SQL("{} = %s").format(sql.Identifier(column)) for column, _ in columns),
+            where=sql.SQL(" AND ").join(conditions),
+        )
         try:
-            with self.conn.cursor() as cursor:
-                # Проверяем статус, чтобы разрешить редактирование только если статус new
-                cursor.execute("SELECT status FROM pereval_added WHERE id = %s;", (pereval_id,))
-                status = cursor.fetchone()[0]
-                if status != 'new':
-                    return {'state': 0, 'message': 'Редактирование возможно только для записей со статусом new'}
-
-                # Подготовка запроса на обновление
-                update_query = sql.SQL("""
-                    UPDATE pereval_added
-                    SET beauty_title = %s, title = %s, other_titles = %s, connect = %s, add_time = %s,
-                        level_winter = %s, level_summer = %s, level_autumn = %s, level_spring = %s
-                    WHERE id = %s
-                """)
-                cursor.execute(update_query, (
-                    data.get('beauty_title'),
-                    data.get('title'),
-                    data.get('other_titles', ""),
-                    data.get('connect', ""),
-                    data.get('add_time'),
-                    data.get('level', {}).get('winter'),
-                    data.get('level', {}).get('summer'),
-                    data.get('level', {}).get('autumn'),
-                    data.get('level', {}).get('spring'),
-                    pereval_id
-                ))
-                return {'state': 1, 'message': 'Запись успешно обновлена'}
+            with self._cursor() as cursor:
+                cursor.execute(query, params)
+                record = cursor.fetchone()
+                if record is None:
+                    # Перевал не обновлён: выясняем причину (только в этом случае нужен второй запрос)
+                    cursor.execute("SELECT status, version FROM pereval_added WHERE id = %s;", (pereval_id,))
+                    return self._update_rejected(cursor.fetchone())
+            self.invalidate_pereval(pereval_id)
+            return {'state': 1, 'message': 'Запись успешно обновлена', 'version': record[0]}
+        except psycopg2.DataError as e:
+            return {'state': 0, 'status': 400, 'message': f"Неверный формат данных: {e}"}
         except Exception as e:
-            print(f"Ошибка при обновлении перевала: {e}")
-            return {'state': 0, 'message': f"Ошибка при обновлении: {e}"}
+            _log_error("Ошибка при обновлении перевала", e)
+            return {'state': 0, 'status': 500, 'message': f"Ошибка при обновлении: {e}"}
+
+    @staticmethod
+    def _update_rejected(record):
+        """
+        Формирует результат для перевала, который не удалось обновить.
+
+        :param record: Кортеж (status, version) перевала или None, если его нет.
+        """
+        if record is None:
+            return {'state': 0, 'status': 404, 'message': "Запись не найдена"}
+        status, version = record
+        if status != 'new':
+            return {'state': 0, 'status': 400, 'message': 'Редактирование возможно только для записей со статусом new'}
+        return {'state': 0, 'status': 412, 'message': "Запись изменена другим запросом, получите её заново",
+                'version': version}
+
+    @timed
+    def claim_perevals(self, moderator, limit=10, claim_ttl=1800):
+        """
+        Забирает перевалы из очереди модерации: статус new меняется на pending.
+
+        Строки отбираются с FOR UPDATE SKIP LOCKED: строки, которые в этот момент забирает
+        другой модератор, пропускаются, поэтому параллельные вызовы не получают одни и те же перевалы
+        и не ждут друг друга. Перевалы, забранные больше claim_ttl секунд назад и не обработанные,
+        снова попадают в очередь.
+
+        :param moderator: Имя модератора.
+        :param limit: Максимальное количество перевалов.
+        :param claim_ttl: Через сколько секунд необработанный перевал можно забрать снова.
+        :return: Список PerevalRecord, упорядоченный по ID.
+        """
+        query = sql.SQL("""
+            UPDATE pereval_added p
+            SET status = 'pending', claimed_by = %(moderator)s, claimed_at = now(), version = p.version + 1
+            FROM (
+                SELECT id FROM pereval_added
+                WHERE status = 'new'
+                   OR (status = 'pending' AND claimed_at < now() - %(claim_ttl)s * interval '1 second')
+                ORDER BY id
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            ) queue
+            WHERE p.id = queue.id
+            RETURNING {columns};
+            """).format(columns=sql.SQL(', ').join(sql.Identifier('p', column) for column in self.PEREVAL_COLUMNS))
+        with self._cursor() as cursor:
+            cursor.execute(query, {'moderator': moderator, 'claim_ttl': claim_ttl, 'limit': limit})
+            records = sorted((PerevalRecord._make(row) for row in cursor.fetchall()), key=lambda record: record.id)
+        for record in records:
+            self.invalidate_pereval(record.id)
+        return records
+
+    @timed
+    def release_perevals(self, ids, moderator, claim_ttl=1800):
+        """
+        Возвращает забранные перевалы в очередь модерации (pending -> new).
+
+        Возвращаются только перевалы, забранные этим модератором, и перевалы, забранные
+        больше claim_ttl секунд назад.
 
+        :param ids: Список ID перевалов.
+        :param moderator: Имя модератора.
+        :param claim_ttl: Через сколько секунд перевал, забранный другим модератором, можно вернуть.
+        :return: Список ID возвращённых перевалов.
+        """
+        with self._cursor() as cursor:
+            cursor.execute("""
+                UPDATE pereval_added
+                SET status = 'new', claimed_by = NULL, claimed_at = NULL, version = version + 1
+                WHERE id = ANY(%(ids)s) AND status = 'pending'
+                  AND (claimed_by = %(moderator)s OR claimed_at < now() - %(claim_ttl)s * interval '1 second')
+                RETURNING id;
+                """, {'ids': list(ids), 'moderator': moderator, 'claim_ttl': claim_ttl})
+            released = sorted(row[0] for row in cursor.fetchall())
+        for pereval_id in released:
+            self.invalidate_pereval(pereval_id)
+        return released
+
+    @timed
+    def set_pereval_status(self, ids, status, moderator, claim_ttl=1800):
+        """
+        Принимает или отклоняет перевалы одним запросом.
+
+        Изменяются только перевалы на модерации (new или pending); перевалы, забранные
+        другим модератором, пропускаются, пока не прошло claim_ttl секунд.
+
+        :param ids: Список ID перевалов.
+        :param status: Новый статус: accepted или rejected.
+        :param moderator: Имя модератора.
+        :param claim_ttl: Через сколько секунд перевал, забранный другим модератором, можно изменить.
+        :return: Список ID изменённых перевалов.
+        :raises ValueError: Если статус недопустим.
+        """
+        if status not in ('accepted', 'rejected'):
+            raise ValueError(f"Недопустимый статус {status}")
+        with self._cursor() as cursor:
+            cursor.execute("""
+                UPDATE pereval_added
+                SET status = %(status)s, claimed_by = %(moderator)s, claimed_at = now(), version = version + 1
+                WHERE id = ANY(%(ids)s)
+                  AND (status = 'new'
+                       OR (status = 'pending' AND (claimed_by = %(moderator)s
+                                                   OR claimed_at < now() - %(claim_ttl)s * interval '1 second')))
+                RETURNING id;
+                """, {'ids': list(ids), 'status': status, 'moderator': moderator, 'claim_ttl': claim_ttl})
+            updated = sorted(row[0] for row in cursor.fetchall())
+        for pereval_id in updated:
+            self.invalidate_pereval(pereval_id)
+        return updated
+
+    @timed
+    def enqueue_job(self, kind, payload, delay=0, max_attempts=5):
+        """
+        Ставит фоновую задачу в очередь jobs.
+
+        :param kind: Тип задачи (см. job_queue.JOB_HANDLERS).
+        :param payload: Параметры задачи (сериализуются в JSON).
+        :param delay: Через сколько секунд задачу можно выполнять.
+        :param max_attempts: Максимальное количество попыток.
+        :return: ID задачи.
+        """
+        with self._cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO jobs (kind, payload, run_at, max_attempts)
+                VALUES (%s, %s, now() + %s * interval '1 second', %s)
+                RETURNING id;
+                """, (kind, Json(payload), delay, max_attempts))
+            return cursor.fetchone()[0]
+
+    @timed
+    def claim_jobs(self, worker, limit=1, lock_timeout=600):
+        """
+        Забирает задачи, готовые к выполнению, и помечает их выполняемыми.
+
+        Строки отбираются с FOR UPDATE SKIP LOCKED, поэтому несколько обработчиков
+        получают разные задачи. Задачи, которые выполняются дольше lock_timeout секунд
+        (обработчик завершился аварийно), забираются снова.
+
+        :param worker: Имя обработчика.
+        :param limit: Максимальное количество задач.
+        :param lock_timeout: Через сколько секунд выполняемая задача считается брошенной.
+        :return: Список кортежей (id, kind, payload, attempts, max_attempts).
+        """
+        with self._cursor() as cursor:
+            cursor.execute("""
+                UPDATE jobs j
+                SET status = 'running', attempts = j.attempts + 1, locked_by = %(worker)s, locked_at = now()
+                FROM (
+                    SELECT id FROM jobs
+                    WHERE (status = 'queued' AND run_at <= now())
+                       OR (status = 'running' AND locked_at < now() - %(lock_timeout)s * interval '1 second')
+                    ORDER BY run_at
+                    LIMIT %(limit)s
+                    FOR UPDATE SKIP LOCKED
+                ) ready
+                WHERE j.id = ready.id
+                RETURNING j.id, j.kind, j.payload, j.attempts, j.max_attempts;
+                """, {'worker': worker, 'lock_timeout': lock_timeout, 'limit': limit})
+            return cursor.fetchall()
+
+    @timed
+    def complete_job(self, job_id):
+        """
+        Отмечает задачу выполненной.
+
+        :param job_id: ID задачи.
+        """
+        with self._cursor() as cursor:
+            cursor.execute("""
+                UPDATE jobs SET status = 'done', finished_at = now(), last_error = NULL
+                WHERE id = %s;
+                """, (job_id,))
 
+    @timed
+    def fail_job(self, job_id, error, retry_delay):
+        """
+        Отмечает неудачную попытку: задача повторяется через retry_delay секунд
+        или получает статус failed, если попытки закончились.
+
+        :param job_id: ID задачи.
+        :param error: Описание ошибки.
+        :param retry_delay: Задержка перед следующей попыткой в секундах.
+        :return: True, если задача будет повторена.
+        """
+        with self._cursor() as cursor:
+            cursor.execute("""
+                UPDATE jobs
+                SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                    run_at = now() + %s * interval '1 second',
+                    finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE now() END,
+                    locked_by = NULL, locked_at = NULL, last_error = %s
+                WHERE id = %s
+                RETURNING status;
+                """, (retry_delay, error, job_id))
+            record = cursor.fetchone()
+            return record is not None and record[0] == 'queued'
+
+    @timed
+    def job_stats(self):
+        """
+        Возвращает количество задач по статусам.
+
+        :return: Словарь {статус: количество}.
+        """
+        with self._cursor(read_only=True) as cursor:
+            cursor.execute("SELECT status, count(*) FROM jobs GROUP BY status;")
+            return dict(cursor.fetchall())
+
+    @timed
     def get_submissions_by_user_email(self, email):
         """
         Получает все перевалы, добавленные пользователем по его электронной почте.
 
         :param email: Электронная почта пользователя.
-        :return: Список перевалов или пустный список в случае ошибки.
+        :return: Список перевалов (столбцы PEREVAL_COLUMNS) или пустой список в случае ошибки.
         """
         try:
-            with self.conn.cursor() as cursor:
-                query = sql.SQL("""
-                    SELECT * FROM pereval_added
-                    WHERE user_id = (SELECT id FROM users WHERE email = %s)
-                    """)
-                cursor.execute(query, (email,))
-                records = cursor.fetchall()
-                return records
+            return list(self.iter_submissions(email=email, limit=None))
         except Exception as e:
-            print(f"Ошибка при получении данных пользователя: {e}")
+            _log_error("Ошибка при получении данных пользователя", e)
             return []
 
+    def iter_submissions(self, email=None, status=None, level=None, date_from=None, date_to=None, after_id=None,
+                         limit=100, columns=None, page_size=500):
+        """
+        Возвращает перевалы по фильтрам, упорядоченные по ID, по мере чтения с сервера.
+
+        Для постраничного вывода используется ключ (after_id), а не OFFSET, поэтому
+        время получения страницы не зависит от её номера. Строки читаются страницами
+        по page_size отдельными запросами по ключу: соединение возвращается в пул
+        до того, как строки страницы отдаются, поэтому медленный клиент не занимает его,
+        а память не зависит от количества перевалов.
+
+        :param email: Электронная почта пользователя.
+        :param status: Статус перевала.
+        :param level: Уровень сложности в любое время года.
+        :param date_from: Минимальное время добавления (включительно).
+        :param date_to: Максимальное время добавления (не включительно).
+        :param after_id: Возвращать перевалы с ID больше указанного.
+        :param limit: Максимальное количество перевалов (None - без ограничения).
+        :param columns: Столбцы из PEREVAL_COLUMNS (по умолчанию все).
+        :param page_size: Сколько строк читается одним запросом.
+        :return: Генератор кортежей значений столбцов columns.
+        """
+        columns = tuple(columns or self.PEREVAL_COLUMNS)
+        unknown = set(columns) - set(self.PEREVAL_COLUMNS)
+        if unknown:
+            raise ValueError(f"Неизвестные столбцы: {', '.join(sorted(unknown))}")
+        # ID нужен для запроса следующей страницы, даже если его нет в columns
+        selected = columns if 'id' in columns else ('id',) + columns
+        key_index = selected.index('id')
+
+        conditions = []
+        params = []
+        if email is not None:
+            conditions.append(sql.SQL("user_id = (SELECT id FROM users WHERE email = %s)"))
+            params.append(email)
+        if status is not None:
+            conditions.append(sql.SQL("status = %s"))
+            params.append(status)
+        if level is not None:
+            conditions.append(sql.SQL("%s IN (level_winter, level_summer, level_autumn, level_spring)"))
+            params.append(level)
+        if date_from is not None:
+            conditions.append(sql.SQL("add_time >= %s"))
+            params.append(date_from)
+        if date_to is not None:
+            conditions.append(sql.SQL("add_time < %s"))
+            params.append(date_to)
+
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            page_conditions = conditions + [sql.SQL("id > %s")] if after_id is not None else conditions
+            query = sql.SQL("SELECT {columns} FROM pereval_added {where} ORDER BY id LIMIT %s;").format(
+                columns=sql.SQL(', ').join(sql.Identifier(column) for column in selected),
+                where=sql.SQL("WHERE ") + sql.SQL(" AND ").join(page_conditions) if page_conditions else sql.SQL(""),
+            )
+            with self._cursor(read_only=True) as cursor:
+                cursor.execute(query, params + ([after_id] if after_id is not None else []) + [size])
+                rows = cursor.fetchall()
+            for row in rows:
+                yield row if selected is columns else row[1:]
+            if len(rows) < size:
+                return
+            after_id = rows[-1][key_index]
+            if remaining is not None:
+                remaining -= len(rows)
+
     def close(self):
         """
-        Закрывает соединение с базой данных.
+        Закрывает соединения пула.
         """
-        self.conn.close()
+        self.pool.closeall()
+        if self.replicas is not None:
+            self.replicas.closeall()
 
 
 # Пример использования
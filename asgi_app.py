@@ -0,0 +1,388 @@
+# pip install starlette uvicorn asyncpg a2wsgi
+import time
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse as StarletteJSONResponse, Response, StreamingResponse
+from starlette.routing import Match, Mount, Route
+from werkzeug.http import parse_etags
+
+import json_utils
+import metrics
+from compression import CompressionMiddleware
+from AsyncDatabaseHandler import AsyncDatabaseHandler
+from rate_limit import ConcurrencyLimiter, MemoryRateLimiter, concurrency_limit, retry_after
+from serializers import (encode_cursor, expected_versions, idempotency_key, parse_list_params,
+                         pereval_serializer, version_etag)
+from submitData import create_app
+from validation import format_errors, validate_pereval, validate_pereval_patch
+
+# Асинхронный режим API: основные маршруты /submitData обслуживаются без блокировки потока
+# на время запросов к базе данных. Остальные маршруты (пакетная отправка, загрузка и выдача
+# изображений, поиск, документация Swagger) передаются приложению Flask из submitData.py.
+#
+# Запуск:
+#     uvicorn asgi_app:app --workers 4
+
+# Приложение Flask для остальных маршрутов; его настройки использует и AsyncDatabaseHandler
+flask_app = create_app()
+
+# Формирование ответа GET /submitData/<id> из строки PerevalRecord
+serialize_pereval = pereval_serializer()
+
+
+class JSONResponse(StarletteJSONResponse):
+    """
+    Ответ JSON, сформированный той же реализацией, что и в приложении Flask (json_utils).
+    """
+
+    def render(self, content):
+        return json_utils.dumps(content)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Пул asyncpg создаётся в цикле событий каждого рабочего процесса
+    # Кеш перевалов общий с приложением Flask: модерация через его маршруты сбрасывает и этот кеш
+    db_handler = AsyncDatabaseHandler(cache=flask_app.extensions['fstr']['cache'], settings=flask_app.config)
+    await db_handler.open()
+    app.state.db_handler = db_handler
+    metrics.register_stats('asyncpg_pool', db_handler.pool_stats)
+    try:
+        yield
+    finally:
+        await db_handler.close()
+
+
+class MetricsMiddleware:
+    """
+    Записывает время обработки запросов маршрутов asgi_app в метрики и добавляет заголовок
+    Server-Timing (если включён FSTR_TRACE). Запросы, переданные приложению Flask, учитывает
+    само приложение Flask.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        token = metrics.start_trace()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                spans = metrics.current_spans()
+                # Маршрутизатор записывает обработчик в scope до его вызова
+                if spans is not None and not isinstance(scope.get('endpoint'), WSGIMiddleware):
+                    timing = metrics.server_timing(spans, time.perf_counter() - started)
+                    message = dict(message, headers=[*message.get('headers', []),
+                                                     (b'server-timing', timing.encode('latin-1'))])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            metrics.finish_trace(token)
+            endpoint = scope.get('endpoint')
+            if not isinstance(endpoint, WSGIMiddleware):
+                content_length = dict(scope['headers']).get(b'content-length', b'')
+                metrics.observe_request(scope['method'], getattr(endpoint, '__name__', None), status,
+                                        time.perf_counter() - started,
+                                        body_size=int(content_length) if content_length.isdigit() else None)
+
+
+class AdmissionMiddleware:
+    """
+    Ограничивает количество одновременно обрабатываемых запросов маршрутов asgi_app
+    (FSTR_MAX_CONCURRENCY): запрос сверх лимита сразу получает ответ 503 с Retry-After.
+    Запросы, переданные приложению Flask, ограничивает само приложение Flask.
+    """
+
+    def __init__(self, app, limit):
+        self.app = app
+        self.limiter = ConcurrencyLimiter(limit)
+        metrics.register_stats('asgi_concurrency', self.limiter.stats)
+
+    async def __call__(self, scope, receive, send):
+        route = _match_route(scope) if scope['type'] == 'http' else None
+        if route is None or isinstance(route, Mount):
+            await self.app(scope, receive, send)
+            return
+        if not self.limiter.try_acquire():
+            # Обработчик для метки маршрута в MetricsMiddleware: маршрутизатор до него не дойдёт
+            scope['endpoint'] = route.endpoint
+            metrics.count_rejected(route.name, 'overload')
+            response = JSONResponse({'status': 503, 'message': "Сервер перегружен, повторите запрос позже"},
+                                    status_code=503, headers={'Retry-After': retry_after(1)})
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release()
+
+
+def _match_route(scope):
+    """
+    Возвращает маршрут приложения, которому соответствует запрос, или None.
+    """
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route
+    return None
+
+
+async def _check_rate(limiter, key, route):
+    """
+    Проверяет частоту запросов клиента теми же ограничениями, что и приложение Flask
+    (FSTR_RATE_LIMIT, FSTR_USER_RATE_LIMIT).
+
+    :param limiter: Ограничение частоты запросов из flask_app.extensions['fstr'].
+    :param key: Ключ клиента, например ip:<адрес> или user:<почта>.
+    :param route: Имя обработчика для метрики fstr_rejected_requests_total.
+    :return: Ответ 429 или None, если запрос разрешён.
+    """
+    if isinstance(limiter, MemoryRateLimiter):
+        allowed, wait = limiter.acquire(key)
+    else:
+        # Запрос к Redis выполняется в пуле потоков, чтобы не блокировать цикл событий
+        allowed, wait = await run_in_threadpool(limiter.acquire, key)
+    if allowed:
+        return None
+    metrics.count_rejected(route, 'rate_limit')
+    return JSONResponse({'status': 429, 'message': "Слишком много запросов, повторите запрос позже"},
+                        status_code=429, headers={'Retry-After': retry_after(wait)})
+
+
+def _client_key(request):
+    """
+    Ключ ограничения частоты запросов по IP клиента (за прокси - uvicorn --proxy-headers).
+    """
+    return f"ip:{request.client.host if request.client else None}"
+
+
+async def _read_json(request):
+    """
+    Читает тело запроса как JSON. Тело больше FSTR_MAX_BODY_SIZE байт отклоняется до разбора.
+
+    :return: Кортеж (данные, None) или (None, ответ с ошибкой).
+    """
+    max_body_size = int(flask_app.config['FSTR_MAX_BODY_SIZE'])
+    too_large = JSONResponse({'status': 413, 'message': f"Размер запроса больше {max_body_size} байт"},
+                             status_code=413)
+    content_length = request.headers.get('content-length')
+    if content_length is not None and content_length.isdigit() and int(content_length) > max_body_size:
+        return None, too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_body_size:
+            return None, too_large
+    try:
+        return json_utils.loads(body), None
+    except ValueError as e:
+        return None, JSONResponse({'status': 400, 'message': f"Неверный формат JSON: {e}"}, status_code=400)
+
+
+def _validation_error(errors):
+    """
+    Ответ со всеми ошибками проверки данных.
+    """
+    return JSONResponse({'status': 400, 'message': format_errors(errors), 'errors': errors}, status_code=400)
+
+
+async def submit_data(request):
+    """
+    Обработка данных перевала (см. submitData.submit_data).
+    """
+    limiters = flask_app.extensions['fstr']
+    limited = await _check_rate(limiters['ip_limiter'], _client_key(request), 'submit_data')
+    if limited is not None:
+        return limited
+    data, error_response = await _read_json(request)
+    if error_response is not None:
+        return error_response
+    try:
+        # Проверка данных перевала
+        with metrics.span('validate'):
+            errors = validate_pereval(data)
+        if errors:
+            return _validation_error(errors)
+
+        limited = await _check_rate(limiters['user_limiter'], f"user:{data['user']['email'].strip().lower()}",
+                                    'submit_data')
+        if limited is not None:
+            return limited
+
+        try:
+            key = idempotency_key(request.headers.get('idempotency-key'))
+        except ValueError as e:
+            return JSONResponse({'status': 400, 'message': str(e)}, status_code=400)
+
+        # Пользователь, координаты, перевал и изображения добавляются одной транзакцией
+        result = await request.app.state.db_handler.submit_pereval(data, idempotency_key=key)
+        if result['state'] == 1:
+            headers = {'Idempotent-Replayed': 'true'} if result['replayed'] else None
+            if result['queued']:
+                return JSONResponse({'status': 202, 'id': result['id'],
+                                     'message': "Отправлено успешно, изображения обрабатываются"},
+                                    status_code=202, headers=headers)
+            return JSONResponse({'status': 200, 'id': result['id'], 'message': "Отправлено успешно"},
+                                headers=headers)
+        return JSONResponse({'status': result['status'], 'message': result['message']},
+                            status_code=result['status'])
+    except Exception as e:
+        return JSONResponse({'status': 500, 'message': f"Внутренняя ошибка {e}"}, status_code=500)
+
+
+async def list_submit_data(request):
+    """
+    Получение списка перевалов с фильтрами и постраничным выводом (см. submitData.list_submit_data).
+    """
+    try:
+        fields, columns, limit, filters = parse_list_params(request.query_params)
+    except ValueError as e:
+        return JSONResponse({'status': 400, 'message': f"Неверные параметры запроса: {e}"}, status_code=400)
+
+    # Страница читается одним запросом до начала ответа (см. submitData.list_submit_data)
+    rows = request.app.state.db_handler.iter_submissions(limit=limit + 1, columns=columns, page_size=limit + 1,
+                                                         **filters)
+    try:
+        first = await anext(rows, None)
+    except Exception as e:
+        await rows.aclose()
+        return JSONResponse({'status': 500, 'message': f"Внутренняя ошибка {e}"}, status_code=500)
+
+    serialize = pereval_serializer(columns, fields)
+
+    async def generate():
+        # Ответ формируется по мере чтения записей частями по STREAM_CHUNK_SIZE байт
+        try:
+            buffer = bytearray(b'{"status":200,"data":[')
+            row = first
+            count = 0
+            last_id = None
+            while row is not None and count < limit:
+                if count:
+                    buffer += b','
+                buffer += json_utils.dumps(serialize(row))
+                if len(buffer) >= json_utils.STREAM_CHUNK_SIZE:
+                    yield bytes(buffer)
+                    buffer.clear()
+                # ID всегда первый столбец (см. parse_list_params)
+                last_id = row[0]
+                count += 1
+                row = await anext(rows, None)
+            next_cursor = encode_cursor(last_id) if row is not None else None
+            buffer += b'],"next_cursor":' + json_utils.dumps(next_cursor) + b'}'
+            yield bytes(buffer)
+        finally:
+            # Возвращает соединение в пул, даже если клиент отключился до конца ответа
+            await rows.aclose()
+
+    return StreamingResponse(generate(), media_type='application/json')
+
+
+async def get_submit_data(request):
+    """
+    Получение данных перевала по ID (см. submitData.get_submit_data).
+    """
+    db_handler = request.app.state.db_handler
+    try:
+        record = await db_handler.get_pereval_by_id(request.path_params['id'])
+        if record:
+            etag = version_etag(record.version)
+            headers = {'ETag': f'"{etag}"'}
+            # Версия у клиента совпадает с текущей: данные не передаются (как make_conditional во Flask)
+            if parse_etags(request.headers.get('if-none-match')).contains_weak(etag):
+                return Response(status_code=304, headers=headers)
+            response_data = serialize_pereval(record)
+            return JSONResponse({'status': 200, 'data': response_data}, headers=headers)
+        return JSONResponse({'status': 404, 'message': "Запись не найдена"}, status_code=404)
+    except Exception as e:
+        return JSONResponse({'status': 500, 'message': f"Внутренняя ошибка {e}"}, status_code=500)
+
+
+async def patch_submit_data(request):
+    """
+    Обновление данных перевала по ID (см. submitData.patch_submit_data).
+    """
+    limited = await _check_rate(flask_app.extensions['fstr']['ip_limiter'], _client_key(request),
+                                'patch_submit_data')
+    if limited is not None:
+        return limited
+    data, error_response = await _read_json(request)
+    if error_response is not None:
+        return error_response
+    errors = validate_pereval_patch(data)
+    if errors:
+        return _validation_error(errors)
+    try:
+        # Обновляются только переданные поля; при If-Match - только если версия не изменилась
+        versions = expected_versions(parse_etags(request.headers.get('if-match')))
+        result = await request.app.state.db_handler.update_pereval(request.path_params['id'], data,
+                                                                   expected_versions=versions)
+        if result['state'] == 1:
+            return JSONResponse({'status': 200, 'message': "Запись успешно обновлена"},
+                                headers={'ETag': f'"{version_etag(result["version"])}"'})
+        headers = {'ETag': f'"{version_etag(result["version"])}"'} if 'version' in result else None
+        return JSONResponse({'status': result['status'], 'message': result['message']},
+                            status_code=result['status'], headers=headers)
+    except Exception as e:
+        return JSONResponse({'status': 500, 'message': f"Внутренняя ошибка {e}"}, status_code=500)
+
+
+async def get_images(request):
+    """
+    Получение списка изображений перевала (см. submitData.get_images).
+    """
+    try:
+        images = await request.app.state.db_handler.get_images_by_pereval_id(request.path_params['id'])
+        if images is None:
+            return JSONResponse({'status': 404, 'message': "Запись не найдена"}, status_code=404)
+        root_path = request.scope.get('root_path', '')
+        data = [{
+            "id": image_id,
+            "title": title,
+            "sha256": sha256,
+            "size": size,
+            "url": f"{root_path}/images/{image_id}"
+        } for image_id, title, sha256, size in images]
+        return JSONResponse({'status': 200, 'data': data})
+    except Exception as e:
+        return JSONResponse({'status': 500, 'message': f"Внутренняя ошибка {e}"}, status_code=500)
+
+
+routes = [
+    Route('/submitData', submit_data, methods=['POST']),
+    Route('/submitData', list_submit_data, methods=['GET']),
+    Route('/submitData/{id:int}', get_submit_data, methods=['GET']),
+    Route('/submitData/{id:int}', patch_submit_data, methods=['PATCH']),
+    Route('/submitData/{id:int}/images', get_images, methods=['GET']),
+    # Остальные маршруты выполняет приложение Flask в пуле потоков
+    Mount('/', app=WSGIMiddleware(flask_app)),
+]
+
+app = Starlette(
+    routes=routes,
+    lifespan=lifespan,
+    # Метрики учитывают полное время ответа, включая сжатие и отклонённые запросы
+    middleware=[Middleware(MetricsMiddleware),
+                Middleware(AdmissionMiddleware, limit=concurrency_limit(flask_app.config)),
+                Middleware(CompressionMiddleware, min_size=int(flask_app.config['FSTR_COMPRESSION_MIN_SIZE']))],
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app)
@@ -0,0 +1,197 @@
+"""
+Пакетная загрузка отчётов о перевалах.
+
+Принимает JSON-массив или NDJSON (один JSON-объект в строке), проверяет каждую запись
+так же, как POST /submitData, и добавляет записи в базу данных группами.
+
+Пример запуска:
+    python batch_loader.py reports.ndjson --chunk-size 500
+"""
+import argparse
+import json
+import sys
+
+from DatabaseHandler import DatabaseHandler
+from validation import format_errors, validate_pereval
+
+# Размер группы записей, добавляемых одной транзакцией
+DEFAULT_CHUNK_SIZE = 500
+
+# Группа добавляется раньше, если изображения её записей (в base64) занимают больше этого числа байт:
+# в памяти одновременно находится только одна группа
+DEFAULT_CHUNK_BYTES = 32 * 1024 * 1024
+
+
+def iter_ndjson(lines, max_line_size=None):
+    """
+    Разбирает NDJSON построчно.
+
+    :param lines: Файлоподобный объект или итератор строк (str или bytes).
+    :param max_line_size: Максимальная длина строки; более длинная строка считается ошибкой.
+                          Из файлоподобного объекта такая строка не загружается в память целиком.
+    :return: Генератор записей; для строк с некорректным JSON возвращается ValueError.
+    """
+    if max_line_size is not None and hasattr(lines, 'readline'):
+        lines = _read_lines(lines, max_line_size)
+    for line in lines:
+        if isinstance(line, Exception):
+            yield line
+            continue
+        if max_line_size is not None and len(line) > max_line_size:
+            yield ValueError(f"Строка длиннее {max_line_size} байт")
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"Некорректный JSON: {e}")
+
+
+def _read_lines(stream, max_line_size):
+    """
+    Читает строки из файлоподобного объекта частями не больше max_line_size.
+    Вместо слишком длинной строки возвращается ValueError, а её остаток пропускается.
+    """
+    while True:
+        line = stream.readline(max_line_size + 1)
+        if not line:
+            return
+        newline = b'\n' if isinstance(line, bytes) else '\n'
+        if len(line) <= max_line_size or line.endswith(newline):
+            yield line
+            continue
+        while line and not line.endswith(newline):
+            line = stream.readline(max_line_size + 1)
+        yield ValueError(f"Строка длиннее {max_line_size} байт")
+
+
+def iter_records(stream):
+    """
+    Определяет формат файла по первому символу и возвращает записи.
+
+    :param stream: Файл, открытый в текстовом режиме.
+    :return: Итератор записей (см. iter_ndjson).
+    """
+    first = stream.read(1)
+    while first and first.isspace():
+        first = stream.read(1)
+    if first == '[':
+        records = json.loads(first + stream.read())
+        if not isinstance(records, list):
+            raise ValueError("Ожидался JSON-массив")
+        return iter(records)
+    return iter_ndjson(_prepend(first, stream))
+
+
+def _prepend(first, stream):
+    """
+    Возвращает строки файла, восстанавливая уже прочитанный первый символ.
+    """
+    first_line = first + stream.readline()
+    yield first_line
+    yield from stream
+
+
+def _result(index, result):
+    """
+    Приводит результат DatabaseHandler к формату ответа API.
+    """
+    if result['state'] == 1:
+        return {'index': index, 'status': 200, 'id': result['id']}
+    return {'index': index, 'status': result['status'], 'message': result['message']}
+
+
+def _record_size(record):
+    """
+    Примерный размер проверенной записи: его определяют изображения в base64, длина остальных полей
+    ограничена проверкой.
+    """
+    return sum(len(image.get('data') or '') for image in record.get('images', []))
+
+
+def ingest(db_handler, records, chunk_size=DEFAULT_CHUNK_SIZE, max_records=None, max_chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """
+    Проверяет и добавляет записи группами по chunk_size или меньше, если записи группы
+    занимают больше max_chunk_bytes.
+
+    :param db_handler: Экземпляр DatabaseHandler.
+    :param records: Итератор записей; элементы-исключения считаются ошибками разбора.
+    :param chunk_size: Количество записей в одной транзакции.
+    :param max_records: Максимальное количество записей. Если записей больше, остальные не читаются,
+                        а последним возвращается один статус 413 с индексом первой необработанной записи.
+    :param max_chunk_bytes: Размер изображений группы (см. _record_size), после которого она добавляется
+                            (None - без ограничения).
+    :return: Генератор статусов записей {'index', 'status', 'id' или 'message'} в порядке поступления.
+    """
+    # Записи группы вместе со статусами отклонённых записей, чтобы статусы шли по порядку
+    pending = []
+    valid = 0
+    buffered = 0
+    for index, record in enumerate(records):
+        if max_records is not None and index >= max_records:
+            yield from _flush(db_handler, pending)
+            yield {'index': index, 'status': 413,
+                   'message': f"Превышено количество записей в пакете ({max_records}): "
+                              f"записи начиная с этой не обработаны"}
+            return
+        if isinstance(record, Exception):
+            error = str(record)
+        else:
+            errors = validate_pereval(record)
+            error = format_errors(errors) if errors else None
+        if error is not None:
+            pending.append((index, None, error, 400))
+            continue
+        pending.append((index, record, None, None))
+        valid += 1
+        buffered += _record_size(record)
+        if valid >= chunk_size or (max_chunk_bytes is not None and buffered >= max_chunk_bytes):
+            yield from _flush(db_handler, pending)
+            pending = []
+            valid = 0
+            buffered = 0
+    yield from _flush(db_handler, pending)
+
+
+def _flush(db_handler, pending):
+    """
+    Добавляет проверенные записи группы и возвращает статусы всех записей группы.
+    """
+    records = [record for _, record, error, _ in pending if error is None]
+    results = iter(db_handler.submit_pereval_batch(records) if records else [])
+    for index, _, error, status in pending:
+        if error is None:
+            yield _result(index, next(results))
+        else:
+            yield {'index': index, 'status': status, 'message': error}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help="Файл JSON или NDJSON ('-' для стандартного ввода)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Количество записей в одной транзакции")
+    args = parser.parse_args()
+
+    db_handler = DatabaseHandler()
+    stream = sys.stdin if args.path == '-' else open(args.path, encoding='utf-8')
+    accepted = rejected = 0
+    try:
+        # Статусы выводятся в формате NDJSON по мере добавления записей
+        for status in ingest(db_handler, iter_records(stream), chunk_size=args.chunk_size):
+            if status['status'] == 200:
+                accepted += 1
+            else:
+                rejected += 1
+            print(json.dumps(status, ensure_ascii=False), flush=True)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        db_handler.close()
+    print(f"Добавлено: {accepted}, отклонено: {rejected}", file=sys.stderr)
+    sys.exit(1 if rejected else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Замер холодного запуска приложения (важно для автомасштабирования и бессерверного запуска).
+
+Каждый запуск - новый процесс Python, в котором замеряются:
+    import: импорт submitData со всеми зависимостями;
+    create_app: создание приложения;
+    first: первый запрос --path через тестовый клиент Flask;
+    total: от запуска интерпретатора до ответа на первый запрос.
+Замеры выполняются с документацией Swagger и без неё (FSTR_SWAGGER); выводятся медианы в миллисекундах.
+По умолчанию запрашивается /metrics, которому не нужна база данных; с путём вроде /submitData/1
+в first входит и открытие соединений с базой данных.
+
+Пример запуска:
+    python -m benchmarks.bench_cold_start --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Код дочернего процесса: выводит длительности этапов в секундах
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import submitData
+imported = time.perf_counter()
+app = submitData.create_app()
+created = time.perf_counter()
+status = app.test_client().get(sys.argv[1]).status_code
+finished = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first': finished - created, 'status': status}))
+"""
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_once(path, swagger):
+    env = dict(os.environ, FSTR_SWAGGER='1' if swagger else '0')
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD, path], cwd=REPO_DIR, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    total = time.perf_counter() - started
+    result = json.loads(output.strip().splitlines()[-1])
+    result['total'] = total
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/metrics', help="Путь первого запроса")
+    args = parser.parse_args()
+
+    print(f"{'swagger':<10}{'import':>10}{'create_app':>12}{'first':>10}{'total':>10}{'код':>6}")
+    for swagger in (True, False):
+        results = [run_once(args.path, swagger) for _ in range(args.runs)]
+        medians = {key: statistics.median(result[key] for result in results) * 1000
+                   for key in ('import', 'create_app', 'first', 'total')}
+        print(f"{'да' if swagger else 'нет':<10}{medians['import']:>10.1f}{medians['create_app']:>12.1f}"
+              f"{medians['first']:>10.1f}{medians['total']:>10.1f}{results[-1]['status']:>6}")
+
+
+if __name__ == "__main__":
+    main()
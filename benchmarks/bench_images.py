@@ -0,0 +1,69 @@
+"""
+Замер нормализации изображений (image_utils.normalize_image).
+
+Каждое изображение из --image (по умолчанию test_1.png из репозитория и синтетическая фотография
+4000x3000) перекодируется в каждый формат из --formats. Выводится среднее время и p99 одного
+вызова в миллисекундах, размер до и после и экономия. База данных не нужна, нужен Pillow.
+
+Пример запуска:
+    python -m benchmarks.bench_images --formats webp,jpeg --quality 80 --max-side 2560
+"""
+import argparse
+import io
+import os
+
+from PIL import Image
+
+from benchmarks.bench_prepared import measure
+from image_utils import normalize_image
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_photo(width=4000, height=3000):
+    """
+    Синтетическая фотография: плавный градиент с шумом в JPEG высокого качества с EXIF,
+    как снимок с телефона.
+    """
+    image = Image.merge('RGB', [Image.linear_gradient('L').resize((width, height)),
+                                Image.effect_noise((width, height), 24),
+                                Image.linear_gradient('L').rotate(90).resize((width, height))])
+    exif = Image.Exif()
+    exif[0x010F] = "Phone"  # Make
+    exif[0x0112] = 1  # Orientation
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=95, exif=exif.tobytes())
+    return output.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', action='append', help="Путь к изображению (можно указать несколько раз)")
+    parser.add_argument('--formats', default='webp,jpeg', help="Форматы через запятую: webp, jpeg, avif")
+    parser.add_argument('--quality', type=int, default=80)
+    parser.add_argument('--max-side', type=int, default=2560)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=2)
+    args = parser.parse_args()
+
+    images = []
+    for path in args.image or [os.path.join(REPO_DIR, 'test_1.png')]:
+        with open(path, 'rb') as file:
+            images.append((os.path.basename(path), file.read()))
+    if not args.image:
+        images.append(('photo 4000x3000', make_photo()))
+
+    print(f"{'изображение':<18}{'формат':<8}{'среднее, мс':>13}{'p99, мс':>10}{'байт до':>11}{'байт после':>12}"
+          f"{'экономия':>10}")
+    for name, original in images:
+        for image_format in args.formats.split(','):
+            call_args = (original, image_format, args.quality, args.max_side)
+            mean, p99 = measure(normalize_image, call_args, args.iterations, args.warmup)
+            stored, _ = normalize_image(*call_args)
+            saved = 100 * (len(original) - len(stored)) / len(original)
+            print(f"{name:<18}{image_format:<8}{mean / 1000:>13.1f}{p99 / 1000:>10.1f}{len(original):>11}"
+                  f"{len(stored):>12}{saved:>9.0f}%")
+
+
+if __name__ == "__main__":
+    main()
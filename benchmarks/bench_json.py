@@ -0,0 +1,64 @@
+"""
+Замер сериализации и сжатия ответа со списком перевалов.
+
+Страница списка из --items перевалов сериализуется:
+    json: json.dumps, как jsonify Flask до json_utils (с экранированием кириллицы \\uXXXX);
+    fast: json_utils.dumps (orjson, если установлен).
+Затем ответ сжимается каждой доступной кодировкой. Выводится среднее время и p99 одного вызова
+в микросекундах и размер ответа в байтах. База данных не нужна.
+
+Пример запуска:
+    python -m benchmarks.bench_json --items 500 --iterations 200
+"""
+import argparse
+import json
+from datetime import datetime, timedelta
+
+import compression
+import json_utils
+from benchmarks.bench_prepared import measure
+from records import PerevalRecord
+from serializers import pereval_serializer
+
+
+def make_page(items):
+    """
+    Создаёт страницу списка перевалов в том виде, в котором её отдаёт GET /submitData/?user__email=...
+    """
+    serialize = pereval_serializer()
+    started = datetime(2021, 9, 22, 13, 18, 13)
+    records = [
+        PerevalRecord(i, "пер. ", f"Пхия {i}", "Триев", "", started + timedelta(minutes=i), 1, i,
+                      "", "1А", "1А", "", "new", 1)
+        for i in range(1, items + 1)
+    ]
+    return {'items': [serialize(record) for record in records], 'next_cursor': None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=500, help="Количество перевалов на странице")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    args = parser.parse_args()
+
+    page = make_page(args.items)
+    stdlib = json.dumps(page, separators=(',', ':')).encode('utf-8')
+    fast = json_utils.dumps(page)
+    results = [
+        ('json', measure(lambda: json.dumps(page, separators=(',', ':')).encode('utf-8'), (),
+                         args.iterations, args.warmup), len(stdlib)),
+        (f"fast ({json_utils.JSON_BACKEND})", measure(json_utils.dumps, (page,), args.iterations, args.warmup),
+         len(fast)),
+    ]
+    for encoding in compression.available_encodings():
+        results.append((encoding, measure(compression.compress, (fast, encoding), args.iterations, args.warmup),
+                        len(compression.compress(fast, encoding))))
+
+    print(f"{'этап':<16}{'среднее, мкс':>14}{'p99, мкс':>12}{'байт':>10}")
+    for name, (mean, p99), size in results:
+        print(f"{name:<16}{mean:>14.1f}{p99:>12.1f}{size:>10}")
+
+
+if __name__ == "__main__":
+    main()
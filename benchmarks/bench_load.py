@@ -0,0 +1,97 @@
+"""
+Нагрузочное сравнение режимов API: Flask (submitData.py) и ASGI (asgi_app.py).
+
+Для каждого адреса запускается заданное число одновременных клиентов; каждый клиент
+в цикле отправляет запрос и ждёт --think-time секунд (медленный мобильный клиент).
+Выводятся пропускная способность, задержки p50/p99 и число ошибок.
+Серверы должны быть запущены заранее, например:
+    python submitData.py
+    uvicorn asgi_app:app --port 8000 --workers 4
+
+Пример запуска:
+    python -m benchmarks.bench_load --url flask=http://localhost:5000 --url asgi=http://localhost:8000 \\
+        --scenario get --concurrency 2000 --duration 30 --think-time 1
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+import httpx
+
+from benchmarks.common import make_payload, percentile
+
+SCENARIOS = ('get', 'list', 'submit')
+
+
+def make_request(scenario, ids):
+    """
+    Возвращает (метод, путь, тело) очередного запроса сценария.
+    """
+    if scenario == 'get':
+        return 'GET', f"/submitData/{next(ids)}", None
+    if scenario == 'list':
+        return 'GET', "/submitData?limit=20", None
+    return 'POST', "/submitData", make_payload(images=0, image_size=0)
+
+
+async def client_loop(client, scenario, ids, deadline, think_time, latencies, errors):
+    while time.monotonic() < deadline:
+        method, path, body = make_request(scenario, ids)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=body)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+            else:
+                latencies.append((time.perf_counter() - started) * 1000)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        if think_time:
+            await asyncio.sleep(think_time)
+
+
+async def run(url, scenario, concurrency, duration, think_time, ids):
+    latencies = []
+    errors = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        started = time.monotonic()
+        deadline = started + duration
+        await asyncio.gather(*(
+            client_loop(client, scenario, ids, deadline, think_time, latencies, errors)
+            for _ in range(concurrency)
+        ))
+        elapsed = time.monotonic() - started
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) if latencies else float('nan'),
+        'p99_ms': percentile(latencies, 99) if latencies else float('nan'),
+        'errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', action='append', required=True, metavar='ИМЯ=АДРЕС',
+                        help="Адрес сервера; можно указать несколько раз")
+    parser.add_argument('--scenario', choices=SCENARIOS, default='get')
+    parser.add_argument('--concurrency', type=int, default=500, help="Число одновременных клиентов")
+    parser.add_argument('--duration', type=float, default=30, help="Длительность замера в секундах")
+    parser.add_argument('--think-time', type=float, default=0, help="Пауза клиента между запросами в секундах")
+    parser.add_argument('--ids', default='1-100', help="Диапазон ID перевалов для сценария get")
+    args = parser.parse_args()
+
+    first, last = (int(value) for value in args.ids.split('-'))
+    print(f"{'режим':<12}{'запросов':>10}{'зап/с':>10}{'p50, мс':>10}{'p99, мс':>10}{'ошибок':>8}")
+    for target in args.url:
+        name, _, url = target.partition('=')
+        ids = itertools.cycle(range(first, last + 1))
+        result = asyncio.run(run(url, args.scenario, args.concurrency, args.duration, args.think_time, ids))
+        print(f"{name:<12}{result['requests']:>10}{result['rps']:>10.1f}{result['p50_ms']:>10.2f}"
+              f"{result['p99_ms']:>10.2f}{result['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Замер выигрыша от подготовленных запросов и сгенерированной сериализации.
+
+Сравнивается получение перевала по ID (GET /submitData/<id> без кеша):
+    old: запрос sql.SQL с разбором на сервере при каждом вызове, dict(zip(...)) и перебор полей ответа;
+    new: EXECUTE запроса, подготовленного один раз на соединение, PerevalRecord и сгенерированный сериализатор.
+Запрос и сериализация замеряются отдельно; выводится среднее время и p99 одного вызова в микросекундах.
+Нужна запущенная база данных Pereval (см. migrate.py) с перевалом --id.
+
+Пример запуска:
+    python -m benchmarks.bench_prepared --id 1 --iterations 5000
+"""
+import argparse
+import time
+from datetime import datetime
+
+from psycopg2 import sql
+
+from DatabaseHandler import DatabaseHandler
+from benchmarks.common import percentile
+from records import PEREVAL_COLUMNS, PerevalRecord
+from serializers import RESPONSE_FIELDS, pereval_serializer
+
+
+def query_old(cursor, pereval_id):
+    query = sql.SQL(
+        "SELECT id, beauty_title, title, other_titles, connect, add_time, user_id, coord_id, level_winter, level_summer, level_autumn, level_spring, status FROM pereval_added WHERE id = %s;")
+    cursor.execute(query, (pereval_id,))
+    return cursor.fetchone()
+
+
+def query_new(cursor, pereval_id):
+    DatabaseHandler.GET_PEREVAL.execute(cursor, (pereval_id,))
+    return PerevalRecord._make(cursor.fetchone())
+
+
+def serialize_old(record):
+    """
+    Формирование ответа перебором полей, как это делалось до сгенерированных сериализаторов.
+    """
+    row = dict(zip(PEREVAL_COLUMNS, record))
+    data = {}
+    for field in RESPONSE_FIELDS:
+        if field == 'level':
+            data['level'] = {"winter": row['level_winter'], "summer": row['level_summer'],
+                             "autumn": row['level_autumn'], "spring": row['level_spring']}
+        elif field == 'add_time':
+            add_time = row['add_time']
+            data['add_time'] = add_time.strftime("%a, %d %b %Y %H:%M:%S GMT") if isinstance(add_time, datetime) \
+                else add_time
+        else:
+            data[field] = row[field]
+    return data
+
+
+def measure(function, argument, iterations, warmup):
+    for _ in range(warmup):
+        function(*argument)
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        function(*argument)
+        timings.append((time.perf_counter() - started) * 1e6)
+    return sum(timings) / len(timings), percentile(timings, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--id', type=int, default=1, help="ID существующего перевала")
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument('--warmup', type=int, default=200)
+    args = parser.parse_args()
+
+    db_handler = DatabaseHandler(minconn=1, maxconn=1)
+    serialize_new = pereval_serializer()
+    try:
+        with db_handler._cursor() as cursor:
+            record = query_new(cursor, args.id)
+            results = [
+                ('query old', measure(query_old, (cursor, args.id), args.iterations, args.warmup)),
+                ('query new', measure(query_new, (cursor, args.id), args.iterations, args.warmup)),
+                ('json old', measure(serialize_old, (tuple(record),), args.iterations, args.warmup)),
+                ('json new', measure(serialize_new, (record,), args.iterations, args.warmup)),
+            ]
+        print(f"{'этап':<12}{'среднее, мкс':>14}{'p99, мкс':>12}")
+        for name, (mean, p99) in results:
+            print(f"{name:<12}{mean:>14.1f}{p99:>12.1f}")
+    finally:
+        db_handler.close()
+
+
+if __name__ == "__main__":
+    main()
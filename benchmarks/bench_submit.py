@@ -0,0 +1,111 @@
+"""
+Сравнение старого и нового пути добавления перевала.
+
+Старый путь: check_user_exists, add_user, add_coord, add_pereval и add_image для каждого изображения.
+Новый путь: DatabaseHandler.submit_pereval (одна цепочка CTE).
+
+Для каждого пути выводится число обращений к серверу на одну заявку и задержки p50/p99.
+Нужна запущенная база данных Pereval (см. migrate.py).
+
+Пример запуска:
+    python -m benchmarks.bench_submit --iterations 200 --images 3 --image-size 50000
+"""
+import argparse
+import time
+
+from psycopg2 import extensions
+
+from DatabaseHandler import ConnectionPool, DatabaseHandler, PreparedConnection
+from benchmarks.common import make_payload, percentile
+
+
+class CountingCursor(extensions.cursor):
+    """
+    Курсор, считающий обращения к серверу.
+    """
+    round_trips = 0
+
+    def execute(self, query, vars=None):
+        CountingCursor.round_trips += 1
+        return super().execute(query, vars)
+
+
+def submit_legacy(db_handler, data):
+    """
+    Добавление перевала отдельными вызовами, как это делал submit_data раньше.
+    """
+    user_info = data['user']
+    if db_handler.check_user_exists(user_info['email']):
+        return None
+    user_id = db_handler.add_user(user_info['email'], user_info['fam'], user_info['name'],
+                                  user_info['otc'], user_info['phone'])
+    coord_id = db_handler.add_coord(data['coords']['latitude'], data['coords']['longitude'],
+                                    data['coords']['height'])
+    pereval_id = db_handler.add_pereval(
+        beauty_title=data['beauty_title'],
+        title=data['title'],
+        other_titles=data['other_titles'],
+        connect=data['connect'],
+        add_time=data['add_time'],
+        user_id=user_id,
+        coord_id=coord_id,
+        level_winter=data['level']['winter'],
+        level_summer=data['level']['summer'],
+        level_autumn=data['level']['autumn'],
+        level_spring=data['level']['spring'],
+        status='new'
+    )
+    for image in data['images']:
+        db_handler.add_image(image['data'], image['title'], pereval_id)
+    return pereval_id
+
+
+def submit_pipeline(db_handler, data):
+    return db_handler.submit_pereval(data).get('id')
+
+
+def run(db_handler, submit, iterations, warmup, images, image_size):
+    payloads = [make_payload(images, image_size) for _ in range(iterations + warmup)]
+    for data in payloads[:warmup]:
+        submit(db_handler, data)
+
+    CountingCursor.round_trips = 0
+    latencies = []
+    for data in payloads[warmup:]:
+        started = time.perf_counter()
+        submit(db_handler, data)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {
+        'round_trips': CountingCursor.round_trips / iterations,
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--images', type=int, default=2, help="Количество изображений в заявке")
+    parser.add_argument('--image-size', type=int, default=50000, help="Размер изображения в байтах")
+    args = parser.parse_args()
+
+    db_handler = DatabaseHandler(minconn=1, maxconn=1)
+    # Подменяем пул, чтобы считать обращения к серверу
+    db_handler.pool.closeall()
+    db_handler.pool = ConnectionPool(
+        minconn=1, maxconn=1, cursor_factory=CountingCursor, connection_factory=PreparedConnection,
+        host=db_handler.host, port=db_handler.port, user=db_handler.user,
+        password=db_handler.password, database=db_handler.database
+    )
+    try:
+        print(f"{'путь':<12}{'обращений':>12}{'p50, мс':>12}{'p99, мс':>12}")
+        for name, submit in (('legacy', submit_legacy), ('pipeline', submit_pipeline)):
+            result = run(db_handler, submit, args.iterations, args.warmup, args.images, args.image_size)
+            print(f"{name:<12}{result['round_trips']:>12.1f}{result['p50_ms']:>12.2f}{result['p99_ms']:>12.2f}")
+    finally:
+        db_handler.close()
+
+
+if __name__ == "__main__":
+    main()
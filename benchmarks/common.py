@@ -0,0 +1,39 @@
+"""
+Общие функции скриптов замеров.
+"""
+import base64
+import math
+import os
+import uuid
+
+
+def percentile(values, q):
+    """
+    Перцентиль по методу ближайшего ранга.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def make_payload(images, image_size):
+    """
+    Создаёт данные перевала с уникальной почтой и случайными изображениями.
+    """
+    image = base64.b64encode(os.urandom(image_size)).decode('utf-8')
+    return {
+        "beauty_title": "пер. ",
+        "title": "Пхия",
+        "other_titles": "Триев",
+        "connect": "",
+        "add_time": "2021-09-22 13:18:13",
+        "user": {
+            "email": f"bench-{uuid.uuid4().hex}@example.com",
+            "fam": "Иванов",
+            "name": "Иван",
+            "otc": "Иванович",
+            "phone": "+7 123 456 78 90"
+        },
+        "coords": {"latitude": 45.0, "longitude": 30.0, "height": 1000},
+        "level": {"winter": "", "summer": "1А", "autumn": "1А", "spring": ""},
+        "images": [{"data": image, "title": f"Фото {i}"} for i in range(images)]
+    }
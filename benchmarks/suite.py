@@ -0,0 +1,356 @@
+"""
+Воспроизводимый набор замеров API на локальной базе данных.
+
+Скрипт сам поднимает окружение: временный кластер PostgreSQL (initdb во временном каталоге,
+нужны initdb и pg_ctl из поставки PostgreSQL с расширениями cube, earthdistance и pg_trgm),
+базу Pereval со схемой из migrations/ и приложение (Flask или ASGI) в отдельном процессе
+на свободном порту. Сервер запускается отдельным процессом, чтобы генератор нагрузки
+не делил с ним GIL.
+
+Для каждого сценария (submit, get, patch, list) и каждого уровня одновременности замеряются
+пропускная способность и задержки p50/p90/p99 при закрытом цикле (клиент отправляет следующий
+запрос сразу после ответа). Результаты записываются в JSON; с --compare результаты сравниваются
+с сохранёнными ранее, и при ухудшении больше --tolerance скрипт завершается с кодом 1.
+
+Пример запуска:
+    python -m benchmarks.suite --concurrency 1,8,32 --duration 10 --output results.json
+    python -m benchmarks.suite --images 3 --image-size 200000 --scenarios submit
+    python -m benchmarks.suite --compare results.json --tolerance 0.2
+
+Вместо временного кластера можно указать существующий сервер (--host, --port, --user, --password);
+база Pereval на нём пересоздаётся миграциями только с флагом --load-schema.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+import psycopg2
+
+import migrate
+from benchmarks.common import make_payload, percentile
+
+SCENARIOS = ('submit', 'get', 'patch', 'list')
+
+# Корневой каталог проекта
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    """
+    Возвращает свободный TCP-порт на 127.0.0.1.
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def find_pg_bin(pg_bin=None):
+    """
+    Находит каталог с initdb и pg_ctl: указанный явно, из PATH или по pg_config --bindir.
+    """
+    if pg_bin:
+        return pg_bin
+    initdb = shutil.which('initdb')
+    if initdb:
+        return os.path.dirname(initdb)
+    if shutil.which('pg_config'):
+        return subprocess.run(['pg_config', '--bindir'], check=True, capture_output=True, text=True).stdout.strip()
+    raise RuntimeError("Не найден initdb: укажите --pg-bin или существующий сервер через --host")
+
+
+class TemporaryPostgres:
+    """
+    Временный кластер PostgreSQL, который удаляется после замеров.
+    """
+
+    def __init__(self, pg_bin=None, port=None):
+        self.pg_bin = find_pg_bin(pg_bin)
+        self.port = port or free_port()
+        self.directory = None
+
+    def _run(self, program, *args):
+        subprocess.run([os.path.join(self.pg_bin, program), *args], check=True, capture_output=True)
+
+    def __enter__(self):
+        self.directory = tempfile.mkdtemp(prefix='fstr-bench-')
+        data = os.path.join(self.directory, 'data')
+        self._run('initdb', '-D', data, '-U', 'postgres', '-A', 'trust', '-E', 'UTF8', '--no-sync')
+        self._run('pg_ctl', '-D', data, '-w', '-l', os.path.join(self.directory, 'postgres.log'), 'start',
+                  '-o', f"-p {self.port} -k {self.directory} -c listen_addresses=127.0.0.1 -c max_connections=200")
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            self._run('pg_ctl', '-D', os.path.join(self.directory, 'data'), '-w', '-m', 'fast', 'stop')
+        finally:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def settings(self):
+        return {'host': '127.0.0.1', 'port': self.port, 'user': 'postgres', 'password': ''}
+
+
+def load_schema(settings):
+    """
+    Создаёт базу Pereval (пересоздаёт, если она есть) и применяет миграции.
+    """
+    conn = psycopg2.connect(dbname='postgres', **settings)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute('DROP DATABASE IF EXISTS "Pereval";')
+        cursor.execute('CREATE DATABASE "Pereval";')
+    conn.close()
+    conn = psycopg2.connect(dbname='Pereval', **settings)
+    migrate.migrate(conn)
+    with conn.cursor() as cursor:
+        cursor.execute("SHOW server_version;")
+        version = cursor.fetchone()[0]
+    conn.close()
+    return version
+
+
+def serve(mode, port, settings, pool_size):
+    """
+    Запускает приложение в дочернем процессе.
+    """
+    # Параметры замера задаются до создания приложения: asgi_app создаёт его при импорте
+    os.environ.update({
+        'FSTR_DB_HOST': settings['host'],
+        'FSTR_DB_PORT': str(settings['port']),
+        'FSTR_DB_LOGIN': settings['user'],
+        'FSTR_DB_PASS': settings['password'],
+        'FSTR_DB_POOL_MAX': str(pool_size),
+    })
+    if mode == 'flask':
+        from werkzeug.serving import make_server
+
+        from submitData import create_app
+        make_server('127.0.0.1', port, create_app(), threaded=True).serve_forever()
+    else:
+        import uvicorn
+
+        from asgi_app import app
+        uvicorn.run(app, host='127.0.0.1', port=port, log_level='warning')
+
+
+def wait_ready(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not process.is_alive():
+            raise RuntimeError("Процесс приложения завершился при запуске")
+        try:
+            if httpx.get(f"{base_url}/submitData?limit=1", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Приложение не ответило за {timeout} с")
+
+
+class RequestFactory:
+    """
+    Формирует запросы сценариев. ID для get и patch берутся по кругу из добавленных при подготовке.
+    """
+
+    def __init__(self, ids, images, image_size):
+        self.ids = itertools.cycle(ids)
+        self.images = images
+        self.image_size = image_size
+        self.counter = itertools.count()
+
+    def __call__(self, scenario):
+        if scenario == 'submit':
+            return 'POST', "/submitData", make_payload(images=self.images, image_size=self.image_size)
+        if scenario == 'get':
+            return 'GET', f"/submitData/{next(self.ids)}", None
+        if scenario == 'patch':
+            return 'PATCH', f"/submitData/{next(self.ids)}", {"connect": f"замер {next(self.counter)}"}
+        return 'GET', "/submitData?limit=20&status=new", None
+
+
+async def seed(base_url, count):
+    """
+    Добавляет перевалы без изображений для сценариев get и patch.
+
+    :return: Список ID.
+    """
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        responses = await asyncio.gather(*(
+            client.post("/submitData", json=make_payload(images=0, image_size=0)) for _ in range(count)
+        ))
+    return [response.json()['id'] for response in responses if response.status_code in (200, 202)]
+
+
+async def run_level(base_url, scenario, factory, concurrency, duration, warmup):
+    """
+    Замер одного сценария при заданном числе одновременных клиентов.
+    """
+    latencies = []
+    errors = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        measure_from = time.monotonic() + warmup
+        deadline = measure_from + duration
+
+        async def client_loop():
+            while time.monotonic() < deadline:
+                method, path, body = factory(scenario)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body)
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                # Запросы разогрева не учитываются
+                if time.monotonic() < measure_from:
+                    continue
+                if failed:
+                    errors.append(1)
+                else:
+                    latencies.append((time.perf_counter() - started) * 1000)
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+
+    return {
+        'scenario': scenario,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 50) if latencies else None,
+        'p90_ms': percentile(latencies, 90) if latencies else None,
+        'p99_ms': percentile(latencies, 99) if latencies else None,
+        'max_ms': max(latencies) if latencies else None,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Сравнивает результаты с сохранёнными ранее.
+
+    :return: Список описаний ухудшений (пустой, если их нет).
+    """
+    previous = {(item['scenario'], item['concurrency']): item for item in baseline['results']}
+    regressions = []
+    for item in results:
+        before = previous.get((item['scenario'], item['concurrency']))
+        if before is None:
+            continue
+        name = f"{item['scenario']} x{item['concurrency']}"
+        if before['rps'] and item['rps'] < before['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: {item['rps']:.1f} зап/с, было {before['rps']:.1f}")
+        if before['p99_ms'] and item['p99_ms'] and item['p99_ms'] > before['p99_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {item['p99_ms']:.1f} мс, было {before['p99_ms']:.1f}")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args, settings):
+    server_version = load_schema(settings) if args.load_schema or args.host is None else None
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    process = multiprocessing.get_context('spawn').Process(
+        target=serve, args=(args.mode, port, settings, max(args.concurrency)), daemon=True)
+    process.start()
+    try:
+        wait_ready(base_url, process)
+        ids = asyncio.run(seed(base_url, args.seed))
+        if not ids and {'get', 'patch'} & set(args.scenarios):
+            raise RuntimeError("Не удалось добавить перевалы для сценариев get и patch")
+        factory = RequestFactory(ids, args.images, args.image_size)
+        results = []
+        print(f"{'сценарий':<10}{'клиентов':>10}{'запросов':>10}{'зап/с':>10}{'p50, мс':>10}"
+              f"{'p99, мс':>10}{'ошибок':>8}")
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                result = asyncio.run(run_level(base_url, scenario, factory, concurrency, args.duration, args.warmup))
+                results.append(result)
+                print(f"{scenario:<10}{concurrency:>10}{result['requests']:>10}{result['rps']:>10.1f}"
+                      f"{result['p50_ms'] or 0:>10.2f}{result['p99_ms'] or 0:>10.2f}{result['errors']:>8}")
+    finally:
+        process.terminate()
+        process.join()
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'revision': git_revision(),
+            'mode': args.mode,
+            'python': platform.python_version(),
+            'postgres': server_version,
+            'cpu_count': os.cpu_count(),
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'images': args.images,
+            'image_size': args.image_size,
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('flask', 'asgi'), default='flask', help="Режим приложения")
+    parser.add_argument('--scenarios', type=lambda value: value.split(','), default=list(SCENARIOS),
+                        help="Сценарии через запятую: " + ', '.join(SCENARIOS))
+    parser.add_argument('--concurrency', type=lambda value: [int(item) for item in value.split(',')],
+                        default=[1, 8, 32], help="Уровни одновременности через запятую")
+    parser.add_argument('--duration', type=float, default=10, help="Длительность замера уровня в секундах")
+    parser.add_argument('--warmup', type=float, default=2, help="Разогрев перед замером в секундах")
+    parser.add_argument('--images', type=int, default=1, help="Изображений в одном отчёте (сценарий submit)")
+    parser.add_argument('--image-size', type=int, default=50000, help="Размер изображения в байтах")
+    parser.add_argument('--seed', type=int, default=200, help="Сколько перевалов добавить для get и patch")
+    parser.add_argument('--output', help="Файл для результатов в формате JSON")
+    parser.add_argument('--compare', help="Файл с прежними результатами для поиска ухудшений")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Допустимое ухудшение (0.2 = 20%%)")
+    parser.add_argument('--pg-bin', help="Каталог с initdb и pg_ctl")
+    parser.add_argument('--host', help="Существующий сервер PostgreSQL вместо временного кластера")
+    parser.add_argument('--port', type=int, default=5432)
+    parser.add_argument('--user', default='postgres')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--load-schema', action='store_true',
+                        help="Пересоздать базу Pereval на существующем сервере и применить миграции")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+    if args.host is None:
+        with TemporaryPostgres(args.pg_bin) as cluster:
+            report = run_suite(args, cluster.settings())
+    else:
+        report = run_suite(args, {'host': args.host, 'port': args.port, 'user': args.user,
+                                  'password': args.password})
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline:
+            regressions = compare(report['results'], json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print(f"Ухудшение: {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
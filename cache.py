@@ -0,0 +1,202 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import json_utils
+from records import PerevalRecord
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    Потокобезопасный кеш в памяти процесса с ограничением размера (LRU) и временем жизни записей.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0, clock=time.monotonic):
+        """
+        :param maxsize: Максимальное количество записей (0 - кеш отключён).
+        :param ttl: Время жизни записи в секундах.
+        :param clock: Источник времени (подменяется в тестах).
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()  # ключ -> (значение, время истечения)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Возвращает значение из кеша.
+
+        :param key: Ключ.
+        :return: Значение или None, если записи нет или её время жизни истекло.
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] <= self._clock():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        """
+        Сохраняет значение в кеше, вытесняя давно не использованные записи.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, self._clock() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """
+        Удаляет запись из кеша.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """
+        Возвращает счётчики кеша.
+
+        :return: Словарь с количеством попаданий, промахов, вытеснений и записей.
+        """
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+            }
+
+
+class RedisCache:
+    """
+    Кеш во внешнем хранилище, совместимом с Redis, общий для всех процессов приложения.
+
+    Клиент должен поддерживать методы get(key), set(key, value, px=...) и delete(key),
+    поэтому вместо Redis можно передать совместимую локальную замену.
+
+    Записи хранятся в JSON, а не в pickle: разбор данных из общего хранилища не должен
+    выполнять код. Значения - строки record_type (namedtuple).
+    """
+
+    def __init__(self, client, ttl=60.0, prefix='fstr:', record_type=PerevalRecord):
+        """
+        :param client: Клиент Redis (например, redis.Redis) или совместимый объект.
+        :param ttl: Время жизни записи в секундах.
+        :param prefix: Префикс ключей.
+        :param record_type: Тип записей кеша.
+        """
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.record_type = record_type
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, key):
+        # Недоступность кеша не должна ломать чтение: считаем это промахом
+        try:
+            data = self.client.get(self.prefix + key)
+        except Exception as e:
+            logger.error("Ошибка при чтении из кеша: %s", e)
+            self._count('errors')
+            data = None
+        if data is None:
+            self._count('misses')
+            return None
+        try:
+            fields = json_utils.loads(data)
+            record = self.record_type(**{name: _decode(value) for name, value in fields.items()})
+        except (ValueError, TypeError, AttributeError) as e:
+            # Запись другого формата (например, от предыдущей версии приложения) считается промахом
+            logger.error("Некорректная запись в кеше %s: %s", key, e)
+            self._count('errors')
+            self._count('misses')
+            return None
+        self._count('hits')
+        return record
+
+    def set(self, key, value):
+        try:
+            data = json_utils.dumps(value._asdict(), default=_encode)
+            self.client.set(self.prefix + key, data, px=int(self.ttl * 1000))
+        except Exception as e:
+            logger.error("Ошибка при записи в кеш: %s", e)
+            self._count('errors')
+
+    def delete(self, key):
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception as e:
+            logger.error("Ошибка при удалении из кеша: %s", e)
+            self._count('errors')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'redis',
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+            }
+
+
+def _encode(value):
+    """
+    Сохраняет дату и время в JSON с отметкой типа, чтобы восстановить их при чтении.
+    """
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    raise TypeError(f"Тип {type(value).__name__} не поддерживается кешем")
+
+
+def _decode(value):
+    """
+    Восстанавливает значение, сохранённое _encode.
+    """
+    if isinstance(value, dict) and '__datetime__' in value:
+        return datetime.fromisoformat(value['__datetime__'])
+    return value
+
+
+def create_cache(url=None, maxsize=1024, ttl=60.0):
+    """
+    Создаёт кеш: в Redis, если указан url, иначе в памяти процесса.
+
+    :param url: Адрес Redis, например redis://localhost:6379/0.
+    :param maxsize: Максимальное количество записей кеша в памяти.
+    :param ttl: Время жизни записи в секундах.
+    :return: Экземпляр LRUCache или RedisCache.
+    """
+    if url:
+        # pip install redis
+        import redis
+        return RedisCache(redis.Redis.from_url(url), ttl=ttl)
+    return LRUCache(maxsize=maxsize, ttl=ttl)
@@ -0,0 +1,322 @@
+# pip install brotli zstandard (необязательно: без них доступно только gzip)
+import os
+import re
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli не установлен: кодировка br не предлагается
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard не установлен: кодировка zstd не предлагается
+    zstandard = None
+
+# Ответы меньше этого размера в байтах не сжимаются: выигрыш меньше накладных расходов
+# (по умолчанию; в приложении задаётся настройкой FSTR_COMPRESSION_MIN_SIZE)
+MIN_SIZE = 1024
+
+# Кодировки в порядке предпочтения сервера; из них выбирается первая, которую принимает клиент
+PREFERRED_ENCODINGS = tuple(os.getenv('FSTR_COMPRESSION', 'br,zstd,gzip').replace(' ', '').split(','))
+
+# Уровни сжатия: средние, чтобы сжатие не стоило больше времени, чем экономит передача
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+# Типы содержимого, которые имеет смысл сжимать (изображения уже сжаты)
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'application/ndjson', 'text/')
+
+# Заголовки запроса с ETag: приложение сравнивает их с ETag несжатого представления
+CONDITIONAL_HEADERS = ('If-None-Match', 'If-Match', 'If-Range')
+
+# Суффикс кодировки в ETag сжатого ответа: "v3" -> "v3-gzip"
+_ETAG_ENCODING_SUFFIX = re.compile(r'-(?:gzip|br|zstd)"')
+
+
+def available_encodings():
+    """
+    Возвращает кодировки из PREFERRED_ENCODINGS, для которых установлены библиотеки.
+    """
+    installed = {'gzip': True, 'br': brotli is not None, 'zstd': zstandard is not None}
+    return tuple(encoding for encoding in PREFERRED_ENCODINGS if installed.get(encoding))
+
+
+def choose_encoding(accept_encoding):
+    """
+    Выбирает кодировку сжатия по заголовку Accept-Encoding.
+
+    :param accept_encoding: Значение заголовка, например "gzip, deflate, br;q=0.9".
+    :return: 'br', 'zstd', 'gzip' или None, если сжимать не нужно.
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    best = None
+    for encoding in available_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        # При равном q выигрывает кодировка, которую предпочитает сервер
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+def is_compressible(mimetype):
+    """
+    Возвращает True, если содержимое такого типа стоит сжимать.
+    """
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_MIMETYPES)
+
+
+def encoded_etag(etag, encoding):
+    """
+    Возвращает ETag сжатого представления. Сжатый ответ отличается от несжатого побайтно,
+    поэтому сильный ETag получает суффикс кодировки; слабый ETag не меняется.
+
+    :param etag: Значение заголовка ETag, например '"v3"'.
+    :param encoding: Кодировка из choose_encoding.
+    :return: Например '"v3-gzip"'.
+    """
+    if etag.startswith('W/') or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def strip_etag_encodings(value):
+    """
+    Убирает суффиксы кодировки из ETag в заголовке If-None-Match, If-Match или If-Range,
+    чтобы приложение сравнивало их с ETag несжатого представления ('"v3-gzip"' -> '"v3"').
+    """
+    return _ETAG_ENCODING_SUFFIX.sub('"', value)
+
+
+def _not_modified_etag(etag, encoding, if_none_match):
+    """
+    ETag для ответа 304: если у клиента сохранено сжатое представление (его ETag с суффиксом
+    кодировки есть в If-None-Match), ответ содержит тот же ETag, иначе ETag не меняется.
+    """
+    if encoding is None or not etag:
+        return etag
+    etag_encoded = encoded_etag(etag, encoding)
+    return etag_encoded if etag_encoded != etag and etag_encoded in if_none_match else etag
+
+
+class _Compressor:
+    """
+    Потоковый компрессор с общим интерфейсом compress(chunk) и flush() для всех кодировок.
+    """
+
+    def __init__(self, encoding):
+        if encoding == 'gzip':
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._compress, self._flush = compressor.compress, compressor.flush
+        elif encoding == 'br':
+            compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._compress, self._flush = compressor.process, compressor.finish
+        elif encoding == 'zstd':
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+            self._compress, self._flush = compressor.compress, compressor.flush
+        else:
+            raise ValueError(f"Неизвестная кодировка {encoding}")
+
+    def compress(self, chunk):
+        return self._compress(chunk)
+
+    def flush(self):
+        return self._flush()
+
+
+def compress(data, encoding):
+    """
+    Сжимает байты целиком.
+
+    :param data: Байты.
+    :param encoding: Кодировка из choose_encoding.
+    :return: Сжатые байты.
+    """
+    compressor = _Compressor(encoding)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks, encoding):
+    """
+    Сжимает поток частей ответа по мере их появления.
+
+    :param chunks: Итератор частей (str или bytes).
+    :param encoding: Кодировка из choose_encoding.
+    :return: Генератор сжатых частей (пустые части пропускаются).
+    """
+    compressor = _Compressor(encoding)
+    try:
+        for chunk in chunks:
+            output = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            if output:
+                yield output
+        output = compressor.flush()
+        if output:
+            yield output
+    finally:
+        # Закрывает исходный генератор (и освобождает соединение с базой данных),
+        # даже если клиент отключился до конца ответа
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def init_app(app):
+    """
+    Подключает сжатие ответов приложения Flask.
+
+    Сжимаются ответы с кодом 200 и сжимаемым типом содержимого. Обычные ответы - если они не меньше
+    FSTR_COMPRESSION_MIN_SIZE байт, потоковые (список перевалов, пакетная отправка) - всегда, по мере формирования.
+    Сильный ETag сжатого ответа получает суффикс кодировки (encoded_etag), а из ETag в If-None-Match,
+    If-Match и If-Range суффикс убирается до обработки запроса: приложение сравнивает их с ETag
+    несжатого представления (версией перевала).
+    """
+    from flask import request
+
+    min_size = int(app.config.get('FSTR_COMPRESSION_MIN_SIZE', MIN_SIZE))
+
+    @app.before_request
+    def strip_request_etags():
+        environ = request.environ
+        environ['fstr.if_none_match'] = environ.get('HTTP_IF_NONE_MATCH', '')
+        for header in CONDITIONAL_HEADERS:
+            key = 'HTTP_' + header.upper().replace('-', '_')
+            if key in environ:
+                environ[key] = strip_etag_encodings(environ[key])
+
+    @app.after_request
+    def compress_response(response):
+        if request.method == 'HEAD' or 'Content-Encoding' in response.headers:
+            return response
+        if response.status_code == 304:
+            if 'ETag' in response.headers:
+                response.headers['ETag'] = _not_modified_etag(
+                    response.headers['ETag'], choose_encoding(request.headers.get('Accept-Encoding')),
+                    request.environ.get('fstr.if_none_match', ''))
+            return response
+        if response.status_code != 200 or not is_compressible(response.mimetype):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        if 'ETag' in response.headers:
+            response.headers['ETag'] = encoded_etag(response.headers['ETag'], encoding)
+        return response
+
+    return app
+
+
+class CompressionMiddleware:
+    """
+    Сжатие ответов для ASGI-приложения по тем же правилам, что и init_app.
+    Ответы, уже сжатые приложением Flask, передаются без изменений.
+    """
+
+    def __init__(self, app, min_size=MIN_SIZE):
+        """
+        :param app: ASGI-приложение.
+        :param min_size: Ответы меньше этого размера в байтах не сжимаются.
+        """
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope['headers'])
+        if_none_match = headers.get(b'if-none-match', b'').decode('latin-1')
+        # Приложение сравнивает ETag из запроса с ETag несжатого представления (см. init_app)
+        conditional = tuple(header.lower().encode('latin-1') for header in CONDITIONAL_HEADERS)
+        scope = dict(scope, headers=[
+            (key, strip_etag_encodings(value.decode('latin-1')).encode('latin-1') if key in conditional else value)
+            for key, value in scope['headers']
+        ])
+        if scope['method'] == 'HEAD':
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(headers.get(b'accept-encoding', b'').decode('latin-1'))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start, compressor
+            if message['type'] == 'http.response.start':
+                # Заголовки отправляются вместе с первой частью тела, когда известно, сжимать ли ответ
+                start = message
+                return
+            if message['type'] != 'http.response.body':
+                await send(message)
+                return
+            if start is not None:
+                response_start, start = start, None
+                response_headers = {key.lower(): value for key, value in response_start['headers']}
+                body = message.get('body', b'')
+                more_body = message.get('more_body', False)
+                etag = response_headers.get(b'etag', b'').decode('latin-1')
+                if response_start['status'] == 304 and etag:
+                    response_start = dict(response_start, headers=[
+                        (key, value) for key, value in response_start['headers'] if key.lower() != b'etag'
+                    ] + [(b'etag', _not_modified_etag(etag, encoding, if_none_match).encode('latin-1'))])
+                if (response_start['status'] != 200 or b'content-encoding' in response_headers
+                        or not is_compressible(response_headers.get(b'content-type', b'').decode('latin-1'))
+                        or (not more_body and len(body) < self.min_size)):
+                    await send(response_start)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                new_headers = [(key, value) for key, value in response_start['headers']
+                               if key.lower() not in (b'content-length', b'vary', b'etag')]
+                vary = response_headers.get(b'vary')
+                new_headers.append((b'vary', vary + b', Accept-Encoding' if vary else b'Accept-Encoding'))
+                new_headers.append((b'content-encoding', encoding.encode('latin-1')))
+                if etag:
+                    new_headers.append((b'etag', encoded_etag(etag, encoding).encode('latin-1')))
+                if not more_body:
+                    data = compressor.compress(body) + compressor.flush()
+                    new_headers.append((b'content-length', str(len(data)).encode('latin-1')))
+                    await send(dict(response_start, headers=new_headers))
+                    await send({'type': 'http.response.body', 'body': data})
+                    return
+                await send(dict(response_start, headers=new_headers))
+                await send({'type': 'http.response.body', 'body': compressor.compress(body), 'more_body': True})
+                return
+            if compressor is None:
+                await send(message)
+                return
+            more_body = message.get('more_body', False)
+            data = compressor.compress(message.get('body', b''))
+            if not more_body:
+                data += compressor.flush()
+            await send({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+
+        await self.app(scope, receive, send_compressed)
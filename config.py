@@ -0,0 +1,111 @@
+"""
+Настройки приложения: подключение к базе данных, пул соединений, кеш, ограничение нагрузки,
+документация Swagger.
+
+Значения берутся из переменных окружения FSTR_*. Файл настроек (путь в FSTR_CONFIG) задаёт
+значения, которых нет в окружении: строки КЛЮЧ=значение, как в env-файле docker. Ни файл,
+ни значения по умолчанию не изменяют os.environ.
+
+Настройки из DEFAULTS приложение читает из app.config (create_app) или получает
+в конструкторах DatabaseHandler и AsyncDatabaseHandler. Остальные параметры (нормализация
+изображений, очередь задач и т.п.) модули читают из переменных окружения при импорте.
+"""
+import os
+
+# Значения по умолчанию; пароль по умолчанию не задаётся
+DEFAULTS = {
+    'FSTR_DB_HOST': 'localhost',
+    'FSTR_DB_PORT': '5432',
+    'FSTR_DB_LOGIN': 'postgres',
+    'FSTR_DB_NAME': 'Pereval',
+    'FSTR_DB_POOL_MIN': '1',
+    'FSTR_DB_POOL_MAX': '10',
+    'FSTR_DB_POOL_TIMEOUT': '30',
+    'FSTR_DB_POOL_CHECK_INTERVAL': '30',
+    'FSTR_DB_READ_YOUR_WRITES': '5',
+    'FSTR_DB_REPLICA_RETRY': '30',
+    'FSTR_IDEMPOTENCY_TTL': str(24 * 60 * 60),
+    'FSTR_CACHE_SIZE': '1024',
+    'FSTR_CACHE_TTL': '60',
+    'FSTR_RATE_LIMIT': '2',
+    'FSTR_RATE_BURST': '30',
+    'FSTR_USER_RATE_LIMIT': '0.2',
+    'FSTR_USER_RATE_BURST': '10',
+    'FSTR_RATE_LIMIT_KEYS': '100000',
+    'FSTR_TRUSTED_PROXIES': '0',
+    'FSTR_SWAGGER': '1',
+    'FSTR_MAX_BODY_SIZE': str(32 * 1024 * 1024),
+    'FSTR_MAX_IMAGE_SIZE': str(20 * 1024 * 1024),
+    'FSTR_BATCH_MAX_RECORDS': '10000',
+    'FSTR_MODERATION_CLAIM_TTL': '1800',
+    # Токены модераторов: имя:токен через запятую; без них запросы модерации отклоняются
+    'FSTR_MODERATOR_TOKENS': '',
+    'FSTR_COMPRESSION_MIN_SIZE': '1024',
+}
+
+
+def read_env_file(path):
+    """
+    Читает файл настроек.
+
+    :param path: Путь к файлу со строками КЛЮЧ=значение; пустые строки и строки с # пропускаются.
+    :return: Словарь настроек.
+    :raises ValueError: Если строка не содержит знака =.
+    """
+    values = {}
+    with open(path, encoding='utf-8') as file:
+        for number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            key, separator, value = line.partition('=')
+            if not separator:
+                raise ValueError(f"{path}, строка {number}: нужно КЛЮЧ=значение")
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+                value = value[1:-1]
+            values[key.strip()] = value
+    return values
+
+
+def load_config(path=None, environ=None):
+    """
+    Собирает настройки: значения по умолчанию, затем файл настроек, затем переменные окружения.
+
+    :param path: Путь к файлу настроек (по умолчанию FSTR_CONFIG; без него файл не читается).
+    :param environ: Переменные окружения (по умолчанию os.environ).
+    :return: Словарь настроек FSTR_*.
+    """
+    environ = os.environ if environ is None else environ
+    config = dict(DEFAULTS)
+    path = path or environ.get('FSTR_CONFIG')
+    if path:
+        config.update(read_env_file(path))
+    config.update((key, value) for key, value in environ.items() if key.startswith('FSTR_'))
+    return config
+
+
+def is_enabled(value):
+    """
+    Возвращает True для значений настройки-флага '1', 'true', 'yes', 'on'.
+    """
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def parse_moderator_tokens(value):
+    """
+    Разбирает настройку FSTR_MODERATOR_TOKENS.
+
+    :param value: Строка "имя:токен,имя:токен".
+    :return: Список кортежей (токен в байтах, имя модератора).
+    :raises ValueError: Если элемент не содержит имени или токена.
+    """
+    tokens = []
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        name, _, token = item.partition(':')
+        if not name.strip() or not token.strip():
+            raise ValueError("FSTR_MODERATOR_TOKENS: нужно имя:токен через запятую")
+        tokens.append((token.strip().encode('utf-8'), name.strip()))
+    return tokens
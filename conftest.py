@@ -0,0 +1,2 @@
+# Каталог проекта добавляется в sys.path, чтобы тесты импортировали модули так же,
+# как приложение: import DatabaseHandler, from submitData import create_app
@@ -0,0 +1,323 @@
+# pip install Pillow (нужен для миниатюр и нормализации изображений)
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow не установлен: изображения хранятся как есть и отдаются только в исходном размере
+    Image = None
+
+from metrics import IMAGE_BYTES, IMAGE_NORMALIZED, IMAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Допустимые размеры миниатюр (параметр size), чтобы не хранить миниатюры произвольных размеров
+THUMBNAIL_SIZES = {int(size) for size in os.getenv('FSTR_THUMBNAIL_SIZES', '128,256,512,1024').split(',')}
+
+# Нормализация изображений перед сохранением: формат (webp, jpeg, avif; original - хранить как есть),
+# качество и максимальная сторона в пикселях
+NORMALIZE_FORMAT = os.getenv('FSTR_IMAGE_FORMAT', 'webp').lower()
+NORMALIZE_QUALITY = int(os.getenv('FSTR_IMAGE_QUALITY', '80'))
+NORMALIZE_MAX_SIDE = int(os.getenv('FSTR_IMAGE_MAX_SIDE', '2560'))
+
+# Количество процессов для нормализации (0 - в вызывающем потоке) и сколько секунд ждать результата
+NORMALIZE_WORKERS = int(os.getenv('FSTR_IMAGE_WORKERS', str(os.cpu_count() or 1)))
+NORMALIZE_TIMEOUT = float(os.getenv('FSTR_IMAGE_TIMEOUT', '30'))
+
+# Форматы нормализации: название в Pillow и параметры сохранения
+_FORMATS = {
+    'webp': ('WEBP', {'method': 4}),
+    'jpeg': ('JPEG', {'optimize': True, 'progressive': True}),
+    'avif': ('AVIF', {}),
+}
+if NORMALIZE_FORMAT not in _FORMATS and NORMALIZE_FORMAT != 'original':
+    raise ValueError(f"FSTR_IMAGE_FORMAT={NORMALIZE_FORMAT}: допустимы {', '.join(_FORMATS)} и original")
+
+# Пул процессов нормализации; создаётся при первом использовании в каждом процессе
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+
+class NormalizationError(Exception):
+    """
+    Изображение не нормализовано: процесс пула не уложился в NORMALIZE_TIMEOUT, завершился
+    аварийно или вернул ошибку. Исходное изображение в этом случае не сохраняется, так как
+    в нём остались бы метаданные EXIF (в том числе координаты GPS).
+    """
+
+
+# Сигнатуры начала файла для определения типа изображения
+_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+)
+
+
+def decode_image(image_data, max_size=None):
+    """
+    Преобразует данные изображения из запроса в байты.
+
+    :param image_data: Строка base64 (в том числе data URI) или байты.
+    :param max_size: Максимальный размер изображения в байтах; проверяется до декодирования.
+    :return: Байты изображения.
+    :raises ValueError: Если строка не является корректным base64 или изображение больше max_size.
+    """
+    if isinstance(image_data, (bytes, bytearray, memoryview)):
+        image_data = bytes(image_data)
+        if max_size is not None and len(image_data) > max_size:
+            raise ValueError(f"Размер изображения превышает {max_size} байт")
+        return image_data
+    if not isinstance(image_data, str):
+        raise ValueError("Данные изображения должны быть строкой base64")
+    if image_data.startswith('data:') and ',' in image_data:
+        # data:image/png;base64,....
+        image_data = image_data.split(',', 1)[1]
+    # Размер после декодирования известен по длине строки: слишком большое изображение не декодируется
+    if max_size is not None and len(image_data) // 4 * 3 - image_data.count('=', -2) > max_size:
+        raise ValueError(f"Размер изображения превышает {max_size} байт")
+    try:
+        return base64.b64decode(image_data, validate=True)
+    except binascii.Error as e:
+        raise ValueError(f"Некорректные данные base64: {e}")
+
+
+def prepare_images(images):
+    """
+    Декодирует изображения из запроса, нормализует их (normalize_images) и вычисляет хеши.
+
+    :param images: Список изображений в формате запроса ({'data': ..., 'title': ...}).
+    :return: Кортеж (список (название, sha256), словарь sha256 -> байты без повторов).
+    :raises ValueError: Если данные изображения некорректны.
+    """
+    decoded = []
+    for image in images:
+        image_bytes = decode_image(image.get('data'))
+        IMAGE_SIZE.observe(len(image_bytes))
+        decoded.append(image_bytes)
+    refs = []
+    blobs = {}
+    # Хеш вычисляется от сохраняемых байтов: нормализация детерминирована, поэтому одинаковые
+    # исходные изображения по-прежнему хранятся один раз
+    for image, image_bytes in zip(images, normalize_images(decoded)):
+        sha256 = hashlib.sha256(image_bytes).hexdigest()
+        refs.append((image.get('title'), sha256))
+        blobs.setdefault(sha256, image_bytes)
+    return refs, blobs
+
+
+def normalization_enabled():
+    """
+    Возвращает True, если изображения перекодируются перед сохранением (установлен Pillow
+    и FSTR_IMAGE_FORMAT не original).
+    """
+    return Image is not None and NORMALIZE_FORMAT != 'original'
+
+
+def _image_size(image):
+    """
+    Размер изображения в байтах: image - байты или путь к файлу.
+    """
+    return os.path.getsize(image) if isinstance(image, str) else len(image)
+
+
+def normalize_image(image_bytes, image_format=NORMALIZE_FORMAT, quality=NORMALIZE_QUALITY,
+                    max_side=NORMALIZE_MAX_SIDE):
+    """
+    Перекодирует изображение для хранения: поворачивает по тегу EXIF Orientation, уменьшает
+    до max_side пикселей по большей стороне и сохраняет в image_format без EXIF и других
+    метаданных (профиль цвета ICC сохраняется). Выполняется в процессах пула normalize_images.
+
+    :param image_bytes: Байты исходного изображения или путь к файлу с ними: файл читает процесс
+                        пула, и вызывающему процессу не нужно держать изображение в памяти.
+    :param image_format: Формат: webp, jpeg или avif.
+    :param quality: Качество сжатия.
+    :param max_side: Максимальная сторона в пикселях.
+    :return: Кортеж (байты для хранения или исходный image_bytes, результат): normalized - изображение
+             перекодировано; unchanged - сохраняется исходное (перекодированное не меньше, а уменьшать и удалять
+             нечего, или изображение анимировано); skipped - Pillow не смог прочитать изображение.
+    """
+    try:
+        image = Image.open(image_bytes if isinstance(image_bytes, str) else io.BytesIO(image_bytes))
+        if getattr(image, 'is_animated', False):
+            # Перекодирование оставило бы только первый кадр
+            return image_bytes, 'unchanged'
+        has_metadata = bool(image.getexif()) or any(key in image.info for key in ('xmp', 'comment'))
+        icc_profile = image.info.get('icc_profile')
+        # Для JPEG декодируем сразу в уменьшенном размере: это быстрее и требует меньше памяти
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        resized = max(image.size) > max_side
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return image_bytes, 'skipped'
+
+    pil_format, options = _FORMATS[image_format]
+    transparent = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    output = io.BytesIO()
+    if transparent and pil_format == 'JPEG':
+        # Прозрачность сохраняется только в PNG
+        image.save(output, format='PNG', optimize=True)
+    else:
+        image = image.convert('RGBA' if transparent else 'RGB')
+        if icc_profile:
+            options = dict(options, icc_profile=icc_profile)
+        image.save(output, format=pil_format, quality=quality, **options)
+    normalized = output.getvalue()
+    if len(normalized) >= _image_size(image_bytes) and not resized and not has_metadata:
+        return image_bytes, 'unchanged'
+    return normalized, 'normalized'
+
+
+def _get_executor():
+    """
+    Возвращает пул процессов нормализации текущего процесса, создавая его при первом обращении.
+    Процессы пула запускаются через spawn: fork многопоточного процесса сервера небезопасен.
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(max_workers=NORMALIZE_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'))
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _discard_executor(executor, terminate=False):
+    """
+    Убирает пул, процесс которого завершился аварийно или завис; следующий вызов создаст новый пул.
+
+    :param terminate: Завершить процессы пула: зависший процесс сам не освободится.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+    if terminate:
+        if hasattr(executor, 'terminate_workers'):  # Python 3.14+
+            executor.terminate_workers()
+        else:
+            for process in list((executor._processes or {}).values()):
+                process.terminate()
+
+
+def normalize_images(images):
+    """
+    Нормализует изображения (normalize_image) в пуле из NORMALIZE_WORKERS процессов:
+    декодирование и сжатие не занимают GIL потоков сервера, а изображения одного запроса
+    обрабатываются параллельно. Полученные и сохранённые байты учитываются в метрике
+    fstr_image_bytes_total.
+
+    :param images: Список байтов изображений или путей к файлам с ними.
+    :return: Список байтов для хранения в том же порядке; для файла, который сохраняется
+             без изменений, - его путь.
+    :raises NormalizationError: Если изображение не обработано за NORMALIZE_TIMEOUT секунд, процесс пула
+                                завершился аварийно или нормализация завершилась ошибкой. Зависший
+                                процесс пула завершается, и пул создаётся заново.
+    """
+    if not normalization_enabled() or not images:
+        return list(images)
+    executor = _get_executor() if NORMALIZE_WORKERS else None
+    if executor is not None:
+        futures = [executor.submit(normalize_image, image_bytes) for image_bytes in images]
+        deadline = time.monotonic() + NORMALIZE_TIMEOUT
+    results = []
+    for index, original in enumerate(images):
+        try:
+            if executor is not None:
+                image_bytes, result = futures[index].result(timeout=max(0.0, deadline - time.monotonic()))
+            else:
+                image_bytes, result = normalize_image(original)
+        except Exception as e:
+            IMAGE_NORMALIZED.labels('failed').inc()
+            if executor is not None:
+                for future in futures:
+                    future.cancel()
+                # Пул с зависшим или аварийно завершившимся процессом заменяется новым
+                if isinstance(e, FutureTimeoutError):
+                    _discard_executor(executor, terminate=True)
+                elif isinstance(e, BrokenProcessPool):
+                    _discard_executor(executor)
+            logger.warning("Изображение не нормализовано: %r", e)
+            raise NormalizationError(f"изображение {index + 1} не удалось обработать") from e
+        IMAGE_BYTES.labels('received').inc(_image_size(original))
+        IMAGE_BYTES.labels('stored').inc(_image_size(image_bytes))
+        IMAGE_NORMALIZED.labels(result).inc()
+        results.append(image_bytes)
+
+    received = sum(map(_image_size, images))
+    stored = sum(map(_image_size, results))
+    if stored < received:
+        logger.info("Нормализация изображений: %d -> %d байт (экономия %.0f%%)",
+                    received, stored, 100 * (received - stored) / received)
+    return results
+
+
+def sniff_mime(head):
+    """
+    Определяет тип изображения по первым байтам.
+
+    :param head: Первые 16 байт изображения.
+    :return: MIME-тип изображения.
+    """
+    head = bytes(head or b'')
+    for signature, mime in _SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:8] == b'ftyp':
+        return 'image/avif' if head[8:12] in (b'avif', b'avis') else 'image/heic'
+    return 'application/octet-stream'
+
+
+def thumbnails_available():
+    """
+    Возвращает True, если установлен Pillow и миниатюры можно создавать.
+    """
+    return Image is not None
+
+
+def make_thumbnail(image_bytes, size, quality=80):
+    """
+    Создаёт миниатюру, вписанную в квадрат size x size.
+
+    :param image_bytes: Байты исходного изображения.
+    :param size: Максимальная сторона миниатюры в пикселях.
+    :param quality: Качество JPEG.
+    :return: Кортеж (байты миниатюры, MIME-тип).
+    :raises ValueError: Если изображение не удалось прочитать.
+    """
+    if Image is None:
+        raise RuntimeError("Для создания миниатюр нужен Pillow")
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        # Для JPEG декодируем сразу в уменьшенном размере: это быстрее и требует меньше памяти
+        image.draft('RGB', (size, size))
+        # Снимки телефона хранят поворот в теге EXIF Orientation: без него миниатюра была бы повёрнута
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Не удалось прочитать изображение: {e}")
+
+    output = io.BytesIO()
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # Прозрачность сохраняется только в PNG
+        image.save(output, format='PNG', optimize=True)
+        return output.getvalue(), 'image/png'
+    image.convert('RGB').save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+    return output.getvalue(), 'image/jpeg'
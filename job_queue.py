@@ -0,0 +1,193 @@
+"""
+Обработчик фоновых задач из таблицы jobs.
+
+POST /submitData сохраняет перевал и полученные изображения одной транзакцией и в ней же ставит задачу
+process_images; ответ 202 возвращается сразу, а нормализация изображений, запись в image_blobs
+и создание миниатюр выполняются здесь, вне запроса.
+Задачи забираются с FOR UPDATE SKIP LOCKED, поэтому процессов-обработчиков может быть несколько
+(в том числе на разных серверах). Неудачная попытка повторяется с экспоненциальной задержкой;
+задача, которая не выполнилась за max_attempts попыток, получает статус failed.
+Простаивающие обработчики также удаляют устаревшие ключи идемпотентности POST /submitData.
+
+Пример запуска:
+    python job_queue.py --workers 4
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import time
+import traceback
+
+from DatabaseHandler import DatabaseHandler
+from image_utils import THUMBNAIL_SIZES, make_thumbnail, thumbnails_available
+
+logger = logging.getLogger(__name__)
+
+# Пауза между опросами пустой очереди в секундах
+POLL_INTERVAL = float(os.getenv('FSTR_JOB_POLL_INTERVAL', '1'))
+
+# Через сколько секунд выполняемая задача считается брошенной и забирается снова
+LOCK_TIMEOUT = int(os.getenv('FSTR_JOB_LOCK_TIMEOUT', '600'))
+
+# Задержка перед повторной попыткой: RETRY_BASE_DELAY * 2^(попытка - 1), но не больше RETRY_MAX_DELAY
+RETRY_BASE_DELAY = float(os.getenv('FSTR_JOB_RETRY_BASE_DELAY', '5'))
+RETRY_MAX_DELAY = float(os.getenv('FSTR_JOB_RETRY_MAX_DELAY', '3600'))
+
+# Как часто (в секундах) простаивающий обработчик удаляет устаревшие ключи идемпотентности
+PURGE_INTERVAL = float(os.getenv('FSTR_IDEMPOTENCY_PURGE_INTERVAL', '3600'))
+
+# Обработчики задач по типу задачи
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    """
+    Регистрирует функцию handler(db_handler, payload) как обработчик задач типа kind.
+    Исключение в обработчике означает неудачную попытку.
+    """
+    def register(function):
+        JOB_HANDLERS[kind] = function
+        return function
+    return register
+
+
+def retry_delay(attempt):
+    """
+    Вычисляет задержку перед следующей попыткой.
+    Случайная составляющая разносит повторы задач, упавших одновременно (например, при недоступности базы).
+
+    :param attempt: Номер неудачной попытки (с 1).
+    :return: Задержка в секундах.
+    """
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+
+@job_handler('process_images')
+def process_images(db_handler, payload):
+    """
+    Сохраняет изображения, полученные с перевалом (DatabaseHandler.store_uploaded_images),
+    и создаёт миниатюры всех размеров THUMBNAIL_SIZES, чтобы первый запрос
+    GET /images/<id>?size=... не тратил на это время.
+    """
+    db_handler.store_uploaded_images(payload['pereval_id'])
+    if not thumbnails_available():
+        logger.warning("Миниатюры не созданы: не установлен Pillow")
+        return
+    images = db_handler.get_images_by_pereval_id(payload['pereval_id'])
+    if images is None:
+        raise RuntimeError(f"Не удалось получить изображения перевала {payload['pereval_id']}")
+    for sha256 in {image.sha256 for image in images}:
+        sizes = [size for size in sorted(THUMBNAIL_SIZES) if db_handler.get_thumbnail(sha256, size) is None]
+        if not sizes:
+            continue
+        original = db_handler.get_image_bytes(sha256)
+        if original is None:
+            raise RuntimeError(f"Не удалось прочитать изображение {sha256}")
+        for size in sizes:
+            try:
+                thumbnail = make_thumbnail(original, size)
+            except ValueError as e:
+                # Повтор не поможет: файл не является изображением, которое читает Pillow
+                logger.warning("Миниатюра %s не создана: %s", sha256, e)
+                break
+            db_handler.add_thumbnail(sha256, size, *thumbnail)
+
+
+def run_job(db_handler, job_id, kind, payload, attempts, max_attempts):
+    """
+    Выполняет одну задачу и записывает результат в таблицу jobs.
+
+    :return: True, если задача выполнена.
+    """
+    handler = JOB_HANDLERS.get(kind)
+    try:
+        if handler is None:
+            raise LookupError(f"Неизвестный тип задачи {kind}")
+        handler(db_handler, payload)
+    except Exception as e:
+        delay = retry_delay(attempts)
+        retried = db_handler.fail_job(job_id, f"{e}\n{traceback.format_exc()}", delay)
+        if retried:
+            logger.warning("Задача %s (%s): попытка %s из %s не удалась, повтор через %.0f с: %s",
+                           job_id, kind, attempts, max_attempts, delay, e)
+        else:
+            logger.error("Задача %s (%s) не выполнена: %s", job_id, kind, e)
+        return False
+    db_handler.complete_job(job_id)
+    return True
+
+
+def work(worker, stop, batch_size=1, poll_interval=POLL_INTERVAL, lock_timeout=LOCK_TIMEOUT):
+    """
+    Цикл обработчика: забирает задачи, пока не установлено событие stop.
+
+    :param worker: Имя обработчика (записывается в jobs.locked_by).
+    :param stop: multiprocessing.Event для остановки.
+    :param batch_size: Сколько задач забирать за раз.
+    :param poll_interval: Пауза между опросами пустой очереди в секундах.
+    :param lock_timeout: Через сколько секунд выполняемая задача считается брошенной.
+    """
+    # SIGINT и SIGTERM обрабатывает главный процесс; обработчик завершает текущую задачу и выходит
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    # У каждого процесса свой пул соединений. Реплики не используются: задача читает данные,
+    # записанные перед её постановкой, а реплика могла ещё не получить их
+    db_handler = DatabaseHandler(minconn=1, maxconn=1, replica_dsns=[])
+    purged_at = time.monotonic()
+    try:
+        while not stop.is_set():
+            try:
+                jobs = db_handler.claim_jobs(worker, limit=batch_size, lock_timeout=lock_timeout)
+                if not jobs and time.monotonic() - purged_at >= PURGE_INTERVAL:
+                    # Очередь пуста: удаляем ключи идемпотентности с истёкшим сроком хранения
+                    purged_at = time.monotonic()
+                    db_handler.purge_idempotency_keys()
+            except Exception as e:
+                logger.error("Ошибка при получении задач: %s", e)
+                stop.wait(poll_interval)
+                continue
+            if not jobs:
+                stop.wait(poll_interval)
+                continue
+            for job in jobs:
+                run_job(db_handler, *job)
+    finally:
+        db_handler.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Количество процессов-обработчиков")
+    parser.add_argument('--batch-size', type=int, default=1, help="Сколько задач процесс забирает за раз")
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL,
+                        help="Пауза между опросами пустой очереди в секундах")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv('FSTR_LOG_LEVEL', 'INFO'),
+                        format='%(asctime)s %(processName)s %(levelname)s %(name)s: %(message)s')
+
+    stop = multiprocessing.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    host = socket.gethostname()
+    processes = [
+        multiprocessing.Process(target=work, args=(f"{host}:{os.getpid()}:{number}", stop),
+                                kwargs={'batch_size': args.batch_size, 'poll_interval': args.poll_interval})
+        for number in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop.set()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# pip install orjson (необязательно: без него используется стандартный модуль json)
+import json
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson не установлен: JSON формируется модулем json
+    orjson = None
+
+# Реализация JSON: orjson (по умолчанию, если установлен) или json; create_app выбирает её
+# по настройке FSTR_JSON (см. use_backend)
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+# Размер части потокового ответа (список перевалов) в байтах
+STREAM_CHUNK_SIZE = int(os.getenv('FSTR_STREAM_CHUNK_SIZE', str(16 * 1024)))
+
+
+def use_backend(name=None):
+    """
+    Выбирает реализацию JSON для всех функций модуля в текущем процессе.
+
+    :param name: 'orjson' или 'json'; пустое значение - orjson, если установлен.
+    :raises ValueError: Если реализация неизвестна.
+    :raises ImportError: Если выбран orjson, но он не установлен.
+    """
+    global JSON_BACKEND
+    name = name or ('orjson' if orjson is not None else 'json')
+    if name not in ('orjson', 'json'):
+        raise ValueError(f"FSTR_JSON={name}: допустимы orjson и json")
+    if name == 'orjson' and orjson is None:
+        raise ImportError("FSTR_JSON=orjson, но orjson не установлен")
+    JSON_BACKEND = name
+
+
+def dumps(obj, default=None, sort_keys=False, indent=False):
+    """
+    Сериализует объект в компактный JSON в UTF-8 (кириллица без экранирования \\uXXXX).
+
+    :param obj: Объект.
+    :param default: Функция преобразования типов, которые JSON не поддерживает.
+    :param sort_keys: Сортировать ключи объектов.
+    :param indent: Отступы в два пробела.
+    :return: Байты JSON.
+    """
+    if JSON_BACKEND == 'orjson':
+        # Дата и время передаются в default, чтобы формат совпадал с json (Flask отдаёт их как HTTP-дату)
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=default, option=option)
+    return json.dumps(obj, default=default, sort_keys=sort_keys, ensure_ascii=False,
+                      indent=2 if indent else None, separators=None if indent else (',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """
+    Разбирает JSON из строки или байтов.
+
+    :raises ValueError: Если JSON некорректен.
+    """
+    if JSON_BACKEND == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON-провайдер Flask на основе dumps и loads: jsonify и app.json используют выбранную
+    реализацию JSON. Типы, которые она не поддерживает, преобразуются так же, как в Flask.
+    """
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, default=kwargs.get('default', self.default),
+                     sort_keys=kwargs.get('sort_keys', self.sort_keys),
+                     indent=bool(kwargs.get('indent'))).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        # Ответ формируется сразу в байтах, без промежуточной строки
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        data = dumps(obj, default=self.default, sort_keys=self.sort_keys, indent=indent)
+        return self._app.response_class(data + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,279 @@
+# pip install prometheus_client (без него метрики не собираются, а /metrics отвечает 501)
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import prometheus_client
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # prometheus_client не установлен: метрики не собираются
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+# Вызовы методов работы с базой данных дольше этого порога (в миллисекундах) записываются
+# в журнал как медленные; 0 - не записывать
+SLOW_QUERY_MS = float(os.getenv('FSTR_SLOW_QUERY_MS', '500'))
+
+# Если включено, в ответ добавляется заголовок Server-Timing с длительностью этапов обработки запроса
+TRACE_ENABLED = os.getenv('FSTR_TRACE', '').lower() in ('1', 'true', 'yes')
+
+# Границы корзин гистограмм размеров в байтах: от 1 КБ до 32 МБ
+SIZE_BUCKETS = (1024, 16 * 1024, 128 * 1024, 512 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 32 * 1024 ** 2)
+
+# Метод DatabaseHandler, который выполняется в текущем потоке или задаче (для счётчика ошибок)
+_current_method = contextvars.ContextVar('fstr_db_method', default='')
+
+# Этапы обработки текущего запроса: список (название, длительность в секундах) или None
+_spans = contextvars.ContextVar('fstr_trace_spans', default=None)
+
+
+class _NoopMetric:
+    """
+    Заглушка метрики на случай, если prometheus_client не установлен.
+    """
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+
+if prometheus_client is not None:
+    REQUEST_LATENCY = prometheus_client.Histogram(
+        'fstr_http_request_duration_seconds', "Время обработки запроса API", ['method', 'route', 'status'])
+    REQUEST_SIZE = prometheus_client.Histogram(
+        'fstr_http_request_size_bytes', "Размер тела запроса", ['route'], buckets=SIZE_BUCKETS)
+    IMAGE_SIZE = prometheus_client.Histogram(
+        'fstr_image_size_bytes', "Размер загруженного изображения", buckets=SIZE_BUCKETS)
+    DB_LATENCY = prometheus_client.Histogram(
+        'fstr_db_call_duration_seconds', "Время выполнения метода работы с базой данных", ['method'])
+    ERRORS = prometheus_client.Counter(
+        'fstr_db_errors_total', "Ошибки при работе с базой данных", ['method', 'error'])
+    REJECTED = prometheus_client.Counter(
+        'fstr_rejected_requests_total', "Запросы, отклонённые ограничением нагрузки", ['route', 'reason'])
+    IMAGE_BYTES = prometheus_client.Counter(
+        'fstr_image_bytes_total', "Байты изображений: полученные (received) и сохранённые после нормализации (stored)",
+        ['stage'])
+    IMAGE_NORMALIZED = prometheus_client.Counter(
+        'fstr_image_normalized_total', "Результаты нормализации изображений", ['result'])
+else:
+    REQUEST_LATENCY = REQUEST_SIZE = IMAGE_SIZE = DB_LATENCY = ERRORS = REJECTED = _NoopMetric()
+    IMAGE_BYTES = IMAGE_NORMALIZED = _NoopMetric()
+
+
+def metrics_available():
+    """
+    Возвращает True, если установлен prometheus_client и метрики собираются.
+    """
+    return prometheus_client is not None
+
+
+def count_error(e):
+    """
+    Увеличивает счётчик ошибок для выполняемого метода и типа исключения.
+
+    :param e: Исключение.
+    """
+    ERRORS.labels(_current_method.get() or 'unknown', type(e).__name__).inc()
+
+
+def count_rejected(route, reason):
+    """
+    Увеличивает счётчик запросов, отклонённых до обработки.
+
+    :param route: Имя обработчика маршрута.
+    :param reason: Причина: rate_limit (превышена частота запросов) или overload (превышено
+                   количество одновременных запросов).
+    """
+    REJECTED.labels(route or 'unmatched', reason).inc()
+
+
+def _finish_call(name, started):
+    elapsed = time.perf_counter() - started
+    DB_LATENCY.labels(name).observe(elapsed)
+    add_span(f"db.{name}", elapsed)
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning("Медленный вызов %s: %.1f мс", name, elapsed * 1000)
+
+
+def timed(function):
+    """
+    Декоратор метода работы с базой данных: замеряет время вызова, считает исключения,
+    записывает медленные вызовы в журнал и добавляет этап в трассировку запроса.
+    Поддерживает обычные и асинхронные методы.
+    """
+    name = function.__name__
+
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            token = _current_method.set(name)
+            started = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            except Exception as e:
+                count_error(e)
+                raise
+            finally:
+                _finish_call(name, started)
+                _current_method.reset(token)
+        return wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        token = _current_method.set(name)
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except Exception as e:
+            count_error(e)
+            raise
+        finally:
+            _finish_call(name, started)
+            _current_method.reset(token)
+    return wrapper
+
+
+def observe_request(method, route, status, elapsed, body_size=None):
+    """
+    Записывает метрики обработанного запроса API.
+
+    :param method: HTTP-метод.
+    :param route: Имя обработчика маршрута (None, если маршрут не найден).
+    :param status: HTTP-код ответа.
+    :param elapsed: Время обработки в секундах.
+    :param body_size: Размер тела запроса в байтах, если известен.
+    """
+    # Имя обработчика вместо пути: путь с ID дал бы по метке на каждый перевал
+    route = route or 'unmatched'
+    REQUEST_LATENCY.labels(method, route, str(status)).observe(elapsed)
+    if body_size:
+        REQUEST_SIZE.labels(route).observe(body_size)
+
+
+def start_trace():
+    """
+    Начинает трассировку запроса, если она включена (FSTR_TRACE).
+
+    :return: Токен для finish_trace или None.
+    """
+    return _spans.set([]) if TRACE_ENABLED else None
+
+
+def finish_trace(token):
+    """
+    Завершает трассировку запроса.
+
+    :param token: Токен от start_trace.
+    :return: Список этапов (название, длительность в секундах) или None, если трассировка выключена.
+    """
+    if token is None:
+        return None
+    spans = _spans.get()
+    _spans.reset(token)
+    return spans
+
+
+def current_spans():
+    """
+    Возвращает этапы текущего запроса или None, если трассировка выключена.
+    """
+    return _spans.get()
+
+
+def add_span(name, elapsed):
+    """
+    Добавляет этап в трассировку текущего запроса (если она включена).
+    """
+    spans = _spans.get()
+    if spans is not None:
+        spans.append((name, elapsed))
+
+
+@contextmanager
+def span(name):
+    """
+    Замеряет этап обработки запроса, не связанный с базой данных (проверка данных, сериализация).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(name, time.perf_counter() - started)
+
+
+def server_timing(spans, total=None):
+    """
+    Формирует значение заголовка Server-Timing.
+
+    :param spans: Список этапов (название, длительность в секундах).
+    :param total: Общее время обработки запроса в секундах.
+    :return: Строка заголовка, например "db.submit_pereval;dur=12.4, total;dur=15.1".
+    """
+    items = list(spans)
+    if total is not None:
+        items.append(('total', total))
+    return ', '.join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in items)
+
+
+class _StatsCollector:
+    """
+    Отдаёт числовые значения словаря stats() (пул соединений, кеш) как метрики-датчики
+    в момент запроса /metrics.
+    """
+
+    def __init__(self, prefix, stats):
+        self.prefix = prefix
+        self.stats = stats
+
+    def collect(self):
+        for key, value in self.stats().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield GaugeMetricFamily(f"fstr_{self.prefix}_{key}", f"{self.prefix}: {key}", value=value)
+
+
+# Зарегистрированные источники stats() по префиксу метрик
+_collectors = {}
+
+
+def register_stats(prefix, stats):
+    """
+    Регистрирует источник метрик-датчиков, например DatabaseHandler.pool_stats.
+    Повторная регистрация с тем же префиксом заменяет прежний источник.
+
+    :param prefix: Префикс имён метрик (fstr_<prefix>_<ключ>).
+    :param stats: Функция без аргументов, возвращающая словарь.
+    """
+    if prometheus_client is None:
+        return
+    if prefix in _collectors:
+        prometheus_client.REGISTRY.unregister(_collectors.pop(prefix))
+    collector = _StatsCollector(prefix, stats)
+    prometheus_client.REGISTRY.register(collector)
+    _collectors[prefix] = collector
+
+
+def render():
+    """
+    Формирует ответ /metrics в текстовом формате Prometheus.
+    Если задана PROMETHEUS_MULTIPROC_DIR (несколько процессов gunicorn или uvicorn), метрики всех
+    процессов объединяются; датчики пула и кеша в этом режиме не отдаются.
+
+    :return: Кортеж (байты, Content-Type).
+    """
+    registry = prometheus_client.REGISTRY
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
@@ -0,0 +1,220 @@
+"""
+Миграции схемы базы данных Pereval.
+
+Миграции - файлы migrations/NNNN_описание.sql. Они применяются по возрастанию номера и только вперёд:
+применённую миграцию нельзя изменять, любое изменение схемы оформляется новой миграцией.
+Применённые миграции записываются в таблицу schema_migrations вместе с контрольной суммой файла.
+
+Каждая миграция выполняется в отдельной транзакции. Миграция, первая строка которой
+"-- migrate: no-transaction" (например, с CREATE INDEX CONCURRENTLY), выполняется вне транзакции
+по одному запросу; запрос должен заканчиваться точкой с запятой в конце строки, а повторный запуск
+после сбоя не должен приводить к ошибке. Одновременный запуск на нескольких серверах безопасен:
+миграции применяются под рекомендательной блокировкой.
+
+Параметры подключения те же, что у DatabaseHandler (FSTR_DB_DSN или FSTR_DB_HOST, FSTR_DB_PORT и т.д.).
+
+Пример запуска:
+    python migrate.py
+    python migrate.py --status
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+from collections import namedtuple
+
+import psycopg2
+
+from config import load_config
+
+logger = logging.getLogger(__name__)
+
+# Каталог с файлами миграций
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Ключ рекомендательной блокировки, под которой применяются миграции
+LOCK_ID = 7_381_024_021
+
+# Отметка миграции, которая выполняется вне транзакции
+NO_TRANSACTION = '-- migrate: no-transaction'
+
+Migration = namedtuple('Migration', ('version', 'name', 'sql', 'checksum', 'transactional'))
+Migration.__doc__ = "Файл миграции: номер, название, текст, SHA-256 текста и выполнение в транзакции."
+
+
+class MigrationError(Exception):
+    """
+    Исключение, возникающее при некорректных файлах миграций или расхождении с базой данных.
+    """
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """
+    Читает файлы миграций.
+
+    :param directory: Каталог с файлами NNNN_описание.sql.
+    :return: Список Migration по возрастанию номера.
+    :raises MigrationError: Если имя файла некорректно или номер повторяется.
+    """
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.sql'):
+            continue
+        match = re.fullmatch(r'(\d{4})_(\w+)\.sql', filename)
+        if match is None:
+            raise MigrationError(f"Некорректное имя файла миграции {filename}: нужно NNNN_описание.sql")
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Номер миграции {version} повторяется: {filename}")
+        with open(os.path.join(directory, filename), encoding='utf-8', newline='') as file:
+            # Контрольная сумма не зависит от окончаний строк, с которыми файл получен из git
+            text = file.read().replace('\r\n', '\n')
+        migrations[version] = Migration(
+            version=version,
+            name=match.group(2),
+            sql=text,
+            checksum=hashlib.sha256(text.encode('utf-8')).hexdigest(),
+            transactional=not text.lstrip().startswith(NO_TRANSACTION),
+        )
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def split_statements(text):
+    """
+    Разбивает текст миграции без транзакции на отдельные запросы: запрос заканчивается
+    строкой, которая оканчивается точкой с запятой. Строки-комментарии между запросами пропускаются.
+
+    :param text: Текст миграции.
+    :return: Список запросов.
+    """
+    statements = []
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not lines and (not stripped or stripped.startswith('--')):
+            continue
+        lines.append(line)
+        if stripped.endswith(';'):
+            statements.append('\n'.join(lines))
+            lines = []
+    if lines:
+        raise MigrationError("Запрос в конце миграции не заканчивается точкой с запятой")
+    return statements
+
+
+def applied_migrations(cursor):
+    """
+    Возвращает словарь {номер: контрольная сумма} применённых миграций.
+    """
+    cursor.execute("SELECT version, checksum FROM schema_migrations ORDER BY version;")
+    return dict(cursor.fetchall())
+
+
+def _apply(conn, migration):
+    """
+    Выполняет одну миграцию и записывает её в schema_migrations.
+    """
+    record = ("INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s);",
+              (migration.version, migration.name, migration.checksum))
+    if migration.transactional:
+        conn.autocommit = False
+        try:
+            with conn, conn.cursor() as cursor:
+                cursor.execute(migration.sql)
+                cursor.execute(*record)
+        finally:
+            conn.autocommit = True
+        return
+    with conn.cursor() as cursor:
+        for statement in split_statements(migration.sql):
+            cursor.execute(statement)
+        cursor.execute(*record)
+
+
+def migrate(conn, target=None, directory=MIGRATIONS_DIR):
+    """
+    Применяет миграции, которых ещё нет в базе данных.
+
+    :param conn: Соединение psycopg2 с базой данных Pereval.
+    :param target: Номер последней применяемой миграции (по умолчанию все).
+    :param directory: Каталог с файлами миграций.
+    :return: Список номеров применённых миграций.
+    :raises MigrationError: Если применённая миграция изменена или в базе есть миграция, которой нет в каталоге.
+    """
+    migrations = load_migrations(directory)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s);", (LOCK_ID,))
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INT4 NOT NULL,
+                    name TEXT NOT NULL,
+                    checksum CHAR(64) NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT now(),
+                    PRIMARY KEY (version)
+                );
+                """)
+            applied = applied_migrations(cursor)
+
+        known = {migration.version: migration for migration in migrations}
+        unknown = sorted(set(applied) - set(known))
+        if unknown:
+            raise MigrationError(f"В базе данных применены миграции, которых нет в каталоге: {unknown}")
+        for version, checksum in applied.items():
+            if known[version].checksum != checksum:
+                raise MigrationError(
+                    f"Миграция {version}_{known[version].name} изменена после применения: оформите изменение новой миграцией")
+
+        done = []
+        for migration in migrations:
+            if migration.version in applied or (target is not None and migration.version > target):
+                continue
+            logger.info("Применяется миграция %04d_%s", migration.version, migration.name)
+            _apply(conn, migration)
+            done.append(migration.version)
+        return done
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s);", (LOCK_ID,))
+
+
+def connect(settings=None):
+    """
+    Открывает соединение с основной базой данных по настройкам FSTR_DB_* (см. config.load_config).
+    """
+    settings = settings if settings is not None else load_config()
+    if settings.get('FSTR_DB_DSN'):
+        return psycopg2.connect(settings['FSTR_DB_DSN'])
+    return psycopg2.connect(host=settings.get('FSTR_DB_HOST'), port=settings.get('FSTR_DB_PORT'),
+                            user=settings.get('FSTR_DB_LOGIN'), password=settings.get('FSTR_DB_PASS'),
+                            database=settings.get('FSTR_DB_NAME', 'Pereval'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--status', action='store_true', help="Показать применённые и ожидающие миграции")
+    parser.add_argument('--target', type=int, help="Номер последней применяемой миграции")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv('FSTR_LOG_LEVEL', 'INFO'), format='%(asctime)s %(levelname)s %(message)s')
+
+    conn = connect()
+    try:
+        if args.status:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL;")
+                applied = applied_migrations(cursor) if cursor.fetchone()[0] else {}
+            for migration in load_migrations():
+                state = "применена" if migration.version in applied else "ожидает"
+                print(f"{migration.version:04d}_{migration.name}: {state}")
+            return
+        done = migrate(conn, target=args.target)
+        print(f"Применено миграций: {len(done)}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
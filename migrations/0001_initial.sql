@@ -1,19 +1,13 @@
--- Использованный запрос в PostgreSQL для создания базы данных
--- Удаление существующих таблиц, если они есть
-DROP TABLE IF EXISTS "public"."pereval_images" CASCADE;
-DROP TABLE IF EXISTS "public"."pereval_added" CASCADE;
-DROP TABLE IF EXISTS "public"."coords" CASCADE;
-DROP TABLE IF EXISTS "public"."users" CASCADE;
-DROP TABLE IF EXISTS "public"."spr_activities_types" CASCADE;
+-- Исходная схема базы данных (первая версия data_base.sql).
+-- Таблицы создаются только если их нет, поэтому миграция применяется и к уже существующей базе.
 
--- Определение последовательностей
 CREATE SEQUENCE IF NOT EXISTS USER_ID_SEQ;
 CREATE SEQUENCE IF NOT EXISTS COORDS_ID_SEQ;
 CREATE SEQUENCE IF NOT EXISTS PEREVAL_ID_SEQ;
 CREATE SEQUENCE IF NOT EXISTS IMAGE_ID_SEQ;
 
 -- Таблица для пользователей
-CREATE TABLE "public"."users" (
+CREATE TABLE IF NOT EXISTS "public"."users" (
     "id" INT4 NOT NULL DEFAULT NEXTVAL('USER_ID_SEQ'::REGCLASS),
     "email" VARCHAR(255) NOT NULL UNIQUE,
     "fam" TEXT,
@@ -24,7 +18,7 @@ CREATE TABLE "public"."users" (
 );
 
 -- Таблица для координат
-CREATE TABLE "public"."coords" (
+CREATE TABLE IF NOT EXISTS "public"."coords" (
     "id" INT4 NOT NULL DEFAULT NEXTVAL('COORDS_ID_SEQ'::REGCLASS),
     "latitude" FLOAT8 NOT NULL,
     "longitude" FLOAT8 NOT NULL,
@@ -33,7 +27,7 @@ CREATE TABLE "public"."coords" (
 );
 
 -- Таблица для перевалов
-CREATE TABLE "public"."pereval_added" (
+CREATE TABLE IF NOT EXISTS "public"."pereval_added" (
     "id" INT4 NOT NULL DEFAULT NEXTVAL('PEREVAL_ID_SEQ'::REGCLASS),
     "beauty_title" TEXT,
     "title" TEXT,
@@ -50,8 +44,8 @@ CREATE TABLE "public"."pereval_added" (
     PRIMARY KEY ("id")
 );
 
--- Таблица для изображений
-CREATE TABLE "public"."pereval_images" (
+-- Таблица для изображений (содержимое переносится в image_blobs миграцией 0002)
+CREATE TABLE IF NOT EXISTS "public"."pereval_images" (
     "id" INT4 NOT NULL DEFAULT NEXTVAL('IMAGE_ID_SEQ'::REGCLASS),
     "pereval_id" INT4 REFERENCES "public"."pereval_added"("id"),
     "title" TEXT,
@@ -61,8 +55,8 @@ CREATE TABLE "public"."pereval_images" (
 
 -- Таблица для типов активности
 CREATE SEQUENCE IF NOT EXISTS UNTITLED_TABLE_200_ID_SEQ;
-CREATE TABLE "public"."spr_activities_types" (
+CREATE TABLE IF NOT EXISTS "public"."spr_activities_types" (
     "id" INT4 NOT NULL DEFAULT NEXTVAL('UNTITLED_TABLE_200_ID_SEQ'::REGCLASS),
     "title" TEXT,
     PRIMARY KEY ("id")
-);
\ No newline at end of file
+);
@@ -0,0 +1,115 @@
+-- Приводит базу к схеме, с которой работают DatabaseHandler и AsyncDatabaseHandler.
+-- Все изменения повторяемы (IF NOT EXISTS), поэтому миграция подходит и для базы, созданной
+-- исходным data_base.sql, и для базы, созданной его последней версией.
+
+-- Версия перевала (ETag для PATCH) и поля модерации
+ALTER TABLE "public"."pereval_added"
+    ADD COLUMN IF NOT EXISTS "version" INT4 NOT NULL DEFAULT 1, -- увеличивается при каждом изменении
+    ADD COLUMN IF NOT EXISTS "claimed_by" TEXT, -- модератор, который забрал перевал на проверку
+    ADD COLUMN IF NOT EXISTS "claimed_at" TIMESTAMP; -- когда перевал забран на проверку или проверен
+
+-- Таблица для содержимого изображений: каждое изображение хранится один раз по хешу SHA-256
+CREATE TABLE IF NOT EXISTS "public"."image_blobs" (
+    "sha256" CHAR(64) NOT NULL,
+    "size" INT8 NOT NULL,
+    "img" BYTEA NOT NULL,
+    "created_at" TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY ("sha256")
+);
+
+-- pereval_images хранила байты изображения в столбце img: содержимое переносится в image_blobs,
+-- а в pereval_images остаётся ссылка по хешу
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = 'public' AND table_name = 'pereval_images' AND column_name = 'img') THEN
+        INSERT INTO "public"."image_blobs" ("sha256", "size", "img")
+        SELECT DISTINCT ON (1) encode(sha256("img"), 'hex'), length("img"), "img"
+        FROM "public"."pereval_images"
+        ON CONFLICT ("sha256") DO NOTHING;
+        ALTER TABLE "public"."pereval_images" ADD COLUMN "image_sha256" CHAR(64);
+        UPDATE "public"."pereval_images" SET "image_sha256" = encode(sha256("img"), 'hex');
+        ALTER TABLE "public"."pereval_images"
+            ALTER COLUMN "image_sha256" SET NOT NULL,
+            ADD FOREIGN KEY ("image_sha256") REFERENCES "public"."image_blobs"("sha256"),
+            DROP COLUMN "img";
+    END IF;
+END
+$$;
+
+-- Индексы для поиска перевалов рядом с точкой (GET /passes/nearby)
+CREATE EXTENSION IF NOT EXISTS cube;
+CREATE EXTENSION IF NOT EXISTS earthdistance;
+CREATE INDEX IF NOT EXISTS "coords_earth_idx" ON "public"."coords" USING gist (ll_to_earth("latitude", "longitude"));
+CREATE INDEX IF NOT EXISTS "pereval_added_coord_id_idx" ON "public"."pereval_added" ("coord_id");
+
+-- Очередь модерации: частичные индексы содержат только перевалы на модерации и не растут
+-- вместе с количеством проверенных перевалов
+CREATE INDEX IF NOT EXISTS "pereval_added_new_idx" ON "public"."pereval_added" ("id") WHERE "status" = 'new';
+CREATE INDEX IF NOT EXISTS "pereval_added_pending_idx" ON "public"."pereval_added" ("claimed_at")
+    WHERE "status" = 'pending';
+
+-- Поиск по названиям перевалов (GET /passes/search)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Транслитерация кириллицы в латиницу; должна совпадать с translit.py
+CREATE OR REPLACE FUNCTION translit_ru(value TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$
+    SELECT translate(
+        replace(replace(replace(replace(replace(replace(replace(replace(replace(replace(
+            lower(value),
+            'щ', 'shch'), 'ж', 'zh'), 'х', 'kh'), 'ц', 'ts'), 'ч', 'ch'),
+            'ш', 'sh'), 'ю', 'yu'), 'я', 'ya'), 'ъ', ''), 'ь', ''),
+        'абвгдеёзийклмнопрстуфыэ',
+        'abvgdeeziiklmnoprstufye')
+$$;
+
+-- Текст для поиска: все названия перевала в исходном виде и латиницей
+CREATE OR REPLACE FUNCTION pereval_search_text(beauty_title TEXT, title TEXT, other_titles TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT lower(coalesce(beauty_title, '') || ' ' || coalesce(title, '') || ' ' || coalesce(other_titles, ''))
+        || ' ' || translit_ru(coalesce(beauty_title, '') || ' ' || coalesce(title, '') || ' ' || coalesce(other_titles, ''))
+$$;
+
+CREATE INDEX IF NOT EXISTS "pereval_added_search_idx" ON "public"."pereval_added"
+    USING gin (pereval_search_text("beauty_title", "title", "other_titles") gin_trgm_ops);
+
+-- Таблица для миниатюр изображений, создаваемых при первом запросе
+CREATE TABLE IF NOT EXISTS "public"."image_thumbnails" (
+    "sha256" CHAR(64) NOT NULL REFERENCES "public"."image_blobs"("sha256"),
+    "size" INT4 NOT NULL,
+    "mime" TEXT NOT NULL,
+    "img" BYTEA NOT NULL,
+    PRIMARY KEY ("sha256", "size")
+);
+
+-- Очередь фоновых задач (job_queue.py): обработка изображений после добавления перевала и т.п.
+CREATE TABLE IF NOT EXISTS "public"."jobs" (
+    "id" BIGSERIAL NOT NULL,
+    "kind" TEXT NOT NULL,
+    "payload" JSONB NOT NULL DEFAULT '{}',
+    "status" TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'done', 'failed')),
+    "attempts" INT4 NOT NULL DEFAULT 0,
+    "max_attempts" INT4 NOT NULL DEFAULT 5,
+    "run_at" TIMESTAMP NOT NULL DEFAULT now(), -- не раньше этого времени (повтор с задержкой)
+    "locked_by" TEXT,
+    "locked_at" TIMESTAMP,
+    "last_error" TEXT,
+    "created_at" TIMESTAMP NOT NULL DEFAULT now(),
+    "finished_at" TIMESTAMP,
+    PRIMARY KEY ("id")
+);
+CREATE INDEX IF NOT EXISTS "jobs_queued_idx" ON "public"."jobs" ("run_at") WHERE "status" = 'queued';
+CREATE INDEX IF NOT EXISTS "jobs_running_idx" ON "public"."jobs" ("locked_at") WHERE "status" = 'running';
+
+-- Ключи идемпотентности POST /submitData: повтор запроса с тем же ключом возвращает
+-- сохранённый результат вместо повторного добавления перевала
+CREATE TABLE IF NOT EXISTS "public"."idempotency_keys" (
+    "key" TEXT NOT NULL, -- заголовок Idempotency-Key или хеш данных запроса
+    "request_hash" CHAR(64) NOT NULL, -- SHA-256 данных запроса
+    "pereval_id" INT4 NOT NULL REFERENCES "public"."pereval_added"("id"),
+    "queued" BOOLEAN NOT NULL, -- была ли поставлена фоновая задача (ответ 202)
+    "created_at" TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY ("key")
+);
+CREATE INDEX IF NOT EXISTS "idempotency_keys_created_at_idx" ON "public"."idempotency_keys" ("created_at");
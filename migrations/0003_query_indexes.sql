@@ -0,0 +1,21 @@
+-- migrate: no-transaction
+-- Индексы для запросов API. Создаются с CONCURRENTLY, чтобы не блокировать запись в таблицы,
+-- поэтому миграция выполняется вне транзакции. Если создание индекса прервётся, останется
+-- недействительный индекс: при повторном запуске он удаляется и создаётся заново.
+
+-- Список перевалов пользователя (GET /submitData/?user__email=...): фильтр по user_id
+-- и постраничный вывод по id без сортировки
+DROP INDEX CONCURRENTLY IF EXISTS "public"."pereval_added_user_id_idx";
+CREATE INDEX CONCURRENTLY "pereval_added_user_id_idx" ON "public"."pereval_added" ("user_id", "id");
+
+-- Список по статусу (accepted, rejected; для new и pending есть частичные индексы)
+DROP INDEX CONCURRENTLY IF EXISTS "public"."pereval_added_status_idx";
+CREATE INDEX CONCURRENTLY "pereval_added_status_idx" ON "public"."pereval_added" ("status", "id");
+
+-- Фильтр по времени добавления (date_from, date_to)
+DROP INDEX CONCURRENTLY IF EXISTS "public"."pereval_added_add_time_idx";
+CREATE INDEX CONCURRENTLY "pereval_added_add_time_idx" ON "public"."pereval_added" ("add_time");
+
+-- Изображения перевала (GET /submitData/<id>, GET /submitData/<id>/images) в порядке добавления
+DROP INDEX CONCURRENTLY IF EXISTS "public"."pereval_images_pereval_id_idx";
+CREATE INDEX CONCURRENTLY "pereval_images_pereval_id_idx" ON "public"."pereval_images" ("pereval_id", "id");
@@ -0,0 +1,6 @@
+-- Изображения уже сжаты (JPEG, PNG, WebP), поэтому попытка сжать их при записи в TOAST только
+-- тратит время. STORAGE EXTERNAL хранит байты вне строки без сжатия, и substring(img FROM ... FOR ...)
+-- (выдача частями, Range, проверка заголовка файла) читает только нужные части, а не всё изображение.
+-- Действует для новых строк; уже записанные изображения остаются как есть.
+ALTER TABLE "public"."image_blobs" ALTER COLUMN "img" SET STORAGE EXTERNAL;
+ALTER TABLE "public"."image_thumbnails" ALTER COLUMN "img" SET STORAGE EXTERNAL;
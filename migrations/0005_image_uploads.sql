@@ -0,0 +1,23 @@
+-- Изображения из POST /submitData и пакетной отправки до обработки задачей process_images (job_queue.py).
+-- Запрос только сохраняет байты (base64 декодирует PostgreSQL), а нормализация (в том числе удаление EXIF),
+-- вычисление SHA-256 и запись в image_blobs и pereval_images выполняются в фоне; после этого строка удаляется.
+-- Изображения отсюда не выдаются API, поэтому исходные файлы с метаданными не публикуются.
+CREATE TABLE IF NOT EXISTS "public"."pereval_image_uploads" (
+    "id" BIGSERIAL NOT NULL,
+    "pereval_id" INT4 NOT NULL REFERENCES "public"."pereval_added"("id") ON DELETE CASCADE,
+    "position" INT4 NOT NULL, -- порядок изображения в запросе
+    "title" TEXT,
+    "img" BYTEA NOT NULL,
+    "created_at" TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY ("id")
+);
+CREATE INDEX IF NOT EXISTS "pereval_image_uploads_pereval_id_idx"
+    ON "public"."pereval_image_uploads" ("pereval_id", "position");
+ALTER TABLE "public"."pereval_image_uploads" ALTER COLUMN "img" SET STORAGE EXTERNAL;
+
+-- Данные изображения из запроса (base64, в том числе data URI) в байты.
+-- Некорректный base64 вызывает ошибку, и запрос отклоняется с кодом 400
+CREATE OR REPLACE FUNCTION decode_image_data(data TEXT) RETURNS BYTEA
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$
+    SELECT decode(CASE WHEN data LIKE 'data:%' THEN substr(data, strpos(data, ',') + 1) ELSE data END, 'base64')
+$$;
@@ -0,0 +1,230 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryRateLimiter:
+    """
+    Ограничение частоты запросов маркерной корзиной (token bucket) в памяти процесса.
+
+    У каждого ключа (IP клиента, почта пользователя) своя корзина на burst маркеров, которая пополняется
+    со скоростью rate маркеров в секунду; запрос забирает маркер или отклоняется, если корзина пуста.
+    """
+
+    def __init__(self, rate, burst, maxsize=100000, clock=time.monotonic):
+        """
+        :param rate: Средняя разрешённая частота запросов в секунду (0 - без ограничения).
+        :param burst: Сколько запросов подряд разрешено после простоя.
+        :param maxsize: Сколько ключей хранится; давно не использованные ключи удаляются (их корзины снова полные).
+        :param clock: Источник времени (подменяется в тестах).
+        """
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._clock = clock
+        self._buckets = OrderedDict()  # ключ -> (маркеры, время последнего пополнения)
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def acquire(self, key, cost=1):
+        """
+        Забирает маркеры из корзины ключа.
+
+        :param key: Ключ клиента.
+        :param cost: Сколько маркеров стоит запрос.
+        :return: Кортеж (разрешён ли запрос, через сколько секунд в корзине будет достаточно маркеров).
+        """
+        if self.rate <= 0:
+            return True, 0.0
+        now = self._clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+                self.allowed += 1
+            else:
+                self.rejected += 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (cost - tokens) / self.rate
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'allowed': self.allowed,
+                'rejected': self.rejected,
+                'keys': len(self._buckets),
+            }
+
+
+class RedisRateLimiter:
+    """
+    Маркерная корзина во внешнем хранилище, совместимом с Redis: ограничение общее для всех
+    процессов и серверов приложения.
+
+    Корзина обновляется одним скриптом Lua, поэтому одновременные запросы не теряют маркеры.
+    Клиент должен поддерживать метод eval(script, numkeys, *keys_and_args), поэтому вместо Redis
+    можно передать совместимую локальную замену.
+    """
+
+    # Возвращает {1 или 0, время ожидания строкой}: число Lua в ответе Redis округлилось бы до целого
+    SCRIPT = """
+        local rate = tonumber(ARGV[1])
+        local burst = tonumber(ARGV[2])
+        local cost = tonumber(ARGV[3])
+        local time = redis.call('TIME')
+        local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(state[1]) or burst
+        local updated = tonumber(state[2]) or now
+        tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+        local allowed = 0
+        local wait = 0
+        if tokens >= cost then
+            tokens = tokens - cost
+            allowed = 1
+        else
+            wait = (cost - tokens) / rate
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+        redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+        return {allowed, tostring(wait)}
+    """
+
+    def __init__(self, client, rate, burst, prefix='fstr:rate:'):
+        """
+        :param client: Клиент Redis (например, redis.Redis) или совместимый объект.
+        :param rate: Средняя разрешённая частота запросов в секунду (0 - без ограничения).
+        :param burst: Сколько запросов подряд разрешено после простоя.
+        :param prefix: Префикс ключей.
+        """
+        self.client = client
+        self.rate = rate
+        self.burst = burst
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def acquire(self, key, cost=1):
+        if self.rate <= 0:
+            return True, 0.0
+        try:
+            allowed, wait = self.client.eval(self.SCRIPT, 1, self.prefix + key, self.rate, self.burst, cost)
+        except Exception as e:
+            # Недоступность хранилища не должна останавливать запись: запрос пропускается
+            logger.error("Ошибка при проверке ограничения частоты запросов: %s", e)
+            self._count('errors')
+            return True, 0.0
+        if int(allowed):
+            self._count('allowed')
+            return True, 0.0
+        self._count('rejected')
+        return False, float(wait)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'redis',
+                'allowed': self.allowed,
+                'rejected': self.rejected,
+                'errors': self.errors,
+            }
+
+
+def create_rate_limiter(url=None, rate=1.0, burst=10, maxsize=100000, prefix='fstr:rate:'):
+    """
+    Создаёт ограничение частоты запросов: в Redis, если указан url, иначе в памяти процесса.
+
+    :param url: Адрес Redis, например redis://localhost:6379/0.
+    :param rate: Средняя разрешённая частота запросов в секунду.
+    :param burst: Сколько запросов подряд разрешено после простоя.
+    :param maxsize: Сколько ключей хранится в памяти процесса.
+    :param prefix: Префикс ключей в Redis.
+    :return: Экземпляр MemoryRateLimiter или RedisRateLimiter.
+    """
+    if url:
+        # pip install redis
+        import redis
+        return RedisRateLimiter(redis.Redis.from_url(url), rate, burst, prefix=prefix)
+    return MemoryRateLimiter(rate, burst, maxsize=maxsize)
+
+
+class ConcurrencyLimiter:
+    """
+    Ограничение количества запросов, которые процесс обрабатывает одновременно.
+
+    Запрос сверх лимита не ждёт, а сразу отклоняется: ожидание свободного соединения с базой данных
+    только увеличило бы задержку всех запросов, а отказ с Retry-After позволяет клиенту повторить
+    запрос позже или на другом сервере.
+    """
+
+    def __init__(self, limit):
+        """
+        :param limit: Максимальное количество одновременных запросов (0 - без ограничения).
+        """
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.rejected = 0
+
+    def try_acquire(self):
+        """
+        Занимает место для запроса.
+
+        :return: True, если место есть; тогда после обработки запроса нужно вызвать release.
+        """
+        with self._lock:
+            if self.limit and self._in_flight >= self.limit:
+                self.rejected += 1
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'in_flight': self._in_flight,
+                'rejected': self.rejected,
+            }
+
+
+def retry_after(seconds):
+    """
+    Значение заголовка Retry-After: целое число секунд, не меньше 1.
+    """
+    return str(max(1, math.ceil(seconds)))
+
+
+def concurrency_limit(settings):
+    """
+    Лимит одновременных запросов из настройки FSTR_MAX_CONCURRENCY (0 - без ограничения).
+    По умолчанию вдвое больше размера пула соединений FSTR_DB_POOL_MAX: запросы сверх него
+    ждали бы свободного соединения дольше, чем клиенту выгоднее повторить запрос.
+
+    :param settings: Настройки FSTR_* (см. config.load_config).
+    :return: Количество запросов.
+    """
+    value = settings.get('FSTR_MAX_CONCURRENCY')
+    if value not in (None, ''):
+        return int(value)
+    return 2 * int(settings.get('FSTR_DB_POOL_MAX', '10'))
@@ -0,0 +1,20 @@
+from collections import namedtuple
+
+# Столбцы pereval_added в порядке, в котором их возвращают методы получения перевалов
+PEREVAL_COLUMNS = ('id', 'beauty_title', 'title', 'other_titles', 'connect', 'add_time', 'user_id', 'coord_id',
+                   'level_winter', 'level_summer', 'level_autumn', 'level_spring', 'status', 'version')
+
+# Строки результатов запросов. namedtuple не хранит словарь атрибутов, поэтому запись занимает
+# столько же памяти, сколько кортеж, а поля доступны по именам, а не по номерам столбцов.
+PerevalRecord = namedtuple('PerevalRecord', PEREVAL_COLUMNS)
+PerevalRecord.__doc__ = "Перевал (строка pereval_added)."
+
+ImageRecord = namedtuple('ImageRecord', ('id', 'title', 'sha256', 'size'))
+ImageRecord.__doc__ = "Изображение перевала без содержимого."
+
+ImageInfo = namedtuple('ImageInfo', ('sha256', 'size', 'head'))
+ImageInfo.__doc__ = "Хеш, размер и первые 16 байт изображения."
+
+NearbyPass = namedtuple('NearbyPass', ('id', 'beauty_title', 'title', 'status', 'latitude', 'longitude', 'height',
+                                       'distance'))
+NearbyPass.__doc__ = "Перевал рядом с точкой и расстояние до него в метрах."
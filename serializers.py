@@ -0,0 +1,175 @@
+import base64
+import binascii
+from datetime import datetime
+from functools import lru_cache
+
+from records import PEREVAL_COLUMNS
+
+# Размер страницы списка перевалов по умолчанию и максимальный
+LIST_DEFAULT_LIMIT = 100
+LIST_MAX_LIMIT = 1000
+
+# Максимальная длина заголовка Idempotency-Key
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# Допустимые статусы перевала
+STATUSES = ('new', 'pending', 'accepted', 'rejected')
+
+# Поля ответа и соответствующие им столбцы таблицы pereval_added
+RESPONSE_FIELDS = {
+    'id': ('id',),
+    'beauty_title': ('beauty_title',),
+    'title': ('title',),
+    'other_titles': ('other_titles',),
+    'connect': ('connect',),
+    'add_time': ('add_time',),
+    'user_id': ('user_id',),
+    'coord_id': ('coord_id',),
+    'level': ('level_winter', 'level_summer', 'level_autumn', 'level_spring'),
+    'status': ('status',),
+}
+
+
+def _format_time(add_time):
+    # Форматирование времени
+    return add_time.strftime("%a, %d %b %Y %H:%M:%S GMT") if isinstance(add_time, datetime) else add_time
+
+
+@lru_cache(maxsize=128)
+def pereval_serializer(columns=PEREVAL_COLUMNS, fields=tuple(RESPONSE_FIELDS)):
+    """
+    Создаёт функцию, формирующую данные перевала для ответа API из строки результата запроса.
+
+    Код функции генерируется один раз для пары (columns, fields): значения берутся из строки
+    по заранее вычисленным номерам столбцов, без перебора полей при каждом вызове.
+
+    :param columns: Столбцы строки результата (кортеж имён из PEREVAL_COLUMNS).
+    :param fields: Поля ответа (кортеж ключей RESPONSE_FIELDS).
+    :return: Функция serialize(row) -> словарь с данными перевала.
+    :raises ValueError: Если поле ответа неизвестно или для него нет столбца.
+    """
+    index = {column: position for position, column in enumerate(columns)}
+    items = []
+    for field in fields:
+        if field not in RESPONSE_FIELDS:
+            raise ValueError(f"Неизвестное поле {field}")
+        missing = [column for column in RESPONSE_FIELDS[field] if column not in index]
+        if missing:
+            raise ValueError(f"Для поля {field} нет столбцов {', '.join(missing)}")
+        if field == 'level':
+            items.append("'level': {" + ", ".join(
+                f"{season!r}: row[{index['level_' + season]}]" for season in ('winter', 'summer', 'autumn', 'spring')
+            ) + "}")
+        elif field == 'add_time':
+            items.append(f"'add_time': _format_time(row[{index['add_time']}])")
+        else:
+            items.append(f"{field!r}: row[{index[field]}]")
+    source = "def serialize(row):\n    return {" + ", ".join(items) + "}\n"
+    namespace = {'_format_time': _format_time}
+    exec(source, namespace)
+    return namespace['serialize']
+
+
+def update_columns(data):
+    """
+    Определяет изменяемые столбцы pereval_added по данным запроса PATCH /submitData/<id>.
+
+    :param data: Изменяемые поля перевала.
+    :return: Список пар (столбец, значение) только для переданных полей.
+    """
+    columns = [(field, data[field]) for field in ('beauty_title', 'title', 'other_titles', 'connect', 'add_time')
+               if field in data]
+    level = data.get('level') or {}
+    columns += [(f'level_{season}', level[season]) for season in ('winter', 'summer', 'autumn', 'spring')
+                if season in level]
+    return columns
+
+
+def version_etag(version):
+    """
+    Возвращает ETag перевала для его версии (без кавычек).
+    """
+    return f"v{version}"
+
+
+def expected_versions(if_match):
+    """
+    Определяет версии перевала, при которых разрешено обновление, по заголовку If-Match.
+
+    :param if_match: Разобранный заголовок If-Match (werkzeug.datastructures.ETags).
+    :return: None, если заголовка нет или он равен *, иначе список версий
+             (пустой, если ни один ETag не относится к версии перевала).
+    """
+    if not if_match or if_match.star_tag:
+        return None
+    # If-Match сравнивает только сильные ETag
+    return [int(etag[1:]) for etag in if_match.as_set() if etag[:1] == 'v' and etag[1:].isdigit()]
+
+
+def idempotency_key(value):
+    """
+    Проверяет значение заголовка Idempotency-Key.
+
+    :param value: Значение заголовка или None.
+    :return: Ключ или None, если заголовка нет.
+    :raises ValueError: Если ключ пустой, слишком длинный или содержит недопустимые символы.
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    if not value or len(value) > IDEMPOTENCY_KEY_MAX_LENGTH or not value.isprintable():
+        raise ValueError(f"Idempotency-Key должен содержать от 1 до {IDEMPOTENCY_KEY_MAX_LENGTH} печатных символов")
+    # Префикс sha256: занят ключами, которые вычисляются из данных запроса
+    if value.startswith('sha256:'):
+        raise ValueError("Idempotency-Key не может начинаться с sha256:")
+    return value
+
+
+def encode_cursor(pereval_id):
+    """
+    Кодирует ID последнего перевала страницы в курсор для следующей страницы.
+    """
+    return base64.urlsafe_b64encode(str(pereval_id).encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Декодирует курсор страницы в ID перевала.
+
+    :raises ValueError: Если курсор некорректен.
+    """
+    try:
+        return int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii'))
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"Некорректный курсор: {e}")
+
+
+def parse_list_params(args):
+    """
+    Разбирает параметры запроса списка перевалов GET /submitData.
+
+    :param args: Параметры строки запроса (словарь или MultiDict).
+    :return: Кортеж (поля ответа, столбцы для запроса, размер страницы, фильтры для iter_submissions).
+    :raises ValueError: Если параметры некорректны.
+    """
+    fields = tuple(args['fields'].split(',')) if args.get('fields') else tuple(RESPONSE_FIELDS)
+    unknown = [field for field in fields if field not in RESPONSE_FIELDS]
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+    limit = int(args.get('limit', LIST_DEFAULT_LIMIT))
+    if not 1 <= limit <= LIST_MAX_LIMIT:
+        raise ValueError(f"limit должен быть от 1 до {LIST_MAX_LIMIT}")
+    status = args.get('status')
+    if status is not None and status not in STATUSES:
+        raise ValueError(f"Недопустимый статус {status}")
+    filters = {
+        'email': args.get('user__email'),
+        'status': status,
+        'level': args.get('level'),
+        'date_from': datetime.fromisoformat(args['date_from']) if args.get('date_from') else None,
+        'date_to': datetime.fromisoformat(args['date_to']) if args.get('date_to') else None,
+        'after_id': decode_cursor(args['cursor']) if args.get('cursor') else None,
+    }
+    # ID нужен для курсора, даже если его нет в запрошенных полях
+    columns = tuple(dict.fromkeys(('id',) + tuple(column for field in fields for column in RESPONSE_FIELDS[field])))
+    return fields, columns, limit, filters
@@ -1,21 +1,327 @@
-from datetime import datetime
+import hmac
+import logging
+import os
+import threading
+import time
 
-from flask import Flask, request, jsonify
-from flasgger import Swagger
-from Обучение.Rest_API.DatabaseHandler import DatabaseHandler
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify, url_for
+from werkzeug.datastructures import ContentRange
+from werkzeug.local import LocalProxy
+from werkzeug.middleware.proxy_fix import ProxyFix
+from cache import create_cache
+from config import is_enabled, load_config, parse_moderator_tokens
+from DatabaseHandler import DatabaseHandler, last_write_time, reset_last_write_time, set_last_write_time
+from validation import format_errors, validate_pereval, validate_pereval_patch
+from batch_loader import ingest, iter_ndjson
+from image_utils import THUMBNAIL_SIZES, make_thumbnail, sniff_mime, thumbnails_available
+import compression
+import json_utils
+import metrics
+from rate_limit import ConcurrencyLimiter, concurrency_limit, create_rate_limiter, retry_after
+from serializers import (encode_cursor, expected_versions, idempotency_key, parse_list_params,
+                         pereval_serializer, version_etag)
 
-# Создание приложения Flask
-app = Flask(__name__)
+# Маршруты API; приложение создаёт create_app
+api = Blueprint('api', __name__)
 
-# Инициализация Swagger
-swagger = Swagger(app)
+# Изображение по ID не меняется, поэтому клиенты могут кешировать его надолго
+IMAGE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
 
-# Создание экземпляра DatabaseHandler
-db_handler = DatabaseHandler()
+# Ограничения поиска перевалов рядом с точкой
+NEARBY_MAX_RADIUS_KM = 500
+NEARBY_MAX_LIMIT = 500
 
+# Ограничения поиска по названиям
+SEARCH_MIN_QUERY = 2
+SEARCH_MAX_QUERY = 100
+SEARCH_MAX_LIMIT = 100
 
+# Модерация: сколько перевалов можно забрать за раз и сколько ID изменить одним запросом
+MODERATION_MAX_CLAIM = 100
+MODERATION_MAX_IDS = 1000
 
-@app.route('/submitData', methods=['POST'])
+# Формирование ответа GET /submitData/<id> из строки PerevalRecord
+serialize_pereval = pereval_serializer()
+
+# Cookie со временем последней записи клиента: его чтения в течение FSTR_DB_READ_YOUR_WRITES секунд
+# идут на основную базу, а не на реплики, поэтому клиент сразу видит свои изменения
+LAST_WRITE_COOKIE = 'fstr_last_write'
+
+# Обработчики, изменяющие данные: для них действует ограничение частоты запросов с одного IP
+RATE_LIMITED_ENDPOINTS = frozenset(('submit_data', 'submit_data_batch', 'upload_image', 'patch_submit_data'))
+
+# Типы содержимого для NDJSON
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines')
+
+
+def create_app(config=None):
+    """
+    Создаёт приложение Flask.
+
+    Соединения с базой данных при этом не открываются: DatabaseHandler создаётся при первом запросе
+    в каждом рабочем процессе (см. get_db_handler), поэтому создание приложения быстрое, а процессы,
+    созданные fork после загрузки приложения (gunicorn --preload), не делят соединения.
+
+    :param config: Настройки FSTR_* поверх load_config() (переменные окружения и файл FSTR_CONFIG).
+    :return: Приложение Flask.
+    """
+    app = Flask(__name__)
+    app.config.update(load_config())
+    if config:
+        app.config.update(config)
+
+    # Ответы формируются быстрой реализацией JSON (orjson, если установлен) и сжимаются
+    # по Accept-Encoding (br, zstd, gzip)
+    json_utils.use_backend(app.config.get('FSTR_JSON'))
+    app.json = json_utils.FastJSONProvider(app)
+    compression.init_app(app)
+    app.register_blueprint(api)
+
+    proxies = int(app.config['FSTR_TRUSTED_PROXIES'])
+    if proxies:
+        # За обратным прокси IP клиента (для ограничения частоты запросов) берётся из X-Forwarded-For
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies)
+
+    if is_enabled(app.config['FSTR_SWAGGER']):
+        # flasgger импортируется только при включённой документации: импорт занимает
+        # заметную часть времени запуска. Спецификация строится при первом запросе и кешируется
+        from flasgger import Swagger
+
+        Swagger(app)
+
+    state = app.extensions['fstr'] = {'lock': threading.Lock(), 'db_handler': None, 'pid': None, 'inherited': []}
+
+    # Ограничение нагрузки: частота записей с одного IP и от одного пользователя (маркерные корзины
+    # в памяти процесса или в Redis по FSTR_RATE_LIMIT_URL) и количество одновременных запросов процесса
+    state['ip_limiter'] = create_rate_limiter(
+        url=app.config.get('FSTR_RATE_LIMIT_URL'), rate=float(app.config['FSTR_RATE_LIMIT']),
+        burst=int(app.config['FSTR_RATE_BURST']), maxsize=int(app.config['FSTR_RATE_LIMIT_KEYS']),
+        prefix='fstr:rate:ip:')
+    state['user_limiter'] = create_rate_limiter(
+        url=app.config.get('FSTR_RATE_LIMIT_URL'), rate=float(app.config['FSTR_USER_RATE_LIMIT']),
+        burst=int(app.config['FSTR_USER_RATE_BURST']), maxsize=int(app.config['FSTR_RATE_LIMIT_KEYS']),
+        prefix='fstr:rate:user:')
+    state['concurrency'] = ConcurrencyLimiter(concurrency_limit(app.config))
+    # Модератор определяется по токену из заголовка Authorization, а не по данным запроса
+    state['moderator_tokens'] = parse_moderator_tokens(app.config['FSTR_MODERATOR_TOKENS'])
+    # Кеш перевалов один на приложение: его используют DatabaseHandler и AsyncDatabaseHandler (asgi_app),
+    # поэтому изменение перевала через любой из них сбрасывает запись для обоих
+    state['cache'] = create_cache(
+        url=app.config.get('FSTR_CACHE_URL'), maxsize=int(app.config['FSTR_CACHE_SIZE']),
+        ttl=float(app.config['FSTR_CACHE_TTL']))
+
+    def handler_stats(name):
+        # До первого запроса соединений нет, и метрики пустые
+        return lambda: getattr(state['db_handler'], name)() if state['db_handler'] is not None else {}
+
+    # Состояние пула соединений и кеша отдаётся в /metrics в момент запроса
+    metrics.register_stats('db_pool', handler_stats('pool_stats'))
+    metrics.register_stats('cache', state['cache'].stats)
+    metrics.register_stats('db_replicas', handler_stats('replica_stats'))
+    metrics.register_stats('rate_limit_ip', state['ip_limiter'].stats)
+    metrics.register_stats('rate_limit_user', state['user_limiter'].stats)
+    metrics.register_stats('concurrency', state['concurrency'].stats)
+    return app
+
+
+def _int_setting(name):
+    """
+    Возвращает целочисленную настройку FSTR_* текущего приложения (см. create_app).
+    """
+    return int(current_app.config[name])
+
+
+def get_db_handler(app=None):
+    """
+    Возвращает DatabaseHandler приложения, создавая его при первом обращении в текущем процессе.
+
+    :param app: Приложение Flask (по умолчанию текущее).
+    :return: DatabaseHandler.
+    """
+    app = app or current_app._get_current_object()
+    state = app.extensions['fstr']
+    if state['db_handler'] is not None and state['pid'] == os.getpid():
+        return state['db_handler']
+    with state['lock']:
+        if state['db_handler'] is None or state['pid'] != os.getpid():
+            if state['db_handler'] is not None:
+                # Соединения открыты до fork и принадлежат родительскому процессу: закрытие здесь
+                # оборвало бы их и у родителя, поэтому объект просто перестаёт использоваться
+                state['inherited'].append(state['db_handler'])
+            state['db_handler'] = DatabaseHandler(cache=state['cache'], settings=app.config)
+            state['pid'] = os.getpid()
+        return state['db_handler']
+
+
+# DatabaseHandler текущего приложения
+db_handler = LocalProxy(get_db_handler)
+
+
+@api.before_app_request
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.trace_token = metrics.start_trace()
+    # Значение устанавливается в каждом запросе: поток сервера мог обслуживать другого клиента
+    try:
+        last_write = float(request.cookies.get(LAST_WRITE_COOKIE, 0))
+    except ValueError:
+        last_write = 0.0
+    g.last_write = last_write
+    g.last_write_token = set_last_write_time(last_write)
+    return _admit_request()
+
+
+def _endpoint_name():
+    """
+    Имя обработчика текущего запроса без имени blueprint (submit_data, а не api.submit_data).
+    """
+    return request.endpoint.rpartition('.')[2] if request.endpoint else None
+
+
+def _rejected(status, message, wait, reason):
+    """
+    Ответ на запрос, отклонённый ограничением нагрузки.
+
+    :param status: 429 (превышена частота запросов) или 503 (сервер перегружен).
+    :param message: Сообщение об ошибке.
+    :param wait: Через сколько секунд можно повторить запрос (заголовок Retry-After).
+    :param reason: Причина для метрики fstr_rejected_requests_total.
+    """
+    metrics.count_rejected(_endpoint_name(), reason)
+    response = jsonify(status=status, message=message)
+    response.status_code = status
+    response.headers['Retry-After'] = retry_after(wait)
+    return response
+
+
+def _check_rate(limiter, key):
+    """
+    Проверяет частоту запросов клиента.
+
+    :param limiter: Ограничение частоты запросов (rate_limit.MemoryRateLimiter или RedisRateLimiter).
+    :param key: Ключ клиента, например ip:<адрес> или user:<почта>.
+    :return: Ответ 429 или None, если запрос разрешён.
+    """
+    allowed, wait = limiter.acquire(key)
+    if allowed:
+        return None
+    return _rejected(429, "Слишком много запросов, повторите запрос позже", wait, 'rate_limit')
+
+
+def _admit_request():
+    """
+    Ограничивает нагрузку до обработки запроса API: запись с одного IP чаще FSTR_RATE_LIMIT
+    отклоняется с кодом 429, а запрос сверх FSTR_MAX_CONCURRENCY одновременных - с кодом 503,
+    не дожидаясь свободного соединения с базой данных. /metrics не ограничивается.
+
+    :return: Ответ с ошибкой или None, если запрос разрешён.
+    """
+    endpoint = _endpoint_name()
+    if request.blueprint != api.name or endpoint == 'get_metrics':
+        return None
+    state = current_app.extensions['fstr']
+    if endpoint in RATE_LIMITED_ENDPOINTS:
+        limited = _check_rate(state['ip_limiter'], f"ip:{request.remote_addr}")
+        if limited is not None:
+            return limited
+    if not state['concurrency'].try_acquire():
+        return _rejected(503, "Сервер перегружен, повторите запрос позже", 1, 'overload')
+    g.concurrency_slot = state['concurrency']
+    return None
+
+
+@api.teardown_app_request
+def _end_request(exc):
+    token = g.pop('last_write_token', None)
+    if token is not None:
+        reset_last_write_time(token)
+    # Ответ не сформирован (необработанное исключение): место освобождается здесь
+    slot = g.pop('concurrency_slot', None)
+    if slot is not None:
+        slot.release()
+
+
+@api.after_app_request
+def _finish_request(response):
+    """
+    Записывает время обработки запроса в метрики и добавляет заголовок Server-Timing (если включён FSTR_TRACE).
+    """
+    if last_write_time() > g.get('last_write', 0.0):
+        window = float(current_app.config['FSTR_DB_READ_YOUR_WRITES'])
+        response.set_cookie(LAST_WRITE_COOKIE, f"{last_write_time():.3f}", max_age=max(1, round(window)),
+                            httponly=True, samesite='Lax')
+    slot = g.pop('concurrency_slot', None)
+    if slot is not None:
+        # Потоковый ответ (список перевалов) продолжает читать базу данных после обработчика,
+        # поэтому место освобождается после отправки ответа
+        response.call_on_close(slot.release)
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    metrics.observe_request(request.method, _endpoint_name(), response.status_code, elapsed,
+                            body_size=request.content_length)
+    spans = metrics.finish_trace(g.pop('trace_token', None))
+    if spans is not None:
+        response.headers['Server-Timing'] = metrics.server_timing(spans, elapsed)
+    return response
+
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Метрики в формате Prometheus
+    ---
+    tags:
+      - Service
+    responses:
+      200:
+        description: Время обработки запросов по маршрутам, время и ошибки запросов к базе данных,
+                     размеры запросов и изображений, состояние пула соединений и кеша
+      501:
+        description: Не установлен prometheus_client
+    """
+    if not metrics.metrics_available():
+        return jsonify(status=501, message="Метрики недоступны: не установлен prometheus_client"), 501
+    data, content_type = metrics.render()
+    return Response(data, content_type=content_type)
+
+
+def _read_json_body():
+    """
+    Читает тело запроса как JSON. Тело больше FSTR_MAX_BODY_SIZE байт отклоняется до разбора.
+
+    :return: Кортеж (данные, None) или (None, ответ с ошибкой).
+    """
+    max_body_size = _int_setting('FSTR_MAX_BODY_SIZE')
+    too_large = jsonify(status=413, message=f"Размер запроса больше {max_body_size} байт"), 413
+    if request.content_length is not None and request.content_length > max_body_size:
+        return None, too_large
+    chunks = []
+    size = 0
+    while True:
+        # Тело без Content-Length (chunked) читается частями до превышения лимита
+        chunk = request.stream.read(65536)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_body_size:
+            return None, too_large
+        chunks.append(chunk)
+    try:
+        return json_utils.loads(b''.join(chunks)), None
+    except ValueError as e:
+        return None, (jsonify(status=400, message=f"Неверный формат JSON: {e}"), 400)
+
+
+def _validation_error(errors):
+    """
+    Ответ со всеми ошибками проверки данных.
+    """
+    return jsonify(status=400, message=format_errors(errors), errors=errors), 400
+
+
+@api.route('/submitData', methods=['POST'])
 def submit_data():
     """
     Обработка данных перевала
@@ -23,6 +329,11 @@ def submit_data():
        tags:
          - Pereval
        parameters:
+         - in: header
+           name: Idempotency-Key
+           type: string
+           required: false
+           description: Ключ для безопасного повтора запроса; повтор с тем же ключом возвращает первый результат
          - in: body
            name: body
            schema:
@@ -80,142 +391,59 @@ def submit_data():
        responses:
          200:
            description: Данные успешно отправлены
+         202:
+           description: Данные сохранены, изображения нормализуются и появятся в перевале после обработки в фоне
          400:
-           description: Неверный формат данных
+           description: Неверный формат данных; в поле errors перечислены все ошибки ({path, message})
+         422:
+           description: Idempotency-Key уже использован для запроса с другими данными
+         413:
+           description: Размер запроса больше допустимого
+         429:
+           description: Превышена частота запросов с IP клиента или от пользователя; Retry-After - через сколько секунд повторить запрос
          500:
            description: Внутренняя ошибка сервера
+         503:
+           description: Сервер перегружен; Retry-After - через сколько секунд повторить запрос
     """
     try:
         # Получение данных из запроса
-        data = request.json
-
-        # Проверка типа данных
-        if not isinstance(data, dict):
-            # Возвращение ошибки, если данные не являются словарем
-            return jsonify(status=400, message="Неверный формат данных"), 400
-
-        # Определение обязательных полей
-        required_fields = ['beauty_title', 'title', 'add_time', 'user', 'coords', 'level', 'images']
-
-        # Проверка обязательных полей
-        for field in required_fields:
-            if field not in data:
-                # Возвращение ошибки, если обязательное поле отсутствует
-                return jsonify(status=400, message=f"Отсутствует обязательное поле {field}"), 400
-
-        # Получение информации о пользователе
-        user_info = data.get('user', {})
-
-        # Проверка типа данных
-        if not isinstance(user_info, dict):
-            # Возвращение ошибки, если данные не являются словарем
-            return jsonify(status=400, message="Неверный формат информации о пользователе"), 400
-
-        # Определение обязательных полей для пользователя
-        required_user_fields = ['email', 'fam', 'name', 'otc', 'phone']
-
-        # Проверка обязательных полей для пользователя
-        for field in required_user_fields:
-            if field not in user_info:
-                # Возвращение ошибки, если обязательное поле отсутствует
-                return jsonify(status=400,
-                               message=f"Отсутствует обязательное поле {field} в информации о пользователе"), 400
-
-        # Получение координат
-        coords = data.get('coords', {})
-
-        # Проверка типа данных
-        if not isinstance(coords, dict):
-            # Возвращение ошибки, если данные не являются словарем
-            return jsonify(status=400, message="Неверный формат координат"), 400
-
-        # Определение обязательных полей для координат
-        required_coords_fields = ['latitude', 'longitude', 'height']
-
-        # Проверка обязательных полей для координат
-        for field in required_coords_fields:
-            if field not in coords:
-                # Возвращение ошибки, если обязательное поле отсутствует
-                return jsonify(status=400, message=f"Отсутствует обязательное поле {field} в координатах"), 400
-
-        # Получение уровня
-        level = data.get('level', {})
-
-        # Проверка типа данных
-        if not isinstance(level, dict):
-            # Возвращение ошибки, если данные не являются словарем
-            return jsonify(status=400, message="Неверный формат уровня"), 400
-
-        # Определение обязательных полей для уровня
-        required_level_fields = ['winter', 'summer', 'autumn', 'spring']
-
-        # Проверка обязательных полей для уровня
-        for field in required_level_fields:
-            if field not in level:
-                # Возвращение ошибки, если обязательное поле отсутствует
-                return jsonify(status=400, message=f"Отсутствует обязательное поле {field} в уровне"), 400
-
-        # Получение изображений
-        images = data.get('images', [])
-
-        # Проверка типа данных
-        if not isinstance(images, list) or not all(isinstance(image, dict) for image in images):
-            # Возвращение ошибки, если данные не являются списком словарей
-            return jsonify(status=400, message="Изображения должны быть списком словарей"), 400
+        with metrics.span('read_json'):
+            data, error_response = _read_json_body()
+        if error_response is not None:
+            return error_response
+
+        # Проверка данных перевала
+        with metrics.span('validate'):
+            errors = validate_pereval(data)
+        if errors:
+            # Возвращение всех ошибок, если данные некорректны
+            return _validation_error(errors)
+
+        # Частота отправки от одного пользователя ограничивается независимо от IP
+        limited = _check_rate(current_app.extensions['fstr']['user_limiter'],
+                              f"user:{data['user']['email'].strip().lower()}")
+        if limited is not None:
+            return limited
+
+        try:
+            key = idempotency_key(request.headers.get('Idempotency-Key'))
+        except ValueError as e:
+            return jsonify(status=400, message=str(e)), 400
 
         try:
-            # Проверка существования пользователя
-            if db_handler.check_user_exists(user_info.get('email')):
-                # Возвращение ошибки, если пользователь уже существует
-                return jsonify(status=400, message="Пользователь уже существует"), 400
-
-            # Добавление пользователя
-            user_id = db_handler.add_user(
-                user_info.get('email'),
-                user_info.get('fam'),
-                user_info.get('name'),
-                user_info.get('otc'),
-                user_info.get('phone')
-            )
-
-            # Добавление координат
-            coord_id = db_handler.add_coord(
-                coords.get('latitude'),
-                coords.get('longitude'),
-                coords.get('height')
-            )
-
-            # Добавление перевала
-            pereval_id = db_handler.add_pereval(
-                beauty_title=data.get('beauty_title'),
-                title=data.get('title'),
-                other_titles=data.get('other_titles', ""),
-                connect=data.get('connect', ""),
-                add_time=data.get('add_time'),
-                user_id=user_id,
-                coord_id=coord_id,
-                level_winter=level.get('winter'),
-                level_summer=level.get('summer'),
-                level_autumn=level.get('autumn'),
-                level_spring=level.get('spring'),
-                status='new'
-            )
-
-            # Добавление изображений
-            for image in images:
-                image_id = db_handler.add_image(
-                    image.get('data'),
-                    image.get('title'),
-                    pereval_id
-                )
-                # Если не удалось добавить изображение, то возвращаем ошибку
-                if image_id is None:
-                    return jsonify(status=500, message="Ошибка при добавлении изображения"), 500
-
-            if pereval_id is not None:
-                return jsonify(status=200, id=pereval_id, message="Отправлено успешно"), 200
+            # Пользователь, координаты, перевал и изображения добавляются одной транзакцией;
+            # повтор запроса с тем же ключом возвращает результат первого запроса
+            result = db_handler.submit_pereval(data, idempotency_key=key)
+            if result['state'] == 1:
+                headers = {'Idempotent-Replayed': 'true'} if result['replayed'] else {}
+                if result['queued']:
+                    # Перевал сохранён, изображения обрабатываются фоновой задачей (job_queue.py)
+                    return jsonify(status=202, id=result['id'],
+                                   message="Отправлено успешно, изображения обрабатываются"), 202, headers
+                return jsonify(status=200, id=result['id'], message="Отправлено успешно"), 200, headers
             else:
-                return jsonify(status=500, message="Ошибка при добавлении перевала"), 500
+                return jsonify(status=result['status'], message=result['message']), result['status']
         except Exception as e:
             return jsonify(status=500, message=f"Внутренняя ошибка {e}"), 500
     except Exception as e:
@@ -223,7 +451,620 @@ def submit_data():
 
 
 
-@app.route('/submitData/<int:id>', methods=['GET'])
+@api.route('/submitData', methods=['GET'])
+def list_submit_data():
+    """
+    Получение списка перевалов с фильтрами и постраничным выводом
+    ---
+    tags:
+      - Pereval
+    parameters:
+      - in: query
+        name: user__email
+        type: string
+        required: false
+        description: Электронная почта пользователя
+      - in: query
+        name: status
+        type: string
+        enum: [new, pending, accepted, rejected]
+        required: false
+      - in: query
+        name: level
+        type: string
+        required: false
+        description: Уровень сложности в любое время года
+      - in: query
+        name: date_from
+        type: string
+        format: date-time
+        required: false
+        description: Минимальное время добавления
+      - in: query
+        name: date_to
+        type: string
+        format: date-time
+        required: false
+        description: Максимальное время добавления (не включительно)
+      - in: query
+        name: fields
+        type: string
+        required: false
+        description: Поля ответа через запятую, например id,title,status
+      - in: query
+        name: limit
+        type: integer
+        required: false
+        description: Размер страницы (по умолчанию 100, не больше 1000)
+      - in: query
+        name: cursor
+        type: string
+        required: false
+        description: Курсор следующей страницы (next_cursor из предыдущего ответа)
+    responses:
+      200:
+        description: Страница списка перевалов
+        schema:
+          type: object
+          properties:
+            status:
+              type: integer
+            data:
+              type: array
+              items:
+                type: object
+            next_cursor:
+              type: string
+      400:
+        description: Неверные параметры запроса
+      500:
+        description: Внутренняя ошибка сервера
+    """
+    try:
+        fields, columns, limit, filters = parse_list_params(request.args)
+    except ValueError as e:
+        return jsonify(status=400, message=f"Неверные параметры запроса: {e}"), 400
+
+    try:
+        # Запрашиваем на одну запись больше, чтобы узнать, есть ли следующая страница.
+        # Страница читается одним запросом до начала ответа: соединение возвращается в пул
+        # до отправки данных клиенту, а ошибку запроса можно вернуть с кодом 500
+        rows = db_handler.iter_submissions(limit=limit + 1, columns=columns, page_size=limit + 1, **filters)
+        first = next(rows, None)
+    except Exception as e:
+        return jsonify(status=500, message=f"Внутренняя ошибка {e}"), 500
+
+    serialize = pereval_serializer(columns, fields)
+
+    def generate():
+        # Ответ формируется по мере чтения записей, не собирая всю страницу в памяти;
+        # записи объединяются в части по STREAM_CHUNK_SIZE байт, чтобы не отправлять каждую отдельно
+        try:
+            buffer = bytearray(b'{"status":200,"data":[')
+            row = first
+            count = 0
+            last_id = None
+            while row is not None and count < limit:
+                if count:
+                    buffer += b','
+                buffer += json_utils.dumps(serialize(row))
+                if len(buffer) >= json_utils.STREAM_CHUNK_SIZE:
+                    yield bytes(buffer)
+                    buffer.clear()
+                # ID всегда первый столбец (см. parse_list_params)
+                last_id = row[0]
+                count += 1
+                row = next(rows, None)
+            next_cursor = encode_cursor(last_id) if row is not None else None
+            buffer += b'],"next_cursor":' + json_utils.dumps(next_cursor) + b'}'
+            yield bytes(buffer)
+        finally:
+            rows.close()
+
+    return Response(generate(), mimetype='application/json')
+
+
+@api.route('/passes/nearby', methods=['GET'])
+def get_nearby_passes():
+    """
+    Поиск перевалов рядом с точкой
+    ---
+    tags:
+      - Pereval
+    parameters:
+      - in: query
+        name: lat
+        type: number
+        required: true
+        description: Широта
+      - in: query
+        name: lon
+        type: number
+        required: true
+        description: Долгота
+      - in: query
+        name: radius_km
+        type: number
+        required: false
+        description: Радиус поиска в километрах (по умолчанию 10, не больше 500)
+      - in: query
+        name: min_height
+        type: integer
+        required: false
+        description: Минимальная высота перевала
+      - in: query
+        name: limit
+        type: integer
+        required: false
+        description: Максимальное количество перевалов (по умолчанию 50, не больше 500)
+    responses:
+      200:
+        description: Перевалы, упорядоченные по расстоянию
+        schema:
+          type: object
+          properties:
+            status:
+              type: integer
+            data:
+              type: array
+              items:
+                type: object
+                properties:
+                  id:
+                    type: integer
+                  beauty_title:
+                    type: string
+                  title:
+                    type: string
+                  status:
+                    type: string
+                  coords:
+                    type: object
+                  distance_km:
+                    type: number
+      400:
+        description: Неверные параметры запроса
+      500:
+        description: Внутренняя ошибка сервера
+    """
+    args = request.args
+    try:
+        latitude = float(args['lat'])
+        longitude = float(args['lon'])
+        radius_km = float(args.get('radius_km', 10))
+        min_height = int(args['min_height']) if args.get('min_height') else None
+        limit = int(args.get('limit', 50))
+    except KeyError as e:
+        return jsonify(status=400, message=f"Отсутствует обязательный параметр {e.args[0]}"), 400
+    except ValueError as e:
+        return jsonify(status=400, message=f"Неверные параметры запроса: {e}"), 400
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        return jsonify(status=400, message="Координаты вне допустимого диапазона"), 400
+    if not 0 < radius_km <= NEARBY_MAX_RADIUS_KM:
+        return jsonify(status=400, message=f"radius_km должен быть больше 0 и не больше {NEARBY_MAX_RADIUS_KM}"), 400
+    if not 1 <= limit <= NEARBY_MAX_LIMIT:
+        return jsonify(status=400, message=f"limit должен быть от 1 до {NEARBY_MAX_LIMIT}"), 400
+
+    try:
+        records = db_handler.find_nearby(latitude, longitude, radius_km * 1000, min_height=min_height, limit=limit)
+        if records is None:
+            return jsonify(status=500, message="Ошибка при поиске перевалов"), 500
+        data = [{
+            "id": pereval_id,
+            "beauty_title": beauty_title,
+            "title": title,
+            "status": status,
+            "coords": {"latitude": lat, "longitude": lon, "height": height},
+            "distance_km": round(distance / 1000, 3)
+        } for pereval_id, beauty_title, title, status, lat, lon, height, distance in records]
+        return jsonify(status=200, data=data), 200
+    except Exception as e:
+        return jsonify(status=500, message=f"Внутренняя ошибка {e}"), 500
+
+
+@api.route('/passes/search', methods=['GET'])
+def search_passes():
+    """
+    Поиск перевалов по названию
+    ---
+    tags:
+      - Pereval
+    parameters:
+      - in: query
+        name: q
+        type: string
+        required: true
+        description: Название или его часть, кириллицей или латиницей; допускаются опечатки
+      - in: query
+        name: limit
+        type: integer
+        required: false
+        description: Максимальное количество перевалов (по умолчанию 20, не больше 100)
+    responses:
+      200:
+        description: Найденные перевалы, наиболее похожие первыми
+        schema:
+          type: object
+          properties:
+            status:
+              type: integer
+            data:
+              type: array
+              items:
+                type: object
+                properties:
+                  id:
+                    type: integer
+                  beauty_title:
+                    type: string
+                  title:
+                    type: string
+                  other_titles:
+                    type: string
+                  score:
+                    type: number
+      400:
+        description: Неверные параметры запроса
+      500:
+        description: Внутренняя ошибка сервера
+    """
+    query = ' '.join(request.args.get('q', '').split())
+    if not SEARCH_MIN_QUERY <= len(query) <= SEARCH_MAX_QUERY:
+        return jsonify(status=400,
+                       message=f"Длина запроса должна быть от {SEARCH_MIN_QUERY} до {SEARCH_MAX_QUERY} символов"), 400
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify(status=400, message="limit должен быть целым числом"), 400
+    if not 1 <= limit <= SEARCH_MAX_LIMIT:
+        return jsonify(status=400, message=f"limit должен быть от 1 до {SEARCH_MAX_LIMIT}"), 400
+
+    try:
+        records = db_handler.search_passes(query, limit=limit)
+        if records is None:
+            return jsonify(status=500, message="Ошибка при поиске перевалов"), 500
+        data = [{
+            "id": pereval_id,
+            "beauty_title": beauty_title,
+            "title": title,
+            "other_titles": other_titles,
+            "score": round(score, 3)
+        } for pereval_id, beauty_title, title, other_titles, score in records]
+        return jsonify(status=200, data=data), 200
+    except Exception as e:
+        return jsonify(status=500, message=f"Внутренняя ошибка {e}"), 500
+
+
+@api.route('/submitData/batch', methods=['POST'])
+def submit_data_batch():
+    """
+    Пакетная отправка данных перевалов
+    ---
+    tags:
+      - Pereval
+    consumes:
+      - application/json
+      - application/x-ndjson
+    parameters:
+      - in: body
+        name: body
+        description: JSON-массив записей в формате POST /submitData или NDJSON (одна запись в строке)
+        schema:
+          type: array
+          items:
+            type: object
+    responses:
+      200:
+        description: Пакет обработан, статус каждой записи в results
+        schema:
+          type: object
+          properties:
+            status:
+              type: integer
+            accepted:
+              type: integer
+            rejected:
+              type: integer
+            results:
+              type: array
+              items:
+                type: object
+                properties:
+                  index:
+                    type: integer
+                  status:
+                    type: integer
+                  id:
+                    type: integer
+                  message:
+                    type: string
+      400:
+        description: Неверный формат данных
+      413:
+        description: Слишком много записей в пакете или JSON-массив больше допустимого размера
+      429:
+        description: Превышена частота запросов с IP клиента; Retry-After - через сколько секунд повторить запрос
+      500:
+        description: Внутренняя ошибка сервера
+      503:
+        description: Сервер перегружен; Retry-After - через сколько секунд повторить запрос
+    """
+    max_records = _int_setting('FSTR_BATCH_MAX_RECORDS')
+    max_body_size = _int_setting('FSTR_MAX_BODY_SIZE')
+    try:
+        if request.mimetype in NDJSON_MIMETYPES:
+            # NDJSON читается построчно, не загружая весь пакет в память
+            records = iter_ndjson(request.stream, max_line_size=max_body_size)
+        else:
+            records, error_response = _read_json_body()
+            if error_response is not None:
+                return error_response
+            if not isinstance(records, list):
+                return jsonify(status=400, message="Ожидался JSON-массив записей"), 400
+            if len(records) > max_records:
+                return jsonify(status=413,
+                               message=f"Превышено количество записей в пакете ({max_records})"), 413
+
+        # Группа записей в памяти не больше одного тела POST /submitData; статусы записей (их не больше
+        # max_records) занимают десятки байт и собираются для ответа
+        results = list(ingest(db_handler, records, max_records=max_records, max_chunk_bytes=max_body_size))
+        accepted = sum(1 for result in results if result['status'] == 200)
+        return jsonify(status=200, accepted=accepted, rejected=len(results) - accepted, results=results), 200
+    except Exception as e:
+        return jsonify(status=500, message=f"Внутренняя ошибка {e}"), 500
+
+
+@api.route('/submitData/<int:id>/images', methods=['POST'])
+def upload_image(id):
+    """
+    Загрузка изображения перевала без кодирования в base64
+    ---
+    tags:
+      - Pereval
+    consumes:
+      - application/octet-stream
+      - multipart/form-data
+    parameters:
+      - in: path
+        name: id
+        type: integer
+        required: true
+        description: ID перевала
+      - in: query
+        name: title
+        type: string
+        required: false
+        description: Название изображения
+      - in: formData
+        name: image
+        type: file
+        required: false
+        description: Файл изображения (для multipart/form-data)
+    responses:
+      201:
+        description: Изображение загружено
+      400:
+        description: Изображение не передано
+      404:
+        description: Перевал не найден
+      413:
+        description: Изображение слишком большое
+      422:
+        description: Изображение не удалось обработать (метаданные не удалены, поэтому оно не сохраняется)
+      429:
+        description: Превышена частота запросов с IP клиента; Retry-After - через сколько секунд повторить запрос
+      500:
+        description: Внутренняя ошибка сервера
+      503:
+        description: Сервер перегружен; Retry-After - через сколько секунд повторить запрос
+    """
+    max_image_size = _int_setting('FSTR_MAX_IMAGE_SIZE')
+    try:
+        if request.content_length is not None and request.content_length > max_image_size + 64 * 1024:
+            return jsonify(status=413, message=f"Размер изображения превышает {max_image_size} байт"), 413
+
+        title = request.args.get('title')
+        if request.mimetype == 'multipart/form-data':
+            # Werkzeug сохраняет большие файлы во временный файл на диске, а не в память
+            image = request.files.get('image') or next(iter(request.files.values()), None)
+            if image is None:
+                return jsonify(status=400, message="Изображение не передано"), 400
+            title = request.form.get('title', title) or image.filename
+            stream = image.stream
+        else:
+            stream = request.stream
+
+        result = db_handler.add_image_stream(id, title, stream, max_size=max_image_size)
+        if result['state'] == 1:
+            return jsonify(status=201, id=result['id'], size=result['size'], sha256=result['sha256'],
+                           deduplicated=result['deduplicated'], message="Изображение загружено"), 201
+        else:
+            return jsonify(status=result['status'], message=result['message']), result['status']
+    except Exception as e:
+        return jsonify(status=500, message=f"Внутренняя ошибка {e}"), 500
+
+
+@api.route('/submitData/<int:id>/images', methods=['GET'])
+def get_images(id):
+    """
+    Получение списка изображений перевала
+    ---
+    tags:
+      - Pereval
+    parameters:
+      - in: path
+        name: id
+        type: integer
+        required: true
+        description: ID перевала
+    responses:
+      200:
+        description: Список изображений без их содержимого
+        schema:
+          type: object
+          properties:
+            status:
+              type: integer
+            data:
+              type: array
+              items:
+                type: object
+                properties:
+                  id:
+                    type: integer
+                  title:
+                    type: string
+                  sha256:
+                    type: string
+                  size:
+                    type: integer
+                  url:
+                    type: string
+      404:
+        description: Перевал не найден
+      500:
+        description: Внутренняя ошибка сервера
+    """
+    try:
+        images = db_handler.get_images_by_pereval_id(id)
+        if images is None:
+            return jsonify(status=404, message="Запись не найдена"), 404
+        data = [{
+            "id": image_id,
+            "title": title,
+            "sha256": sha256,
+            "size": size,
+            "url": url_for('.get_image', image_id=image_id)
+        } for image_id, title, sha256, size in images]
+        return jsonify(status=200, data=data), 200
+    except Exception as e:
+        return jsonify(status=500, message=f"Внутренняя ошибка {e}"), 500
+
+
+@api.route('/images/<int:image_id>', methods=['GET'])
+def get_image(image_id):
+    """
+    Получение изображения
+    ---
+    tags:
+      - Pereval
+    produces:
+      - image/jpeg
+      - image/png
+      - application/octet-stream
+    parameters:
+      - in: path
+        name: image_id
+        type: integer
+        required: true
+        description: ID изображения
+      - in: query
+        name: size
+        type: integer
+        required: false
+        description: Размер миниатюры (128, 256, 512 или 1024)
+      - in: header
+        name: Range
+        type: string
+        required: false
+        description: Диапазон байт, например bytes=0-1023
+      - in: header
+        name: If-None-Match
+        type: string
+        required: false
+        description: ETag ранее полученного изображения
+    responses:
+      200:
+        description: Изображение
+      206:
+        description: Часть изображения
+      304:
+        description: Изображение не изменилось
+      400:
+        description: Недопустимый размер миниатюры
+      404:
+        description: Изображение не найдено
+      416:
+        description: Недопустимый диапазон
+      500:
+        description: Внутренняя ошибка сервера
+    """
+    try:
+        info = db_handler.get_image_info(image_id)
+        if info is None:
+            return jsonify(status=404, message="Изображение не найдено"), 404
+        sha256, size, head = info
+
+        if 'size' in request.args:
+            thumbnail_size = request.args.get('size', type=int)
+            if thumbnail_size not in THUMBNAIL_SIZES:
+                sizes = ', '.join(str(item) for item in sorted(THUMBNAIL_SIZES))
+                return jsonify(status=400, message=f"Допустимые размеры миниатюр: {sizes}"), 400
+            return _thumbnail_response(sha256, thumbnail_size)
+
+        # Хеш содержимого служит сильным ETag
+        if request.if_none_match.contains_weak(sha256):
+            response = Response(status=304)
+            response.set_etag(sha256)
+            response.headers['Cache-Control'] = IMAGE_CACHE_CONTROL
+            return response
+
+        byte_range = request.range
+        if byte_range is not None and 'If-Range' in request.headers and request.if_range.etag != sha256:
+            # Изображение на клиенте устарело: отдаём его целиком
+            byte_range = None
+        if byte_range is not None and (byte_range.units != 'bytes' or len(byte_range.ranges) != 1):
+            # Несколько диапазонов не поддерживаются, заголовок Range можно проигнорировать
+            byte_range = None
+
+        if byte_range is not None:
+            bounds = byte_range.range_for_length(size)
+            if bounds is None:
+                response = Response(status=416)
+                response.headers['Content-Range'] = f"bytes */{size}"
+                return response
+            start, stop = bounds
+            response = Response(db_handler.iter_image_bytes(sha256, start, stop - start), status=206,
+                                mimetype=sniff_mime(head))
+            response.content_range = ContentRange('bytes', start, stop, size)
+            response.content_length = stop - start
+        else:
+            # Изображение отдаётся частями, без загрузки целиком в память
+            response = Response(db_handler.iter_image_bytes(sha256), mimetype=sniff_mime(head))
+            response.content_length = size
+        response.set_etag(sha256)
+        response.headers['Cache-Control'] = IMAGE_CACHE_CONTROL
+        response.headers['Accept-Ranges'] = 'bytes'
+        return response
+    except Exception as e:
+        return jsonify(status=500, message=f"Внутренняя ошибка {e}"), 500
+
+
+def _thumbnail_response(sha256, size):
+    """
+    Отдаёт миниатюру изображения, создавая и сохраняя её при первом запросе.
+    """
+    thumbnail = db_handler.get_thumbnail(sha256, size)
+    if thumbnail is None:
+        if not thumbnails_available():
+            return jsonify(status=501, message="Миниатюры недоступны: не установлен Pillow"), 501
+        original = db_handler.get_image_bytes(sha256)
+        if original is None:
+            return jsonify(status=404, message="Изображение не найдено"), 404
+        try:
+            thumbnail = make_thumbnail(original, size)
+        except ValueError as e:
+            return jsonify(status=415, message=str(e)), 415
+        db_handler.add_thumbnail(sha256, size, *thumbnail)
+
+    data, mime = thumbnail
+    response = Response(data, mimetype=mime)
+    response.set_etag(f"{sha256}-{size}")
+    response.headers['Cache-Control'] = IMAGE_CACHE_CONTROL
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+
+@api.route('/submitData/<int:id>', methods=['GET'])
 def get_submit_data(id):
     """
     Получение данных перевала по ID
@@ -277,6 +1118,11 @@ def get_submit_data(id):
                       type: string
                 status:
                   type: string
+        headers:
+          ETag:
+            type: string
+            description: Версия перевала; передаётся в If-Match при PATCH (у сжатого ответа - с суффиксом
+                         кодировки, например "v3-gzip")
       404:
         description: Запись не найдена
       500:
@@ -285,26 +1131,10 @@ def get_submit_data(id):
     try:
         record = db_handler.get_pereval_by_id(id)
         if record:
-            # Формирование ответа с правильным форматированием даты
-            response_data = {
-                "id": record[0],  # ID перевала
-                "beauty_title": record[1],  # Красивое название
-                "title": record[2],  # Заголовок
-                "other_titles": record[3],  # Другие названия
-                "connect": record[4],  # Связь
-                "add_time": record[5].strftime("%a, %d %b %Y %H:%M:%S GMT") if isinstance(record[5], datetime) else
-                record[5],  # Форматирование времени
-                "user_id": record[6],  # ID пользователя
-                "coord_id": record[7],  # ID координат
-                "level": {
-                    "winter": record[8],  # Уровень зимы
-                    "summer": record[9],  # Уровень лета
-                    "autumn": record[10],  # Уровень осени
-                    "spring": record[11]  # Уровень весны
-                },
-                "status": record[12]  # Статус
-            }
-            return jsonify(status=200, data=response_data), 200
+            response_data = serialize_pereval(record)
+            response = jsonify(status=200, data=response_data)
+            response.set_etag(version_etag(record.version))
+            return response.make_conditional(request)
         else:
             return jsonify(status=404, message="Запись не найдена"), 404
     except Exception as e:
@@ -312,7 +1142,7 @@ def get_submit_data(id):
 
 
 
-@app.route('/submitData/<int:id>', methods=['PATCH'])
+@api.route('/submitData/<int:id>', methods=['PATCH'])
 def patch_submit_data(id):
     """
     Обновление данных перевала по ID
@@ -325,6 +1155,11 @@ def patch_submit_data(id):
         type: integer
         required: true
         description: ID перевала для обновления данных
+      - in: header
+        name: If-Match
+        type: string
+        required: false
+        description: ETag из GET /submitData/<id>; запись обновляется, только если её версия не изменилась
       - in: body
         name: body
         schema:
@@ -354,22 +1189,294 @@ def patch_submit_data(id):
                   type: string
     responses:
       200:
-        description: Запись успешно обновлена
+        description: Запись успешно обновлена; ETag содержит новую версию
       400:
-        description: Ошибка в данных запроса
+        description: Ошибка в данных запроса; в поле errors перечислены все ошибки проверки ({path, message})
+      404:
+        description: Запись не найдена
+      412:
+        description: Запись изменена после получения ETag; ETag содержит текущую версию
+      413:
+        description: Размер запроса больше допустимого
+      429:
+        description: Превышена частота запросов с IP клиента; Retry-After - через сколько секунд повторить запрос
       500:
         description: Внутренняя ошибка сервера
+      503:
+        description: Сервер перегружен; Retry-After - через сколько секунд повторить запрос
     """
     try:
-        data = request.json
-        result = db_handler.update_pereval(id, data)
+        data, error_response = _read_json_body()
+        if error_response is not None:
+            return error_response
+        errors = validate_pereval_patch(data)
+        if errors:
+            return _validation_error(errors)
+        # Обновляются только переданные поля; при If-Match - только если версия не изменилась
+        result = db_handler.update_pereval(id, data, expected_versions=expected_versions(request.if_match))
         if result['state'] == 1:
-            return jsonify(status=200, message="Запись успешно обновлена"), 200
+            response = jsonify(status=200, message="Запись успешно обновлена")
+            response.set_etag(version_etag(result['version']))
+            return response, 200
         else:
-            return jsonify(status=400, message=result['message']), 400
+            response = jsonify(status=result['status'], message=result['message'])
+            if 'version' in result:
+                response.set_etag(version_etag(result['version']))
+            return response, result['status']
+    except Exception as e:
+        return jsonify(status=500, message=f"Внутренняя ошибка {e}"), 500
+
+
+def _parse_ids(data):
+    """
+    Получает список ID перевалов из тела запроса модерации.
+
+    :return: Кортеж (список ID, None) или (None, сообщение об ошибке).
+    """
+    ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not ids or not all(isinstance(item, int) and not isinstance(item, bool)
+                                                       for item in ids):
+        return None, "ids должен быть непустым списком целых чисел"
+    if len(ids) > MODERATION_MAX_IDS:
+        return None, f"Не больше {MODERATION_MAX_IDS} ID за один запрос"
+    return ids, None
+
+
+def _authenticate_moderator():
+    """
+    Определяет модератора по заголовку Authorization: Bearer <токен>.
+    Токены и имена модераторов задаёт настройка FSTR_MODERATOR_TOKENS.
+
+    :return: Кортеж (имя модератора, None) или (None, ответ 401).
+    """
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    moderator = None
+    if scheme.lower() == 'bearer' and token.strip():
+        token = token.strip().encode('utf-8')
+        for expected, name in current_app.extensions['fstr']['moderator_tokens']:
+            # compare_digest: время сравнения не зависит от количества совпавших символов
+            if hmac.compare_digest(token, expected):
+                moderator = name
+    if moderator is None:
+        response = jsonify(status=401, message="Нужен токен модератора: Authorization: Bearer <токен>")
+        response.headers['WWW-Authenticate'] = 'Bearer realm="moderation"'
+        return None, (response, 401)
+    return moderator, None
+
+
+@api.route('/moderation/queue', methods=['GET'])
+def get_moderation_queue():
+    """
+    Очередь модерации: перевалы со статусом new
+    ---
+    tags:
+      - Moderation
+    parameters:
+      - in: header
+        name: Authorization
+        type: string
+        required: true
+        description: Bearer и токен модератора из FSTR_MODERATOR_TOKENS
+      - in: query
+        name: limit
+        type: integer
+        required: false
+        description: Размер страницы (по умолчанию 100, не больше 1000)
+      - in: query
+        name: cursor
+        type: string
+        required: false
+        description: Курсор следующей страницы (next_cursor из предыдущего ответа)
+    responses:
+      200:
+        description: Страница очереди
+      400:
+        description: Неверные параметры запроса
+      401:
+        description: Токен модератора не передан или неверен
+      500:
+        description: Внутренняя ошибка сервера
+    """
+    _, error_response = _authenticate_moderator()
+    if error_response is not None:
+        return error_response
+    try:
+        _, _, limit, filters = parse_list_params(request.args)
+    except ValueError as e:
+        return jsonify(status=400, message=f"Неверные параметры запроса: {e}"), 400
+    try:
+        # Частичный индекс pereval_added_new_idx содержит только перевалы очереди
+        rows = list(db_handler.iter_submissions(status='new', after_id=filters['after_id'], limit=limit + 1,
+                                                page_size=limit + 1))
+        data = [serialize_pereval(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+        return jsonify(status=200, data=data, next_cursor=next_cursor), 200
+    except Exception as e:
+        return jsonify(status=500, message=f"Внутренняя ошибка {e}"), 500
+
+
+@api.route('/moderation/claim', methods=['POST'])
+def claim_moderation():
+    """
+    Забрать перевалы из очереди на проверку (new -> pending)
+    ---
+    tags:
+      - Moderation
+    description: >
+      Несколько модераторов могут вызывать метод одновременно: каждый получает свои перевалы.
+      Перевалы, не проверенные за FSTR_MODERATION_CLAIM_TTL секунд, возвращаются в очередь.
+    parameters:
+      - in: header
+        name: Authorization
+        type: string
+        required: true
+        description: Bearer и токен модератора из FSTR_MODERATOR_TOKENS
+      - in: body
+        name: body
+        schema:
+          type: object
+          properties:
+            limit:
+              type: integer
+    responses:
+      200:
+        description: Забранные перевалы
+      400:
+        description: Неверные параметры запроса
+      401:
+        description: Токен модератора не передан или неверен
+      500:
+        description: Внутренняя ошибка сервера
+    """
+    moderator, error_response = _authenticate_moderator()
+    if error_response is not None:
+        return error_response
+    data, error_response = _read_json_body()
+    if error_response is not None:
+        return error_response
+    limit = data.get('limit', 10) if isinstance(data, dict) else None
+    if not isinstance(limit, int) or not 1 <= limit <= MODERATION_MAX_CLAIM:
+        return jsonify(status=400, message=f"limit должен быть от 1 до {MODERATION_MAX_CLAIM}"), 400
+    try:
+        records = db_handler.claim_perevals(moderator, limit=limit,
+                                            claim_ttl=_int_setting('FSTR_MODERATION_CLAIM_TTL'))
+        return jsonify(status=200, data=[serialize_pereval(record) for record in records]), 200
+    except Exception as e:
+        return jsonify(status=500, message=f"Внутренняя ошибка {e}"), 500
+
+
+@api.route('/moderation/release', methods=['POST'])
+def release_moderation():
+    """
+    Вернуть забранные перевалы в очередь (pending -> new)
+    ---
+    tags:
+      - Moderation
+    description: >
+      Возвращаются перевалы, забранные этим модератором, и перевалы, срок проверки которых
+      (FSTR_MODERATION_CLAIM_TTL) истёк.
+    parameters:
+      - in: header
+        name: Authorization
+        type: string
+        required: true
+        description: Bearer и токен модератора из FSTR_MODERATOR_TOKENS
+      - in: body
+        name: body
+        schema:
+          type: object
+          required: [ids]
+          properties:
+            ids:
+              type: array
+              items:
+                type: integer
+    responses:
+      200:
+        description: ID возвращённых в очередь перевалов
+      400:
+        description: Неверные параметры запроса
+      401:
+        description: Токен модератора не передан или неверен
+      500:
+        description: Внутренняя ошибка сервера
+    """
+    moderator, error_response = _authenticate_moderator()
+    if error_response is not None:
+        return error_response
+    data, error_response = _read_json_body()
+    if error_response is not None:
+        return error_response
+    ids, error = _parse_ids(data)
+    if error is not None:
+        return jsonify(status=400, message=error), 400
+    try:
+        released = db_handler.release_perevals(ids, moderator, claim_ttl=_int_setting('FSTR_MODERATION_CLAIM_TTL'))
+        return jsonify(status=200, released=released), 200
+    except Exception as e:
+        return jsonify(status=500, message=f"Внутренняя ошибка {e}"), 500
+
+
+@api.route('/moderation/<any(accept, reject):action>', methods=['POST'])
+def moderate(action):
+    """
+    Принять или отклонить перевалы по списку ID одним запросом
+    ---
+    tags:
+      - Moderation
+    parameters:
+      - in: path
+        name: action
+        type: string
+        enum: [accept, reject]
+        required: true
+      - in: header
+        name: Authorization
+        type: string
+        required: true
+        description: Bearer и токен модератора из FSTR_MODERATOR_TOKENS
+      - in: body
+        name: body
+        schema:
+          type: object
+          required: [ids]
+          properties:
+            ids:
+              type: array
+              items:
+                type: integer
+    responses:
+      200:
+        description: >
+          ID изменённых (updated) и пропущенных (skipped) перевалов. Перевалы, забранные другим
+          модератором, пропускаются, пока не истёк срок их проверки (FSTR_MODERATION_CLAIM_TTL)
+      400:
+        description: Неверные параметры запроса
+      401:
+        description: Токен модератора не передан или неверен
+      500:
+        description: Внутренняя ошибка сервера
+    """
+    moderator, error_response = _authenticate_moderator()
+    if error_response is not None:
+        return error_response
+    data, error_response = _read_json_body()
+    if error_response is not None:
+        return error_response
+    ids, error = _parse_ids(data)
+    if error is not None:
+        return jsonify(status=400, message=error), 400
+    status = 'accepted' if action == 'accept' else 'rejected'
+    try:
+        updated = db_handler.set_pereval_status(ids, status, moderator,
+                                                claim_ttl=_int_setting('FSTR_MODERATION_CLAIM_TTL'))
+        # Пропущены перевалы, которых нет, которые уже проверены или забраны другим модератором
+        skipped = sorted(set(ids) - set(updated))
+        return jsonify(status=200, updated=updated, skipped=skipped), 200
     except Exception as e:
         return jsonify(status=500, message=f"Внутренняя ошибка {e}"), 500
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    logging.basicConfig(level=os.getenv('FSTR_LOG_LEVEL', 'INFO'))
+    create_app().run(debug=True)
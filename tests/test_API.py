@@ -36,6 +36,77 @@ def test_submit_data():
     assert response.status_code == 200
     assert "id" in response.json()
 
+def test_submit_data_invalid():
+    data = {"title": "Пхия", "coords": {"latitude": 91, "longitude": 30.0, "height": 1000}}
+    response = requests.post(f"{BASE_URL}/submitData", json=data)
+    assert response.status_code == 400
+    paths = {error["path"] for error in response.json()["errors"]}
+    # Возвращаются все ошибки, а не только первая
+    assert {"user", "level", "images", "coords.latitude"} <= paths
+
+def test_submit_data_batch():
+    record = {
+        "beauty_title": "пер. ",
+        "title": "Пхия",
+        "other_titles": "Триев",
+        "connect": "",
+        "add_time": "2021-09-22 13:18:13",
+        "user": {
+            "email": "batch1@example.com",
+            "fam": "Иванов",
+            "name": "Иван",
+            "otc": "Иванович",
+            "phone": "+7 123 456 78 92"
+        },
+        "coords": {"latitude": 45.0, "longitude": 30.0, "height": 1000},
+        "level": {"winter": "1A", "summer": "1A", "autumn": "1A", "spring": "1A"},
+        "images": []
+    }
+    # Вторая запись без обязательных полей не должна отменять первую
+    response = requests.post(f"{BASE_URL}/submitData/batch", json=[record, {"title": "Без полей"}])
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0]["status"] == 200
+    assert "id" in results[0]
+    assert results[1]["status"] == 400
+
+    body = "\n".join(json.dumps(item, ensure_ascii=False) for item in [record, record])
+    response = requests.post(f"{BASE_URL}/submitData/batch", data=body.encode('utf-8'),
+                             headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.json()["accepted"] == 2
+
+def test_upload_image():
+    image = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 100
+    response = requests.post(f"{BASE_URL}/submitData/5/images", params={"title": "Седловина"}, data=image,
+                             headers={"Content-Type": "application/octet-stream"})  # Замените на правильный ID
+    assert response.status_code == 201
+    assert response.json()["size"] == len(image)
+
+    response = requests.post(f"{BASE_URL}/submitData/5/images", files={"image": ("pass.png", image)})
+    assert response.status_code == 201
+
+
+def test_get_images():
+    response = requests.get(f"{BASE_URL}/submitData/5/images")  # Замените на правильный ID
+    assert response.status_code == 200
+    images = response.json()["data"]
+    assert images
+
+    url = f"{BASE_URL}{images[0]['url']}"
+    response = requests.get(url)
+    assert response.status_code == 200
+    assert len(response.content) == images[0]["size"]
+
+    # Повторный запрос с ETag не передаёт изображение заново
+    response = requests.get(url, headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+
+    response = requests.get(url, headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert len(response.content) == 10
+
+
 def test_get_submit_data():
     response = requests.get(f"{BASE_URL}/submitData/5")  # Замените на правильный ID
     assert response.status_code == 200
@@ -58,8 +129,60 @@ def test_patch_submit_data():
     response_json = json.loads(response.text)
     assert response_json["message"] == "Запись успешно обновлена"
 
-# def test_get_user_submissions():
-#     response = requests.get(f"{BASE_URL}/submitData", params={'user__email': 'test3@example.com'})
-#     assert response.status_code == 200
-#     assert "data" in response.json()
+def test_patch_submit_data_if_match():
+    etag = requests.get(f"{BASE_URL}/submitData/5").headers["ETag"]  # Замените на правильный ID
+    response = requests.patch(f"{BASE_URL}/submitData/5", json={"title": "название 1"}, headers={"If-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    # Второй редактор с тем же ETag не перезаписывает изменения первого
+    response = requests.patch(f"{BASE_URL}/submitData/5", json={"title": "название 2"}, headers={"If-Match": etag})
+    assert response.status_code == 412
+
+def test_get_user_submissions():
+    response = requests.get(f"{BASE_URL}/submitData", params={'user__email': 'test3@example.com'})
+    assert response.status_code == 200
+    assert "data" in response.json()
+
+
+def test_get_submissions_pages():
+    params = {'limit': 1, 'fields': 'id,title,status'}
+    first = requests.get(f"{BASE_URL}/submitData", params=params).json()
+    assert len(first["data"]) == 1
+    assert set(first["data"][0]) == {"id", "title", "status"}
+
+    # Следующая страница начинается после последней записи предыдущей
+    if first["next_cursor"]:
+        second = requests.get(f"{BASE_URL}/submitData", params={**params, 'cursor': first["next_cursor"]}).json()
+        assert second["data"][0]["id"] > first["data"][0]["id"]
+
+    response = requests.get(f"{BASE_URL}/submitData", params={'limit': 0})
+    assert response.status_code == 400
+
+
+def test_get_nearby_passes():
+    response = requests.get(f"{BASE_URL}/passes/nearby", params={'lat': 45.0, 'lon': 30.0, 'radius_km': 50})
+    assert response.status_code == 200
+    distances = [item["distance_km"] for item in response.json()["data"]]
+    assert distances == sorted(distances)
+    assert all(distance <= 50 for distance in distances)
+
+    response = requests.get(f"{BASE_URL}/passes/nearby", params={'lat': 95.0, 'lon': 30.0})
+    assert response.status_code == 400
+
+
+def test_search_passes():
+    # Латинская транслитерация с опечаткой находит перевал, добавленный кириллицей
+    response = requests.get(f"{BASE_URL}/passes/search", params={'q': 'Pkhia'})
+    assert response.status_code == 200
+    assert any(item["title"] == "Пхия" for item in response.json()["data"])
+
+    response = requests.get(f"{BASE_URL}/passes/search", params={'q': 'П'})
+    assert response.status_code == 400
 
+def test_moderation_requires_token():
+    # Имя модератора из тела запроса не принимается: модератор определяется только по токену
+    for headers in ({}, {"Authorization": "Bearer неизвестный"}, {"Authorization": "Basic aXZhbm92"}):
+        response = requests.post(f"{BASE_URL}/moderation/accept", json={"ids": [5], "moderator": "ivanov"},
+                                 headers=headers)
+        assert response.status_code == 401
@@ -0,0 +1,68 @@
+import requests
+
+BASE_URL = "http://localhost:8000"  # Адрес ASGI-приложения: uvicorn asgi_app:app --port 8000
+
+# Токен модератора: приложение запускается с FSTR_MODERATOR_TOKENS=asgi:asgi-test-token
+MODERATOR_HEADERS = {"Authorization": "Bearer asgi-test-token"}
+
+RECORD = {
+    "beauty_title": "пер. ",
+    "title": "Пхия",
+    "other_titles": "Триев",
+    "connect": "",
+    "add_time": "2021-09-22 13:18:13",
+    "user": {
+        "email": "asgi@example.com",
+        "fam": "Иванов",
+        "name": "Иван",
+        "otc": "Иванович",
+        "phone": "+7 123 456 78 92"
+    },
+    "coords": {
+        "latitude": 45.0,
+        "longitude": 30.0,
+        "height": 1000
+    },
+    "level": {
+        "winter": "1A",
+        "summer": "1A",
+        "autumn": "1A",
+        "spring": "1A"
+    },
+    "images": []
+}
+
+
+def test_submit_data_string_coords():
+    # Координаты строками принимаются так же, как в Flask-приложении
+    data = dict(RECORD, title="Пхия строки", coords={"latitude": "45.3842", "longitude": "7.1525", "height": "1200"})
+    response = requests.post(f"{BASE_URL}/submitData", json=data)
+    assert response.status_code == 200
+    assert requests.get(f"{BASE_URL}/submitData/{response.json()['id']}").status_code == 200
+
+
+def test_get_submit_data_if_none_match():
+    pereval_id = requests.post(f"{BASE_URL}/submitData", json=RECORD).json()["id"]
+    etag = requests.get(f"{BASE_URL}/submitData/{pereval_id}").headers["ETag"]
+
+    # Запись не изменилась: 304 без тела
+    response = requests.get(f"{BASE_URL}/submitData/{pereval_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert not response.content
+
+    # После изменения возвращается новая версия
+    requests.patch(f"{BASE_URL}/submitData/{pereval_id}", json={"title": "Пхия 2"})
+    response = requests.get(f"{BASE_URL}/submitData/{pereval_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_moderation_visible_in_get():
+    pereval_id = requests.post(f"{BASE_URL}/submitData", json=RECORD).json()["id"]
+    assert requests.get(f"{BASE_URL}/submitData/{pereval_id}").json()["data"]["status"] == "new"
+
+    # Модерация выполняется маршрутом Flask и сбрасывает общий кеш, из которого читает асинхронный GET
+    response = requests.post(f"{BASE_URL}/moderation/accept", json={"ids": [pereval_id]}, headers=MODERATOR_HEADERS)
+    assert response.json()["updated"] == [pereval_id]
+    assert requests.get(f"{BASE_URL}/submitData/{pereval_id}").json()["data"]["status"] == "accepted"
@@ -0,0 +1,58 @@
+import io
+
+from batch_loader import ingest, iter_ndjson
+
+
+class FakeHandler:
+    """
+    Замена DatabaseHandler: все записи добавляются успешно.
+    """
+
+    def __init__(self):
+        self.next_id = 1
+
+    def submit_pereval_batch(self, records):
+        results = []
+        for _ in records:
+            results.append({'state': 1, 'id': self.next_id})
+            self.next_id += 1
+        return results
+
+
+def test_iter_ndjson_line_limit():
+    stream = io.BytesIO(b'{"a": 1}\n' + b'{"b": "' + b'x' * 100 + b'"}\n\n{"c": 3}\n')
+    records = list(iter_ndjson(stream, max_line_size=20))
+    assert records[0] == {'a': 1}
+    assert isinstance(records[1], ValueError)
+    assert records[2] == {'c': 3}
+
+
+def test_ingest_stops_after_max_records():
+    read = []
+
+    def records():
+        for index in range(1000):
+            read.append(index)
+            yield ValueError("Некорректный JSON")
+
+    results = list(ingest(FakeHandler(), records(), max_records=3))
+    assert [result['status'] for result in results] == [400, 400, 400, 413]
+    assert results[-1]['index'] == 3
+    assert len(read) == 4  # остальные записи не прочитаны
+
+
+def test_ingest_flushes_by_size():
+    handler = FakeHandler()
+    batches = []
+    submit = handler.submit_pereval_batch
+    handler.submit_pereval_batch = lambda records: batches.append(len(records)) or submit(records)
+    record = {
+        "beauty_title": "пер. ", "title": "Пхия", "add_time": "2021-09-22 13:18:13",
+        "user": {"email": "batch@example.com", "fam": "Иванов", "name": "Иван", "otc": "", "phone": ""},
+        "coords": {"latitude": 45.0, "longitude": 30.0, "height": 1000},
+        "level": {"winter": "", "summer": "1А", "autumn": "1А", "spring": ""},
+        "images": [{"data": "aGVsbG8=" * 100, "title": "Седловина"}],
+    }
+    results = list(ingest(handler, [record] * 5, max_chunk_bytes=1600))
+    assert [result['status'] for result in results] == [200] * 5
+    assert batches == [2, 2, 1]  # группа добавляется, как только изображения занимают 1600 байт
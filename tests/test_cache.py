@@ -0,0 +1,75 @@
+from datetime import datetime
+
+from cache import LRUCache, RedisCache
+from records import PerevalRecord
+
+RECORD = PerevalRecord(1, "пер. ", "Пхия", "", "", datetime(2021, 9, 22, 13, 18, 13), 1, 2,
+                       "", "1А", "1А", "", "new", 3)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """
+    Локальная замена клиента Redis.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, px=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def test_lru_cache_ttl():
+    clock = FakeClock()
+    cache = LRUCache(maxsize=10, ttl=5, clock=clock)
+    cache.set("pereval:1", (1, "Пхия"))
+    assert cache.get("pereval:1") == (1, "Пхия")
+
+    clock.now = 6
+    assert cache.get("pereval:1") is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_lru_cache_eviction():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" становится давно не использованной записью
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()['evictions'] == 1
+
+
+def test_redis_cache():
+    cache = RedisCache(FakeRedis(), ttl=60)
+    assert cache.get("pereval:1") is None
+    cache.set("pereval:1", RECORD)
+    assert cache.get("pereval:1") == RECORD
+    cache.delete("pereval:1")
+    assert cache.get("pereval:1") is None
+    assert cache.stats() == {'backend': 'redis', 'hits': 1, 'misses': 2, 'errors': 0}
+
+
+def test_redis_cache_rejects_foreign_data():
+    client = FakeRedis()
+    cache = RedisCache(client, ttl=60)
+    # Запись в формате pickle (или подложенная в Redis) не разбирается и считается промахом
+    client.set("fstr:pereval:1", b"\x80\x04\x95cos\nsystem\n")
+    assert cache.get("pereval:1") is None
+    assert cache.stats()['errors'] == 1
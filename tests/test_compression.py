@@ -0,0 +1,113 @@
+import gzip
+
+import pytest
+
+import compression
+import json_utils
+
+
+@pytest.fixture
+def gzip_only(monkeypatch):
+    monkeypatch.setattr(compression, 'PREFERRED_ENCODINGS', ('gzip',))
+
+
+def test_choose_encoding(gzip_only):
+    assert compression.choose_encoding('gzip, deflate') == 'gzip'
+    assert compression.choose_encoding('*') == 'gzip'
+    assert compression.choose_encoding('gzip;q=0') is None
+    assert compression.choose_encoding('identity') is None
+    assert compression.choose_encoding('') is None
+    assert compression.choose_encoding(None) is None
+
+
+def test_choose_encoding_quality(monkeypatch):
+    monkeypatch.setattr(compression, 'available_encodings', lambda: ('br', 'gzip'))
+    assert compression.choose_encoding('gzip, br') == 'br'
+    assert compression.choose_encoding('gzip, br;q=0.5') == 'gzip'
+    assert compression.choose_encoding('br;q=0, *') == 'gzip'
+
+
+def test_is_compressible():
+    assert compression.is_compressible('application/json')
+    assert compression.is_compressible('text/html')
+    assert not compression.is_compressible('image/jpeg')
+    assert not compression.is_compressible(None)
+
+
+def test_compress_stream():
+    closed = []
+
+    def chunks():
+        try:
+            yield '{"items":['
+            yield b'1,2'
+            yield ']}'
+        finally:
+            closed.append(True)
+
+    data = b''.join(compression.compress_stream(chunks(), 'gzip'))
+    assert gzip.decompress(data) == b'{"items":[1,2]}'
+    assert closed
+    assert gzip.decompress(compression.compress(b'x' * 100, 'gzip')) == b'x' * 100
+
+
+def test_json_dumps():
+    assert json_utils.dumps({'title': 'Пхия', 'id': 1}) == '{"title":"Пхия","id":1}'.encode('utf-8')
+    assert json_utils.loads(b'{"id": 1}') == {'id': 1}
+    with pytest.raises(ValueError):
+        json_utils.loads(b'{bad')
+
+
+def test_etag_compressed_response(gzip_only):
+    from flask import Flask, jsonify, request
+
+    app = Flask(__name__)
+    app.config['FSTR_COMPRESSION_MIN_SIZE'] = 10
+    compression.init_app(app)
+
+    @app.route('/pereval', methods=['GET', 'PATCH'])
+    def pereval():
+        if request.method == 'PATCH':
+            return jsonify(versions=sorted(request.if_match.as_set()))
+        response = jsonify(title='Пхия' * 100)
+        response.set_etag('v3')
+        return response.make_conditional(request)
+
+    client = app.test_client()
+    response = client.get('/pereval', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'] == '"v3-gzip"'
+    # ETag сжатого ответа сравнивается с версией без суффикса кодировки
+    response = client.get('/pereval', headers={'Accept-Encoding': 'gzip', 'If-None-Match': '"v3-gzip"'})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == '"v3-gzip"'
+    assert client.get('/pereval', headers={'If-None-Match': '"v3"'}).headers['ETag'] == '"v3"'
+    assert client.patch('/pereval', headers={'If-Match': '"v3-gzip"'}).json == {'versions': ['v3']}
+
+
+def test_middleware_etag(gzip_only):
+    import asyncio
+
+    async def app(scope, receive, send):
+        if dict(scope['headers']).get(b'if-none-match') == b'"v3"':
+            await send({'type': 'http.response.start', 'status': 304, 'headers': [(b'etag', b'"v3"')]})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'etag', b'"v3"'), (b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': b'{"data":"' + b'x' * 2000 + b'"}'})
+
+    def request(headers):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(compression.CompressionMiddleware(app)({'type': 'http', 'method': 'GET', 'headers': headers},
+                                                           None, send))
+        return messages[0]['status'], dict(messages[0]['headers'])
+
+    status, headers = request([(b'accept-encoding', b'gzip')])
+    assert (status, headers[b'etag'], headers[b'content-encoding']) == (200, b'"v3-gzip"', b'gzip')
+    status, headers = request([(b'accept-encoding', b'gzip'), (b'if-none-match', b'"v3-gzip"')])
+    assert (status, headers[b'etag']) == (304, b'"v3-gzip"')
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from config import is_enabled, load_config, parse_moderator_tokens, read_env_file
+
+
+def test_load_config(tmp_path):
+    path = tmp_path / 'fstr.env'
+    path.write_text("# база данных\nFSTR_DB_HOST=db.local\nFSTR_DB_PASS=\"secret\"\n\nFSTR_CACHE_SIZE=0\n")
+    environ = {'FSTR_CONFIG': str(path), 'FSTR_DB_HOST': 'primary', 'HOME': '/root'}
+    config = load_config(environ=environ)
+    assert config['FSTR_DB_HOST'] == 'primary'  # переменная окружения важнее файла
+    assert config['FSTR_DB_PASS'] == 'secret'
+    assert config['FSTR_CACHE_SIZE'] == '0'
+    assert config['FSTR_DB_PORT'] == '5432'
+    assert 'HOME' not in config
+
+
+def test_load_config_keeps_environ(monkeypatch):
+    monkeypatch.delenv('FSTR_DB_HOST', raising=False)
+    load_config()
+    assert 'FSTR_DB_HOST' not in os.environ
+
+
+def test_read_env_file_error(tmp_path):
+    path = tmp_path / 'fstr.env'
+    path.write_text("FSTR_DB_HOST\n")
+    with pytest.raises(ValueError):
+        read_env_file(path)
+
+
+def test_is_enabled():
+    assert is_enabled('1') and is_enabled('True') and is_enabled(' yes ')
+    assert not is_enabled('0') and not is_enabled('') and not is_enabled(None)
+
+
+def test_create_app_settings():
+    from submitData import create_app
+
+    # Ограничения запросов берутся из настроек приложения, а не из окружения при импорте
+    app = create_app({'FSTR_SWAGGER': '0', 'FSTR_MAX_BODY_SIZE': '16'})
+    response = app.test_client().patch('/submitData/1', json={'title': "Пхия, северная седловина"})
+    assert response.status_code == 413
+    assert "16 байт" in response.get_json()['message']
+
+
+def test_parse_moderator_tokens():
+    assert parse_moderator_tokens("") == []
+    assert parse_moderator_tokens("ivanov:abc, petrova:x:y") == [(b'abc', 'ivanov'), (b'x:y', 'petrova')]
+    with pytest.raises(ValueError):
+        parse_moderator_tokens("ivanov")
+
+
+def test_moderation_requires_token():
+    from submitData import create_app
+
+    client = create_app({'FSTR_SWAGGER': '0', 'FSTR_MODERATOR_TOKENS': 'ivanov:secret'}).test_client()
+    for headers in ({}, {'Authorization': 'Bearer wrong'}, {'Authorization': 'secret'}):
+        response = client.post('/moderation/accept', json={'ids': [1], 'moderator': 'ivanov'}, headers=headers)
+        assert response.status_code == 401
+        assert response.headers['WWW-Authenticate'].startswith('Bearer')
+    assert client.get('/moderation/queue').status_code == 401
@@ -1,5 +1,9 @@
+import base64
+import io
+import uuid
+
 import pytest
-from Обучение.Rest_API.DatabaseHandler import DatabaseHandler
+from DatabaseHandler import DatabaseHandler
 
 
 @pytest.fixture
@@ -43,3 +47,205 @@ def test_add_pereval(db_handler):
     )
 
     assert pereval_id is not None
+
+
+def test_pool_stats(db_handler):
+    # Несколько вызовов подряд должны переиспользовать соединение из пула
+    db_handler.check_user_exists("hopi@example.com")
+    db_handler.check_user_exists("hopi@example.com")
+    stats = db_handler.pool_stats()
+    assert stats['in_use'] == 0
+    assert stats['checkouts'] >= 2
+    assert stats['size'] <= stats['maxconn']
+
+
+def test_submit_pereval(db_handler):
+    data = {
+        "beauty_title": "пер. ",
+        "title": "Пхия",
+        "other_titles": "Триев",
+        "connect": "",
+        "add_time": "2021-09-22 13:18:13",
+        "user": {"email": "hoda@example.com", "fam": "Сидоров", "name": "Сидор",
+                 "otc": "Сидорович", "phone": "+7 123 456 78 93"},
+        "coords": {"latitude": 45.0, "longitude": 30.0, "height": 1000},
+        "level": {"winter": "", "summer": "1А", "autumn": "1А", "spring": ""},
+        "images": [{"data": "aGVsbG8=", "title": "Седловина"}]
+    }
+    result = db_handler.submit_pereval(data)
+    assert result['state'] == 1
+    record = db_handler.get_pereval_by_id(result['id'])
+    assert record.title == "Пхия"
+    assert record.status == "new"
+
+    # Повтор тех же данных возвращает уже добавленный перевал
+    replayed = db_handler.submit_pereval(data)
+    assert replayed == {'state': 1, 'id': result['id'], 'queued': True, 'replayed': True}
+
+    # Новый отчёт существующего пользователя добавляется, данные пользователя обновляются
+    other = db_handler.submit_pereval(dict(data, title="Пхия 2", user=dict(data['user'], phone="+7 000")))
+    assert other['state'] == 1
+    assert other['id'] != result['id']
+
+
+def test_submit_pereval_images_stored_by_job(db_handler):
+    data = {
+        "beauty_title": "пер. ",
+        "title": "Пхия",
+        "add_time": "2021-09-22 13:18:13",
+        "user": {"email": "hoja@example.com", "fam": "Сидоров", "name": "Сидор", "otc": "", "phone": ""},
+        "coords": {"latitude": 45.0, "longitude": 30.0, "height": 1000},
+        "level": {"winter": "", "summer": "1А", "autumn": "1А", "spring": ""},
+        "images": [{"data": "data:text/plain;base64," + base64.b64encode(uuid.uuid4().bytes).decode(),
+                    "title": "Седловина"}]
+    }
+    result = db_handler.submit_pereval(data)
+    assert result['queued']
+    # До выполнения задачи process_images изображения не выдаются
+    assert db_handler.get_images_by_pereval_id(result['id']) == []
+    assert db_handler.store_uploaded_images(result['id']) == 1
+    assert [image.title for image in db_handler.get_images_by_pereval_id(result['id'])] == ["Седловина"]
+    assert db_handler.store_uploaded_images(result['id']) == 0
+
+    # Некорректный base64 отклоняется при отправке
+    invalid = db_handler.submit_pereval(dict(data, title="Пхия 3", images=[{"data": "не base64", "title": ""}]))
+    assert invalid['status'] == 400
+
+
+def test_submit_pereval_idempotency_key(db_handler):
+    data = {
+        "beauty_title": "пер. ",
+        "title": "Пхия",
+        "add_time": "2021-09-22 13:18:13",
+        "user": {"email": "hoka@example.com", "fam": "Сидоров", "name": "Сидор", "otc": "", "phone": ""},
+        "coords": {"latitude": 45.0, "longitude": 30.0, "height": 1000},
+        "level": {"winter": "", "summer": "1А", "autumn": "1А", "spring": ""},
+        "images": []
+    }
+    key = str(uuid.uuid4())
+    result = db_handler.submit_pereval(data, idempotency_key=key)
+    assert result['state'] == 1
+    assert not result['replayed']
+    assert db_handler.submit_pereval(data, idempotency_key=key)['id'] == result['id']
+
+    # Тот же ключ с другими данными отклоняется
+    result = db_handler.submit_pereval(dict(data, title="Другой"), idempotency_key=key)
+    assert result['state'] == 0
+    assert result['status'] == 422
+
+
+def test_add_image_deduplicated(db_handler):
+    user_id = db_handler.add_user("hoxa@example.com", "Петр", "Петров", "Петрович", "+7 123 456 78 94")
+    coord_id = db_handler.add_coord(45.0, 30.0, 1000)
+    pereval_id = db_handler.add_pereval("пер. ", "Пхия", "", "", "2021-09-22 13:18:13", user_id, coord_id,
+                                        "", "1А", "1А", "", "new")
+
+    # Одно и то же изображение дважды: вторая загрузка не записывает байты повторно
+    first = db_handler.add_image_stream(pereval_id, "Вид 1", io.BytesIO(b"same image bytes"))
+    second = db_handler.add_image_stream(pereval_id, "Вид 2", io.BytesIO(b"same image bytes"))
+    assert first['state'] == 1 and second['state'] == 1
+    assert first['sha256'] == second['sha256']
+    assert second['deduplicated']
+    assert db_handler.add_image(base64.b64encode(b"same image bytes").decode(), "Вид 3", pereval_id) is not None
+
+
+def test_prepared_statements(db_handler):
+    with db_handler._cursor() as cursor:
+        # Запрос готовится на соединении один раз и дальше только выполняется
+        db_handler.GET_PEREVAL.execute(cursor, (1,))
+        db_handler.GET_PEREVAL.execute(cursor, (1,))
+        assert db_handler.GET_PEREVAL.name in cursor.connection.prepared
+        cursor.execute("SELECT count(*) FROM pg_prepared_statements WHERE name = %s;", (db_handler.GET_PEREVAL.name,))
+        assert cursor.fetchone()[0] == 1
+
+
+def test_search_threshold_not_kept_on_connection():
+    # Одно соединение: следующий запрос получает то же соединение, что и поиск
+    handler = DatabaseHandler(minconn=1, maxconn=1, replica_dsns=[])
+    try:
+        assert handler.search_passes("Pkhiya") is not None
+        with handler._cursor() as cursor:
+            cursor.execute("SHOW pg_trgm.word_similarity_threshold;")
+            assert float(cursor.fetchone()[0]) == 0.6
+    finally:
+        handler.close()
+
+
+def test_update_pereval_partial(db_handler):
+    user_id = db_handler.add_user("hoza@example.com", "Петр", "Петров", "Петрович", "+7 123 456 78 95")
+    coord_id = db_handler.add_coord(45.0, 30.0, 1000)
+    pereval_id = db_handler.add_pereval("пер. ", "Пхия", "", "", "2021-09-22 13:18:13", user_id, coord_id,
+                                        "", "1А", "1А", "", "new")
+    version = db_handler.get_pereval_by_id(pereval_id).version
+
+    result = db_handler.update_pereval(pereval_id, {"title": "Новое название"}, expected_versions=[version])
+    assert result['state'] == 1
+    record = db_handler.get_pereval_by_id(pereval_id)
+    assert record.title == "Новое название"
+    # Непереданные поля не изменяются
+    assert record.add_time is not None
+    assert record.level_summer == "1А"
+    assert record.version == result['version'] == version + 1
+
+    # Обновление по устаревшей версии отклоняется
+    result = db_handler.update_pereval(pereval_id, {"title": "Другое название"}, expected_versions=[version])
+    assert result['status'] == 412
+    assert db_handler.get_pereval_by_id(pereval_id).title == "Новое название"
+
+
+def test_moderation(db_handler):
+    user_id = db_handler.add_user("homo@example.com", "Петр", "Петров", "Петрович", "+7 123 456 78 96")
+    coord_id = db_handler.add_coord(45.0, 30.0, 1000)
+    pereval_id = db_handler.add_pereval("пер. ", "Пхия", "", "", "2021-09-22 13:18:13", user_id, coord_id,
+                                        "", "1А", "1А", "", "new")
+
+    # Два модератора не получают один и тот же перевал
+    first = {record.id for record in db_handler.claim_perevals("first", limit=1000)}
+    second = {record.id for record in db_handler.claim_perevals("second", limit=1000)}
+    assert pereval_id in first
+    assert not first & second
+
+    # Перевал, забранный первым модератором, второй изменить не может
+    assert db_handler.set_pereval_status([pereval_id], 'accepted', moderator="second") == []
+    assert db_handler.set_pereval_status([pereval_id], 'accepted', moderator="first") == [pereval_id]
+    assert db_handler.get_pereval_by_id(pereval_id).status == 'accepted'
+
+    # Вернуть в очередь чужие перевалы можно только после истечения срока проверки
+    others = sorted(first - {pereval_id})
+    if others:
+        assert db_handler.release_perevals(others, "second") == []
+        assert db_handler.release_perevals(others, "second", claim_ttl=0) == others
+    db_handler.release_perevals(list(second), "second")
+
+
+def test_jobs(db_handler):
+    job_id = db_handler.enqueue_job('test', {'value': 1}, max_attempts=2)
+
+    # Задачу получает только один обработчик
+    first = {job[0]: job for job in db_handler.claim_jobs("first", limit=1000)}
+    second = {job[0] for job in db_handler.claim_jobs("second", limit=1000)}
+    assert job_id in first
+    assert job_id not in second
+    assert first[job_id][1:4] == ('test', {'value': 1}, 1)
+
+    # Первая неудачная попытка возвращает задачу в очередь, вторая - завершает
+    assert db_handler.fail_job(job_id, "ошибка", 0)
+    assert job_id in {job[0] for job in db_handler.claim_jobs("first", limit=1000)}
+    assert not db_handler.fail_job(job_id, "ошибка", 0)
+    assert job_id not in {job[0] for job in db_handler.claim_jobs("first", limit=1000)}
+
+    job_id = db_handler.enqueue_job('test', {})
+    assert job_id in {job[0] for job in db_handler.claim_jobs("first", limit=1000)}
+    db_handler.complete_job(job_id)
+    assert job_id not in {job[0] for job in db_handler.claim_jobs("first", limit=1000)}
+
+
+def test_iter_submissions_pages(db_handler):
+    rows = list(db_handler.iter_submissions(limit=5))
+    assert list(db_handler.iter_submissions(limit=5, page_size=2)) == rows
+    assert list(db_handler.iter_submissions(limit=5, page_size=2, columns=['title'])) == [row[2:3] for row in rows]
+    # Между страницами соединение возвращено в пул
+    pages = db_handler.iter_submissions(limit=5, page_size=1)
+    next(pages)
+    assert db_handler.pool_stats()['in_use'] == 0
+    pages.close()
@@ -0,0 +1,103 @@
+import base64
+import io
+
+import pytest
+
+import image_utils
+from image_utils import (NormalizationError, decode_image, make_thumbnail, normalize_image, normalize_images,
+                         prepare_images, sniff_mime)
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def make_jpeg(width, height, orientation=None):
+    """
+    JPEG с шумом (плохо сжимается, как фотография) и, если задано, тегом EXIF Orientation.
+    """
+    image = Image.effect_noise((width, height), 64).convert('RGB')
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=95, exif=exif.tobytes())
+    return output.getvalue()
+
+
+def test_normalize_image():
+    original = make_jpeg(800, 400, orientation=6)  # 6 - повернуть на 90 градусов
+    image_bytes, result = normalize_image(original, image_format='webp', quality=75, max_side=200)
+    assert result == 'normalized'
+    assert len(image_bytes) < len(original)
+    assert sniff_mime(image_bytes[:16]) == 'image/webp'
+    image = Image.open(io.BytesIO(image_bytes))
+    assert image.size == (100, 200)
+    assert not image.getexif()
+
+
+def test_normalize_image_progressive_jpeg():
+    image_bytes, result = normalize_image(make_jpeg(300, 300, orientation=1), image_format='jpeg', max_side=100)
+    assert result == 'normalized'
+    image = Image.open(io.BytesIO(image_bytes))
+    assert image.info.get('progressive')
+    assert not image.getexif()
+
+
+def test_normalize_image_keeps_unreadable():
+    data = b"\x89PNG\r\n\x1a\n" + bytes(range(256))
+    assert normalize_image(data) == (data, 'skipped')
+
+
+def test_prepare_images_normalized(monkeypatch):
+    monkeypatch.setattr(image_utils, 'NORMALIZE_WORKERS', 0)
+    data = base64.b64encode(make_jpeg(256, 256)).decode()
+    refs, blobs = prepare_images([{'data': data, 'title': "Вид 1"}, {'data': data, 'title': "Вид 2"}])
+    assert len(blobs) == 1  # одинаковые исходные изображения хранятся один раз
+    assert refs[0][1] == refs[1][1]
+    assert sniff_mime(blobs[refs[0][1]][:16]) == 'image/webp'
+
+
+def test_normalize_images_process_pool(monkeypatch):
+    monkeypatch.setattr(image_utils, 'NORMALIZE_WORKERS', 2)
+    images = [make_jpeg(3000, 2000), b"not an image"]
+    normalized = normalize_images(images)
+    assert len(normalized[0]) < len(images[0])
+    assert normalized[1] == b"not an image"
+
+
+def test_normalize_images_from_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(image_utils, 'NORMALIZE_WORKERS', 0)
+    photo = tmp_path / "photo.jpg"
+    photo.write_bytes(make_jpeg(800, 400))
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not an image")
+    normalized = normalize_images([str(photo), str(broken)])
+    assert sniff_mime(normalized[0][:16]) == 'image/webp'
+    # Файл, который сохраняется без изменений, возвращается по имени и не читается в память
+    assert normalized[1] == str(broken)
+
+
+def test_decode_image_max_size():
+    data = base64.b64encode(b"x" * 100).decode()
+    assert decode_image(data, max_size=100) == b"x" * 100
+    with pytest.raises(ValueError):
+        decode_image(data, max_size=99)
+    with pytest.raises(ValueError):
+        decode_image(b"x" * 100, max_size=99)
+
+
+def test_make_thumbnail_applies_orientation():
+    thumbnail, mime = make_thumbnail(make_jpeg(400, 200, orientation=6), 100)
+    assert mime == 'image/jpeg'
+    assert Image.open(io.BytesIO(thumbnail)).size == (50, 100)
+
+
+def test_normalize_images_failure_rejects(monkeypatch):
+    monkeypatch.setattr(image_utils, 'NORMALIZE_WORKERS', 0)
+
+    def fail(image_bytes):
+        raise MemoryError()
+
+    monkeypatch.setattr(image_utils, 'normalize_image', fail)
+    # Исходное изображение с EXIF не сохраняется вместо нормализованного
+    with pytest.raises(NormalizationError):
+        normalize_images([make_jpeg(64, 64, orientation=6)])
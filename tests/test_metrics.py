@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def trace(monkeypatch):
+    monkeypatch.setattr(metrics, 'TRACE_ENABLED', True)
+    token = metrics.start_trace()
+    yield
+    metrics.finish_trace(token)
+
+
+def test_server_timing():
+    assert metrics.server_timing([('validate', 0.0012), ('db.submit_pereval', 0.0105)], total=0.015) == \
+        "validate;dur=1.2, db.submit_pereval;dur=10.5, total;dur=15.0"
+
+
+def test_trace_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, 'TRACE_ENABLED', False)
+    token = metrics.start_trace()
+    metrics.add_span('validate', 0.001)
+    assert metrics.finish_trace(token) is None
+
+
+def test_timed_records_spans(trace):
+    @metrics.timed
+    def get_pereval_by_id(pereval_id):
+        with metrics.span('inner'):
+            return pereval_id
+
+    @metrics.timed
+    async def update_pereval():
+        return 'ok'
+
+    assert get_pereval_by_id(5) == 5
+    assert asyncio.run(update_pereval()) == 'ok'
+    assert [name for name, _ in metrics.current_spans()] == ['inner', 'db.get_pereval_by_id', 'db.update_pereval']
+
+
+def test_timed_reraises(trace):
+    @metrics.timed
+    def claim_jobs():
+        raise RuntimeError("нет соединения")
+
+    with pytest.raises(RuntimeError):
+        claim_jobs()
+    assert [name for name, _ in metrics.current_spans()] == ['db.claim_jobs']
@@ -0,0 +1,37 @@
+import pytest
+
+import migrate
+
+
+def test_load_migrations():
+    migrations = migrate.load_migrations()
+    assert [migration.version for migration in migrations] == list(range(1, len(migrations) + 1))
+    assert all(len(migration.checksum) == 64 for migration in migrations)
+    indexes = next(migration for migration in migrations if migration.name == 'query_indexes')
+    assert not indexes.transactional
+    assert all('CONCURRENTLY' in statement for statement in migrate.split_statements(indexes.sql))
+
+
+def test_load_migrations_errors(tmp_path):
+    (tmp_path / '0001_initial.sql').write_text("SELECT 1;")
+    (tmp_path / '0001_again.sql').write_text("SELECT 2;")
+    with pytest.raises(migrate.MigrationError):
+        migrate.load_migrations(tmp_path)
+    (tmp_path / '0001_again.sql').unlink()
+    (tmp_path / 'initial.sql').write_text("SELECT 3;")
+    with pytest.raises(migrate.MigrationError):
+        migrate.load_migrations(tmp_path)
+
+
+def test_checksum_ignores_line_endings(tmp_path):
+    (tmp_path / '0001_initial.sql').write_bytes(b"SELECT 1;\r\nSELECT 2;\r\n")
+    crlf = migrate.load_migrations(tmp_path)[0].checksum
+    (tmp_path / '0001_initial.sql').write_bytes(b"SELECT 1;\nSELECT 2;\n")
+    assert migrate.load_migrations(tmp_path)[0].checksum == crlf
+
+
+def test_split_statements():
+    text = "-- migrate: no-transaction\n-- комментарий\n\nDROP INDEX a;\nCREATE INDEX a\n    ON t (x);\n"
+    assert migrate.split_statements(text) == ["DROP INDEX a;", "CREATE INDEX a\n    ON t (x);"]
+    with pytest.raises(migrate.MigrationError):
+        migrate.split_statements("SELECT 1")
@@ -0,0 +1,118 @@
+import pytest
+
+from rate_limit import ConcurrencyLimiter, MemoryRateLimiter, RedisRateLimiter, concurrency_limit
+from submitData import create_app
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """
+    Локальная замена клиента Redis: выполняет скрипт маркерной корзины без Lua.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+
+    def eval(self, script, numkeys, key, rate, burst, cost):
+        tokens, updated = self.data.get(key, (burst, self.clock()))
+        tokens = min(burst, tokens + (self.clock() - updated) * rate)
+        wait = 0
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate
+        self.data[key] = (tokens, self.clock())
+        return [int(allowed), str(wait)]
+
+
+class BrokenRedis:
+    def eval(self, *args):
+        raise ConnectionError("Redis недоступен")
+
+
+def test_memory_rate_limiter():
+    clock = FakeClock()
+    limiter = MemoryRateLimiter(rate=0.5, burst=2, clock=clock)
+    assert limiter.acquire("ip:1")[0]
+    assert limiter.acquire("ip:1")[0]
+    assert limiter.acquire("ip:1") == (False, 2.0)
+    assert limiter.acquire("ip:2")[0]  # у другого клиента своя корзина
+
+    clock.now = 2
+    assert limiter.acquire("ip:1")[0]
+    assert not limiter.acquire("ip:1")[0]
+    assert limiter.stats() == {'backend': 'memory', 'allowed': 4, 'rejected': 2, 'keys': 2}
+
+
+def test_memory_rate_limiter_eviction():
+    limiter = MemoryRateLimiter(rate=1, burst=1, maxsize=2, clock=FakeClock())
+    for key in ("a", "b", "c"):
+        limiter.acquire(key)
+    assert limiter.stats()['keys'] == 2
+    assert limiter.acquire("a")[0]  # давно не использованный ключ удалён, его корзина снова полная
+    assert not limiter.acquire("c")[0]
+
+
+def test_redis_rate_limiter():
+    clock = FakeClock()
+    limiter = RedisRateLimiter(FakeRedis(clock), rate=1, burst=1)
+    assert limiter.acquire("ip:1") == (True, 0.0)
+    assert limiter.acquire("ip:1") == (False, 1.0)
+    clock.now = 1
+    assert limiter.acquire("ip:1")[0]
+
+    broken = RedisRateLimiter(BrokenRedis(), rate=1, burst=1)
+    assert broken.acquire("ip:1")[0]
+    assert broken.stats() == {'backend': 'redis', 'allowed': 0, 'rejected': 0, 'errors': 1}
+
+
+def test_concurrency_limiter():
+    limiter = ConcurrencyLimiter(2)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    limiter.release()
+    assert limiter.try_acquire()
+    assert limiter.stats() == {'limit': 2, 'in_flight': 2, 'rejected': 1}
+    assert ConcurrencyLimiter(0).try_acquire()
+
+
+def test_concurrency_limit():
+    assert concurrency_limit({'FSTR_DB_POOL_MAX': '10'}) == 20
+    assert concurrency_limit({'FSTR_DB_POOL_MAX': '10', 'FSTR_MAX_CONCURRENCY': '5'}) == 5
+
+
+@pytest.fixture
+def client_app():
+    app = create_app({'FSTR_SWAGGER': '0', 'FSTR_RATE_LIMIT': '1', 'FSTR_RATE_BURST': '1',
+                      'FSTR_MAX_CONCURRENCY': '1'})
+    return app.test_client(), app
+
+
+def test_write_rate_limit(client_app):
+    client, app = client_app
+    # Тело не JSON: запрос отклоняется до обращения к базе данных
+    response = client.patch('/submitData/1', data=b'{')
+    assert response.status_code == 400
+    response.close()  # место освобождается после отправки ответа
+    response = client.patch('/submitData/1', data=b'{')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+    assert app.extensions['fstr']['concurrency'].stats()['in_flight'] == 0
+
+
+def test_overload(client_app):
+    client, app = client_app
+    app.extensions['fstr']['concurrency'].try_acquire()
+    response = client.patch('/submitData/1', data=b'{')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert client.get('/metrics').status_code in (200, 501)  # /metrics не ограничивается
@@ -0,0 +1,108 @@
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import pytest
+
+import DatabaseHandler as database_handler
+from cache import LRUCache
+from DatabaseHandler import PoolTimeout, ReplicaSet
+from records import PerevalRecord
+
+
+class FakePool:
+    def __init__(self, name, error=None):
+        self.name = name
+        self.error = error
+
+    def getconn(self):
+        if self.error is not None:
+            raise self.error
+        return self.name
+
+    def stats(self):
+        return {'in_use': 0}
+
+
+def test_round_robin():
+    replicas = ReplicaSet([FakePool('a'), FakePool('b')])
+    assert [replicas.getconn()[1] for _ in range(4)] == ['a', 'b', 'a', 'b']
+
+
+def test_failover():
+    down = FakePool('a', psycopg2.OperationalError("connection refused"))
+    replicas = ReplicaSet([down, FakePool('b', PoolTimeout())], retry_interval=60)
+    assert replicas.getconn() == (None, None)
+    stats = replicas.stats()
+    assert stats['available'] == 1  # занятая реплика не исключается
+    assert stats['failovers'] == 1
+
+    down.error = None
+    # Реплика исключена на retry_interval секунд, даже если уже доступна
+    assert replicas.getconn() == (None, None)
+
+
+def test_reads_from_primary():
+    token = database_handler.set_last_write_time(time.time())
+    try:
+        assert database_handler.reads_from_primary(5)
+    finally:
+        database_handler.reset_last_write_time(token)
+    assert not database_handler.reads_from_primary(5)
+
+
+@pytest.mark.parametrize('value', [0.0, time.time() - 10])
+def test_old_write_reads_from_replica(value):
+    token = database_handler.set_last_write_time(value)
+    try:
+        assert not database_handler.reads_from_primary(5)
+    finally:
+        database_handler.reset_last_write_time(token)
+
+
+class FakeCursor:
+    def __init__(self, row, replica):
+        self.row = row
+        self.connection = type('Connection', (), {'replica': replica})()
+
+    def fetchone(self):
+        return self.row
+
+
+def make_handler(row, replica):
+    handler = database_handler.DatabaseHandler.__new__(database_handler.DatabaseHandler)
+    handler.cache = LRUCache()
+    handler.read_your_writes_window = 5
+
+    @contextmanager
+    def cursor(read_only=False):
+        yield FakeCursor(row, replica)
+
+    handler._cursor = cursor
+    handler.GET_PEREVAL = type('Statement', (), {'execute': staticmethod(lambda cursor, params: None)})()
+    return handler
+
+
+ROW = (1, "пер. ", "Пхия", "", "", None, 1, 2, "", "1А", "1А", "", "new", 3)
+
+
+def test_replica_row_not_cached():
+    handler = make_handler(ROW, replica=True)
+    assert handler.get_pereval_by_id(1).version == 3
+    assert handler.cache.get("pereval:1") is None
+
+
+def test_primary_row_cached_outside_write_window():
+    handler = make_handler(ROW, replica=False)
+    handler.get_pereval_by_id(1)
+    assert handler.cache.get("pereval:1").version == 3
+
+    # После записи сессия не читает и не заполняет общий кеш
+    handler.cache.clear()
+    token = database_handler.set_last_write_time(time.time())
+    try:
+        handler.cache.set("pereval:1", PerevalRecord._make(ROW[:-1] + (2,)))
+        assert handler.get_pereval_by_id(1).version == 3
+    finally:
+        database_handler.reset_last_write_time(token)
+    assert handler.cache.get("pereval:1").version == 2
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+import pytest
+
+from records import PerevalRecord
+from serializers import decode_cursor, encode_cursor, idempotency_key, pereval_serializer
+
+RECORD = PerevalRecord(5, "пер. ", "Пхия", "Триев", "", datetime(2021, 9, 22, 13, 18, 13), 1, 2,
+                       "", "1А", "1А", "", "new", 1)
+
+
+def test_pereval_serializer_all_fields():
+    data = pereval_serializer()(RECORD)
+    assert data['title'] == "Пхия"
+    assert data['add_time'] == "Wed, 22 Sep 2021 13:18:13 GMT"
+    assert data['level'] == {"winter": "", "summer": "1А", "autumn": "1А", "spring": ""}
+    assert set(data) == {'id', 'beauty_title', 'title', 'other_titles', 'connect', 'add_time', 'user_id',
+                         'coord_id', 'level', 'status'}
+
+
+def test_pereval_serializer_columns_subset():
+    serialize = pereval_serializer(('id', 'status', 'title'), ('title', 'status'))
+    assert serialize((5, "new", "Пхия")) == {'title': "Пхия", 'status': "new"}
+    # Функция создаётся один раз для каждой пары столбцов и полей
+    assert pereval_serializer(('id', 'status', 'title'), ('title', 'status')) is serialize
+
+
+def test_cursor_roundtrip():
+    assert decode_cursor(encode_cursor(12345)) == 12345
+
+
+def test_idempotency_key():
+    assert idempotency_key(None) is None
+    assert idempotency_key(" 5f0c2b1e ") == "5f0c2b1e"
+    for value in ("", "x" * 256, "a\nb", "sha256:abc"):
+        with pytest.raises(ValueError):
+            idempotency_key(value)
@@ -0,0 +1,63 @@
+import copy
+
+from validation import MAX_IMAGES, format_errors, validate_pereval, validate_pereval_patch
+
+PEREVAL = {
+    "beauty_title": "пер. ",
+    "title": "Пхия",
+    "other_titles": "Триев",
+    "connect": "",
+    "add_time": "2021-09-22 13:18:13",
+    "user": {"email": "qwerty@mail.ru", "fam": "Пупкин", "name": "Василий", "otc": "Иванович",
+             "phone": "+7 555 55 55"},
+    "coords": {"latitude": "45.3842", "longitude": 7.1525, "height": 1200},
+    "level": {"winter": "", "summer": "1А", "autumn": "1А", "spring": ""},
+    "images": [{"data": "aGVsbG8=", "title": "Седловина"}]
+}
+
+
+def test_validate_pereval_valid():
+    assert validate_pereval(PEREVAL) == []
+
+
+def test_validate_pereval_number_strings():
+    data = copy.deepcopy(PEREVAL)
+    data['coords']['height'] = "-12"
+    assert validate_pereval(data) == []
+    # Числа в виде строк заменяются числами
+    assert data['coords'] == {"latitude": 45.3842, "longitude": 7.1525, "height": -12}
+
+    for latitude in ("1_0", "٤٥", "nan", "inf", " 45", "45.", "1e1", "+45", "0x10"):
+        data = copy.deepcopy(PEREVAL)
+        data['coords']['latitude'] = latitude
+        assert [error['path'] for error in validate_pereval(data)] == ['coords.latitude'], latitude
+        assert data['coords']['latitude'] == latitude
+    data = copy.deepcopy(PEREVAL)
+    data['coords']['height'] = "12.0"
+    assert [error['path'] for error in validate_pereval(data)] == ['coords.height']
+
+
+def test_validate_pereval_all_errors():
+    data = copy.deepcopy(PEREVAL)
+    del data['title']
+    data['user']['email'] = "без почты"
+    data['coords']['latitude'] = 91
+    data['coords']['height'] = "высоко"
+    data['images'][0]['data'] = None
+    errors = validate_pereval(data)
+    assert {error['path'] for error in errors} == {
+        'title', 'user.email', 'coords.latitude', 'coords.height', 'images[0].data'}
+    assert "coords.latitude: Значение не больше 90" in format_errors(errors)
+
+
+def test_validate_pereval_too_many_images():
+    data = copy.deepcopy(PEREVAL)
+    data['images'] = [None] * (MAX_IMAGES + 1)
+    # Элементы слишком длинного списка не проверяются
+    assert validate_pereval(data) == [{'path': 'images', 'message': f"Не больше {MAX_IMAGES} элементов"}]
+
+
+def test_validate_pereval_patch():
+    assert validate_pereval_patch({"title": "новое название", "level": {"summer": "1Б"}}) == []
+    assert [error['path'] for error in validate_pereval_patch({"add_time": "вчера"})] == ['add_time']
+    assert validate_pereval_patch([]) == [{'path': '', 'message': "Ожидается объект"}]
@@ -0,0 +1,24 @@
+# Транслитерация кириллицы в латиницу для поиска по названиям перевалов.
+# Должна совпадать с функцией translit_ru в migrations/0002_current_layout.sql: по ней строится индекс поиска.
+
+# Буквы, заменяемые несколькими латинскими буквами
+_MULTI = (
+    ('щ', 'shch'), ('ж', 'zh'), ('х', 'kh'), ('ц', 'ts'), ('ч', 'ch'),
+    ('ш', 'sh'), ('ю', 'yu'), ('я', 'ya'), ('ъ', ''), ('ь', ''),
+)
+
+# Буквы, заменяемые одной латинской буквой
+_SINGLE = str.maketrans('абвгдеёзийклмнопрстуфыэ', 'abvgdeeziiklmnoprstufye')
+
+
+def translit_ru(value):
+    """
+    Переводит строку в нижний регистр и заменяет кириллицу латиницей.
+
+    :param value: Исходная строка.
+    :return: Строка латиницей.
+    """
+    value = value.lower()
+    for cyrillic, latin in _MULTI:
+        value = value.replace(cyrillic, latin)
+    return value.translate(_SINGLE)
@@ -0,0 +1,277 @@
+import math
+import os
+import re
+from datetime import datetime
+
+# Максимальное количество изображений в одном отчёте
+MAX_IMAGES = int(os.getenv('FSTR_MAX_IMAGES', '10'))
+
+# Максимальная длина строки base64 одного изображения (около 20 МБ после декодирования)
+MAX_IMAGE_DATA_LENGTH = int(os.getenv('FSTR_MAX_IMAGE_DATA_LENGTH', str(28 * 1024 * 1024)))
+
+# Числа в виде строк: только ASCII-цифры, необязательный минус и дробная часть после точки
+# (без пробелов, подчёркиваний, экспоненты, "nan" и "inf", которые принимают int() и float())
+_INTEGER_STRING = re.compile(r'-?[0-9]+')
+_NUMBER_STRING = re.compile(r'-?[0-9]+(?:\.[0-9]+)?')
+
+# Уровень сложности перевала
+_LEVEL = {'type': 'string', 'maxLength': 10, 'nullable': True}
+
+# Описание данных перевала в запросе POST /submitData.
+# Поддерживаются ключи type, required, properties, items, nullable, minLength, maxLength,
+# maxItems, minimum, maximum, pattern и format ('date-time').
+PEREVAL_SCHEMA = {
+    'type': 'object',
+    'required': ['beauty_title', 'title', 'add_time', 'user', 'coords', 'level', 'images'],
+    'properties': {
+        'beauty_title': {'type': 'string', 'maxLength': 255, 'nullable': True},
+        'title': {'type': 'string', 'maxLength': 255},
+        'other_titles': {'type': 'string', 'maxLength': 255, 'nullable': True},
+        'connect': {'type': 'string', 'maxLength': 1000, 'nullable': True},
+        'add_time': {'type': 'string', 'format': 'date-time'},
+        'user': {
+            'type': 'object',
+            'required': ['email', 'fam', 'name', 'otc', 'phone'],
+            'properties': {
+                'email': {'type': 'string', 'maxLength': 255, 'pattern': r'[^@\s]+@[^@\s]+'},
+                'fam': {'type': 'string', 'maxLength': 255},
+                'name': {'type': 'string', 'maxLength': 255},
+                'otc': {'type': 'string', 'maxLength': 255, 'nullable': True},
+                'phone': {'type': 'string', 'maxLength': 50, 'nullable': True},
+            },
+        },
+        'coords': {
+            'type': 'object',
+            'required': ['latitude', 'longitude', 'height'],
+            'properties': {
+                'latitude': {'type': 'number', 'minimum': -90, 'maximum': 90},
+                'longitude': {'type': 'number', 'minimum': -180, 'maximum': 180},
+                'height': {'type': 'integer', 'minimum': -500, 'maximum': 9000},
+            },
+        },
+        'level': {
+            'type': 'object',
+            'required': ['winter', 'summer', 'autumn', 'spring'],
+            'properties': {'winter': _LEVEL, 'summer': _LEVEL, 'autumn': _LEVEL, 'spring': _LEVEL},
+        },
+        'images': {
+            'type': 'array',
+            'maxItems': MAX_IMAGES,
+            'items': {
+                'type': 'object',
+                'required': ['data'],
+                'properties': {
+                    'data': {'type': 'string', 'maxLength': MAX_IMAGE_DATA_LENGTH},
+                    'title': {'type': 'string', 'maxLength': 255, 'nullable': True},
+                },
+            },
+        },
+    },
+}
+
+# Описание данных в запросе PATCH /submitData/<id>: все поля необязательны,
+# данные пользователя, координаты и изображения не изменяются
+PEREVAL_PATCH_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        name: PEREVAL_SCHEMA['properties'][name]
+        for name in ('beauty_title', 'title', 'other_titles', 'connect', 'add_time')
+    },
+}
+PEREVAL_PATCH_SCHEMA['properties']['level'] = {
+    'type': 'object',
+    'properties': PEREVAL_SCHEMA['properties']['level']['properties'],
+}
+
+
+def _join(path, name):
+    return f"{path}.{name}" if path else name
+
+
+def _compile_object(schema):
+    required = tuple(schema.get('required', ()))
+    properties = tuple((name, _compile(subschema)) for name, subschema in schema.get('properties', {}).items())
+
+    def check(value, path, errors):
+        if not isinstance(value, dict):
+            errors.append((path, "Ожидается объект"))
+            return value
+        for name in required:
+            if name not in value:
+                errors.append((_join(path, name), "Отсутствует обязательное поле"))
+        for name, check_property in properties:
+            if name in value:
+                value[name] = check_property(value[name], _join(path, name), errors)
+        return value
+
+    return check
+
+
+def _compile_array(schema):
+    max_items = schema.get('maxItems')
+    check_item = _compile(schema['items']) if 'items' in schema else None
+
+    def check(value, path, errors):
+        if not isinstance(value, list):
+            errors.append((path, "Ожидается список"))
+            return value
+        # Длина проверяется до элементов, чтобы не разбирать слишком большие списки
+        if max_items is not None and len(value) > max_items:
+            errors.append((path, f"Не больше {max_items} элементов"))
+            return value
+        if check_item is not None:
+            for index, item in enumerate(value):
+                value[index] = check_item(item, f"{path}[{index}]", errors)
+        return value
+
+    return check
+
+
+def _compile_string(schema):
+    min_length = schema.get('minLength')
+    max_length = schema.get('maxLength')
+    pattern = re.compile(schema['pattern']) if 'pattern' in schema else None
+    is_datetime = schema.get('format') == 'date-time'
+
+    def check(value, path, errors):
+        if not isinstance(value, str):
+            errors.append((path, "Ожидается строка"))
+            return value
+        if max_length is not None and len(value) > max_length:
+            errors.append((path, f"Длина не больше {max_length} символов"))
+            return value
+        if min_length is not None and len(value) < min_length:
+            errors.append((path, f"Длина не меньше {min_length} символов"))
+        if pattern is not None and not pattern.fullmatch(value):
+            errors.append((path, "Неверный формат"))
+        if is_datetime:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                errors.append((path, "Неверный формат даты и времени"))
+        return value
+
+    return check
+
+
+def _compile_number(schema, integer):
+    minimum = schema.get('minimum')
+    maximum = schema.get('maximum')
+    expected = "Ожидается целое число" if integer else "Ожидается число"
+    string_pattern = _INTEGER_STRING if integer else _NUMBER_STRING
+
+    def check(value, path, errors):
+        # Числа в виде строк ("45.3842") принимаются: их присылают существующие клиенты.
+        # Строка заменяется числом, поэтому все обработчики сохраняют одно и то же значение
+        if isinstance(value, bool):
+            errors.append((path, expected))
+            return value
+        if isinstance(value, str):
+            if not string_pattern.fullmatch(value):
+                errors.append((path, expected))
+                return value
+            try:
+                number = int(value) if integer else float(value)
+            except ValueError:  # слишком длинное целое
+                errors.append((path, expected))
+                return value
+        elif integer and not isinstance(value, int):
+            errors.append((path, expected))
+            return value
+        elif not isinstance(value, (int, float)):
+            errors.append((path, expected))
+            return value
+        else:
+            number = value
+        if not math.isfinite(number):
+            errors.append((path, expected))
+            return value
+        if minimum is not None and number < minimum:
+            errors.append((path, f"Значение не меньше {minimum}"))
+        if maximum is not None and number > maximum:
+            errors.append((path, f"Значение не больше {maximum}"))
+        return number
+
+    return check
+
+
+def _compile(schema):
+    """
+    Создаёт функцию проверки check(value, path, errors) для описания schema.
+    Функция возвращает значение для сохранения в данных (число вместо числа в виде строки).
+    """
+    schema_type = schema['type']
+    if schema_type == 'object':
+        check = _compile_object(schema)
+    elif schema_type == 'array':
+        check = _compile_array(schema)
+    elif schema_type == 'string':
+        check = _compile_string(schema)
+    elif schema_type in ('number', 'integer'):
+        check = _compile_number(schema, integer=schema_type == 'integer')
+    else:
+        raise ValueError(f"Неизвестный тип {schema_type}")
+
+    if schema.get('nullable'):
+        check_value = check
+
+        def check(value, path, errors):
+            return check_value(value, path, errors) if value is not None else value
+
+    return check
+
+
+def compile_schema(schema):
+    """
+    Преобразует описание данных в функцию проверки.
+    Описание разбирается один раз; проверка данных не обращается к нему.
+    Числа в виде строк заменяются в проверяемых данных на числа.
+
+    :param schema: Описание данных (см. PEREVAL_SCHEMA).
+    :return: Функция, которая принимает данные и возвращает список всех ошибок
+             [{'path': путь к полю, 'message': описание}] (пустой, если данные корректны).
+    """
+    check = _compile(schema)
+
+    def validate(data):
+        errors = []
+        check(data, '', errors)
+        return [{'path': path, 'message': message} for path, message in errors]
+
+    return validate
+
+
+# Функции проверки создаются один раз при импорте модуля
+_check_pereval = compile_schema(PEREVAL_SCHEMA)
+_check_pereval_patch = compile_schema(PEREVAL_PATCH_SCHEMA)
+
+
+def validate_pereval(data):
+    """
+    Проверяет данные перевала из запроса POST /submitData.
+
+    :param data: Данные перевала, полученные из JSON.
+    :return: Список ошибок [{'path', 'message'}]; пустой, если данные корректны.
+    """
+    return _check_pereval(data)
+
+
+def validate_pereval_patch(data):
+    """
+    Проверяет данные из запроса PATCH /submitData/<id>.
+
+    :param data: Изменяемые поля перевала, полученные из JSON.
+    :return: Список ошибок [{'path', 'message'}]; пустой, если данные корректны.
+    """
+    return _check_pereval_patch(data)
+
+
+def format_errors(errors):
+    """
+    Объединяет ошибки проверки в одно сообщение.
+
+    :param errors: Список ошибок от validate_pereval или validate_pereval_patch.
+    :return: Сообщение об ошибках.
+    """
+    return "; ".join(f"{error['path']}: {error['message']}" if error['path'] else error['message']
+                     for error in errors)